@@ -1 +1,3 @@
 from .gql_backend import GqlBackend
+from .async_gql_backend import AsyncGqlBackend
+from .mirror_backend import MirrorBackend
@@ -0,0 +1,245 @@
+import asyncio
+from .gql_backend import GqlBackend
+from .batching import BatchedResponse
+class AsyncGqlBackend(GqlBackend):
+    """
+    A variant of the GqlBackend that executes its requests asynchronously.
+
+    The query building is shared with the GqlBackend, but `records`, `count`, `create`, `create_many`, `update`,
+    `update_many`, `delete`, `connect`, `disconnect`, and `update_connections` are coroutines.  This means it can't
+    be used as the backend for a standard clearskies model (which expects synchronous backends), but you can use it
+    directly when you need to send several independent queries to the GQL server at once:
+
+    ```
+    (users, pets) = await async_gql_backend.gather(
+        async_gql_backend.records({'select_all': True}, users.empty_model()),
+        async_gql_backend.records({'select_all': True}, pets.empty_model()),
+    )
+    ```
+
+    By default requests are sent with an `httpx.AsyncClient`, which must be installed separately.  Alternatively,
+    pass in your own client via the `async_client` parameter of the configure method.  It should have an async
+    `request(method, url, headers=headers, json=json)` method which returns a response with a `status_code`,
+    `content`, and a `json()` method.
+
+    Long lists of ids are not split into chunks (see `max_ids_per_operation`) the way they are by the GqlBackend, so
+    `records`, `count`, `connect`, `disconnect`, and `update_connections` send them all in one operation.
+    """
+    _async_client = None
+    _async_client_settings = None
+
+    def configure(self, url=None, auth=None, async_client=None, **kwargs):
+        super().configure(url=url, auth=auth, **kwargs)
+        self._async_client = async_client
+        self._async_client_settings = {
+            'timeout': kwargs.get('timeout', 30),
+            'pool_size': kwargs.get('pool_size', 10),
+        }
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            # by importing httpx here, it only needs to be installed if you actually use the async backend
+            import httpx
+            pool_size = self._async_client_settings['pool_size']
+            self._async_client = httpx.AsyncClient(
+                timeout=self._async_client_settings['timeout'],
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        return self._async_client
+
+    async def gather(self, *awaitables):
+        """
+        Runs the given queries concurrently and returns their results, in order.
+        """
+        return await asyncio.gather(*awaitables)
+
+    async def close(self):
+        if self._async_client is not None and hasattr(self._async_client, 'aclose'):
+            await self._async_client.aclose()
+
+    async def records(self, configuration, model, next_page_data=None):
+        with self._instrumented('records', model, configuration=configuration) as call:
+            configuration = self._with_includes(configuration, model)
+            if self._is_paginated(configuration):
+                response = await self._execute_gql_async(
+                    *self._build_paginated_records_request(configuration, model),
+                    cache_tables=self._read_tables(configuration, model),
+                )
+                records = self._map_paginated_records(
+                    self._response_json(response), model, next_page_data=next_page_data
+                )
+            else:
+                response = await self._execute_gql_async(
+                    *self._build_records_request(configuration, model),
+                    cache_tables=self._read_tables(configuration, model),
+                )
+                records = self._map_records(
+                    self._response_json(response), model, configuration=configuration, next_page_data=next_page_data
+                )
+            self.remember_page(model, records)
+            return self._count_records(call, self._hydrate_includes(records, model, configuration['includes']))
+
+    async def count(self, configuration, model):
+        with self._instrumented('count', model):
+            if self._count_strategy != 'records':
+                strategy = self._count_strategy
+                response_json = self._response_json(
+                    await self._execute_gql_async(
+                        *self._build_count_request(configuration, model, strategy),
+                        cache_tables=[model.table_name()],
+                    )
+                )
+                (count_object_name, count_field_name) = self._count_names(model, strategy)
+                try:
+                    return self._map_count_response(response_json, count_object_name, count_field_name)
+                except ValueError as error:
+                    if not self._is_schema_error(response_json):
+                        raise error
+                    self._fall_back_from_count_error(error)
+                    return await self.count(configuration, model)
+
+            number_of_records = 0
+            pagination_key = self._pagination_key()
+            configuration = {**configuration, 'limit': 100, 'pagination': {}, 'includes': {}}
+            while True:
+                next_page_data = {}
+                number_of_records += len(await self.records(configuration, model, next_page_data=next_page_data))
+                if not next_page_data.get(pagination_key):
+                    return number_of_records
+                configuration['pagination'] = {pagination_key: next_page_data[pagination_key]}
+
+    async def create(self, data, model):
+        return (await self.create_many([data], model))[0]
+
+    async def create_many(self, datas, model):
+        with self._instrumented('create', model) as call:
+            response = await self._execute_gql_async(*self._build_create_request(datas, model))
+            self._invalidate_tables([model.table_name()])
+            return self._count_records(call, self._map_create_response(self._response_json(response), model))
+
+    async def update(self, id, data, model):
+        if not data:
+            return model.data
+
+        with self._instrumented('update', model) as call:
+            response = await self._execute_gql_async(
+                *self._build_update_request({model.id_column_name: id}, data, model)
+            )
+            self._invalidate_tables([model.table_name()])
+            records = self._count_records(call, self._map_update_response(self._response_json(response), model))
+        if not records:
+            raise ValueError(f"Update failed because record with id '{id}' was not found")
+        return records[0]
+
+    async def update_many(self, wheres, data, model):
+        if not wheres:
+            raise ValueError("update_many requires conditions: it won't update every record in the table")
+        if not data:
+            return []
+
+        with self._instrumented('update_many', model) as call:
+            response = await self._execute_gql_async(
+                *self._build_update_request(self._build_gql_search_string(wheres, model), data, model)
+            )
+            self._invalidate_tables([model.table_name()])
+            return self._count_records(call, self._map_update_response(self._response_json(response), model))
+
+    async def delete(self, id, model):
+        with self._instrumented('delete', model):
+            await self._execute_gql_async(*self._build_delete_request(id, model))
+        self._invalidate_tables([model.table_name()])
+        return True
+
+    async def connect(
+        self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
+        model
+    ):
+        with self._instrumented('connect', model):
+            response = await self._execute_gql_async(
+                *self._build_connect_request(
+                    from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids,
+                    connection_name, model
+                )
+            )
+            self._check_mutation_response(response)
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [connection_name]))
+
+    async def disconnect(
+        self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
+        model
+    ):
+        with self._instrumented('disconnect', model):
+            response = await self._execute_gql_async(
+                *self._build_disconnect_request(
+                    from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids,
+                    connection_name, model
+                )
+            )
+            self._check_mutation_response(response)
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [connection_name]))
+
+    async def update_connections(self, from_record_id_column_name, from_record_id, changes, model):
+        """
+        Applies the connects and disconnects for any number of connections in a single update mutation.
+
+        Unlike the GqlBackend, long lists of ids aren't split into chunks: everything goes in the one mutation.
+        """
+        (connect, disconnect) = self._connection_entries(changes)
+        if not connect and not disconnect:
+            return
+
+        request = self._build_update_connections_request(
+            from_record_id_column_name, from_record_id, connect, disconnect, model
+        )
+        with self._instrumented('update_connections', model):
+            self._check_mutation_response(await self._execute_gql_async(*request))
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [change['connection_name'] for change in changes]))
+
+    async def _execute_gql_async(self, gql_lines, extra_properties=None, operation_name=None, cache_tables=None):
+        request_json = self._build_request_json(
+            gql_lines, extra_properties=extra_properties, operation_name=operation_name
+        )
+        if cache_tables and self._response_cache is not None:
+            (key, generations, cached) = self._cached_response(request_json, cache_tables)
+            self._record_cache_lookup(cached is not None)
+            if cached is not None:
+                return cached
+            response_json = self._response_json(await self._post_gql_async(request_json))
+            self._cache_response(key, generations, cache_tables, response_json)
+            return BatchedResponse(response_json)
+        return await self._post_gql_async(request_json)
+
+    async def _post_gql_async(self, request_json):
+        if not self._persisted_queries.enabled:
+            return await self._execute_request_async(self.url, 'POST', json=request_json)
+
+        persisted_queries = self._persisted_queries
+        try:
+            response = await self._execute_request_async(
+                self.url, 'POST', json=persisted_queries.request_json(request_json)
+            )
+            response_json = self._response_json(response)
+        except ValueError as error:
+            if 'PERSISTED_QUERY_NOT' not in str(error) and 'PersistedQueryNot' not in str(error):
+                raise error
+            response_json = {'errors': [{'message': str(error), 'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]}
+        if not persisted_queries.is_miss(response_json):
+            return response
+        self._check_persisted_queries_support(response_json)
+        return await self._execute_request_async(
+            self.url, 'POST', json=persisted_queries.request_json(request_json, include_query=True)
+        )
+
+    async def _execute_request_async(self, url, method, json=None, headers=None, retry_auth=False):
+        request_headers = {**(headers if headers else {}), **self._auth.headers(retry_auth=retry_auth)}
+        response = await self.async_client.request(method, url, headers=request_headers, json=json)
+        if response.status_code >= 400:
+            if self._auth.has_dynamic_credentials and not retry_auth:
+                return await self._execute_request_async(url, method, json=json, headers=headers, retry_auth=True)
+            raise ValueError(f'Failed request.  Status code: {response.status_code}, message: {response.content}')
+        self._record_round_trip(json, response)
+        return response
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+from collections import OrderedDict
+from .async_gql_backend import AsyncGqlBackend
+import clearskies
+import logging
+from clearskies.di import StandardDependencies
+class User(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'user'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+        ])
+class FakeAsyncClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def request(self, method, url, headers=None, json=None):
+        self.requests.append(json)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        response_json = self.responses.pop(0)
+        return type('', (), {'status_code': 200, 'content': 'sup', 'json': lambda: response_json})
+class AsyncGqlBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.di = StandardDependencies()
+        self.di.bind('requests', 'requests')
+        self.di.bind('environment', 'environment')
+        self.di.bind('logging', logging)
+        self.auth = type('', (), {'headers': MagicMock(return_value={}), 'has_dynamic_credentials': False})()
+        self.client = FakeAsyncClient([])
+
+        self.gql_backend = self.di.build(AsyncGqlBackend)
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, async_client=self.client)
+        self.di.bind('gql_backend', self.gql_backend)
+        self.user = self.di.build(User)
+
+    def test_gather(self):
+        self.client.responses = [
+            {
+                'data': {
+                    'users': [{
+                        'id': '1'
+                    }]
+                }
+            },
+            {
+                'data': {
+                    'usersAggregate': {
+                        'count': 12
+                    }
+                }
+            },
+        ]
+        (records, count) = asyncio.run(
+            self.gql_backend.gather(
+                self.gql_backend.records({'select_all': True}, self.user),
+                self.gql_backend.count({}, self.user),
+            )
+        )
+        self.assertEquals([{'id': '1'}], records)
+        self.assertEquals(12, count)
+        self.assertEquals(2, self.client.max_in_flight)
+
+    def test_create(self):
+        self.client.responses = [{'data': {'createUsers': {'users': [{'id': '1', 'name': 'bob'}]}}}]
+        record = asyncio.run(self.gql_backend.create({'id': '1', 'name': 'bob'}, self.user))
+        self.assertEquals({'id': '1', 'name': 'bob'}, record)
+        self.assertEquals(1, len(self.client.requests))
+        self.assertEquals({'input': [{'id': '1', 'name': 'bob'}]}, self.client.requests[0]['variables'])
+
+    def test_update(self):
+        self.client.responses = [{'data': {'updateUsers': {'users': [{'id': '1', 'name': 'jane'}]}}}]
+        record = asyncio.run(self.gql_backend.update('1', {'name': 'jane'}, self.user))
+        self.assertEquals({'id': '1', 'name': 'jane'}, record)
+        self.assertEquals({'where': {'id': '1'}, 'update': {'name': 'jane'}}, self.client.requests[0]['variables'])
+
+        self.client.responses = [{'data': {'updateUsers': {'users': []}}}]
+        with self.assertRaises(ValueError):
+            asyncio.run(self.gql_backend.update('2', {'name': 'jane'}, self.user))
+
+    def test_update_connections(self):
+        info = {'relationshipsCreated': 2, 'relationshipsDeleted': 1}
+        self.client.responses = [{'data': {'updateUsers': {'info': info}}}]
+        changes = [{
+            'connection_name': 'tags',
+            'to_record_id_column_name': 'id',
+            'connect': ['a', 'b'],
+            'disconnect': ['c'],
+        }]
+        asyncio.run(self.gql_backend.update_connections('id', '1', changes, self.user))
+        self.assertEquals(
+            {
+                'where': {
+                    'id': '1'
+                },
+                'connect': {
+                    'tags': [{
+                        'where': {
+                            'node': {
+                                'id': 'a'
+                            }
+                        }
+                    }, {
+                        'where': {
+                            'node': {
+                                'id': 'b'
+                            }
+                        }
+                    }]
+                },
+                'disconnect': {
+                    'tags': [{
+                        'where': {
+                            'node': {
+                                'id': 'c'
+                            }
+                        }
+                    }]
+                },
+            },
+            self.client.requests[0]['variables'],
+        )
+
+        # errors in the response are raised, just like for the GqlBackend
+        self.client.responses = [{'data': None, 'errors': [{'message': 'Tag not found'}]}]
+        with self.assertRaises(ValueError):
+            asyncio.run(self.gql_backend.update_connections('id', '1', changes, self.user))
+        self.client.responses = [{'data': None, 'errors': [{'message': 'Tag not found'}]}]
+        with self.assertRaises(ValueError):
+            asyncio.run(self.gql_backend.connect('id', '1', 'id', ['a'], 'tags', self.user))
+
+    def test_failed_request(self):
+        async def request(method, url, headers=None, json=None):
+            return type('', (), {'status_code': 500, 'content': 'oops'})
+
+        self.client.request = request
+        with self.assertRaises(ValueError):
+            asyncio.run(self.gql_backend.delete('1', self.user))
@@ -0,0 +1,103 @@
+import threading
+import time
+class BatchedResponse:
+    """
+    The response for one operation out of a batched request.
+
+    It quacks like the response object from the requests library (at least as far as the GqlBackend cares).
+    """
+    ok = True
+    status_code = 200
+    _json = None
+
+    def __init__(self, json):
+        self._json = json
+
+    def json(self):
+        return self._json
+
+    @property
+    def content(self):
+        return self._json
+class OperationBatch:
+    """
+    Operations queued up inside of a `GqlBackend.batch()` block.
+    """
+    request_jsons = None
+
+    def __init__(self):
+        self.request_jsons = []
+
+    def add(self, request_json):
+        self.request_jsons.append(request_json)
+        return len(self.request_jsons) - 1
+
+    def take(self):
+        request_jsons = self.request_jsons
+        self.request_jsons = []
+        return request_jsons
+class PendingBatch:
+    requests = None
+    responses = None
+    error = None
+    done = None
+
+    def __init__(self):
+        self.requests = []
+        self.done = threading.Event()
+
+    def add(self, request_json):
+        self.requests.append(request_json)
+        return len(self.requests) - 1
+
+    def send(self, send_batch):
+        try:
+            self.responses = send_batch(self.requests)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done.set()
+
+    def result(self, index):
+        if self.error is not None:
+            raise self.error
+        return self.responses[index]
+class MicroBatcher:
+    """
+    Coalesces the operations sent from different threads within a short window into a single request.
+
+    The first operation to arrive opens a batch and waits for the window to pass.  Any operations that arrive
+    in the meantime join the batch, and then everything is sent at once.
+    """
+    window = None
+    max_size = None
+    _send_batch = None
+    _lock = None
+    _pending = None
+
+    def __init__(self, window, send_batch, max_size=50):
+        self.window = window
+        self.max_size = max_size
+        self._send_batch = send_batch
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def execute(self, request_json):
+        with self._lock:
+            is_leader = self._pending is None
+            if is_leader:
+                self._pending = PendingBatch()
+            pending = self._pending
+            index = pending.add(request_json)
+            if len(pending.requests) >= self.max_size:
+                self._pending = None
+
+        if is_leader:
+            time.sleep(self.window)
+            with self._lock:
+                if self._pending is pending:
+                    self._pending = None
+            pending.send(self._send_batch)
+        else:
+            pending.done.wait()
+        return pending.result(index)
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
+# what GQL servers (and the proxies in front of them) say when an operation is too big for them.  Anything vaguer
+# (rate limits, timeouts, bad variables) won't get better with smaller chunks, so it's left alone.
+complexity_error_patterns = [
+    'status code: 413',
+    'payload too large',
+    'request entity too large',
+    'too complex',
+    'query complexity',
+    'max_complexity',
+    'maximum complexity',
+    'complexity limit',
+    'query cost',
+    'max cost',
+    'max_cost',
+    'cost limit',
+]
+def is_complexity_error(error):
+    message = str(error).lower()
+    # a 429 is the server asking us to slow down, which more (smaller) chunks won't help with
+    if 'status code: 429' in message:
+        return False
+    return any(pattern in message for pattern in complexity_error_patterns)
+class Chunker:
+    """
+    Splits long lists of ids into chunks, runs the chunks concurrently, and returns the results in order.
+
+    Each kind of operation (e.g. `('connect', 'user')`) has its own chunk size, which starts at `max_ids`.  When a
+    chunk fails with what looks like a complexity error from the server (see `is_complexity_error`), the chunk is
+    split in half and retried, and the smaller size is remembered for that kind of operation from then on.
+    """
+    max_ids = None
+    max_workers = None
+    shrinks = None
+    _sizes = None
+    _executor = None
+    _lock = None
+
+    def __init__(self, max_ids=500, max_workers=4):
+        self.max_ids = max_ids
+        self.max_workers = max_workers
+        self.shrinks = 0
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def chunk_size(self, key):
+        return self._sizes.get(key, self.max_ids)
+
+    def needs_chunks(self, key, ids):
+        return len(ids) > self.chunk_size(key)
+
+    def run(self, key, ids, function, parallel=True):
+        """
+        Calls `function` with each chunk of ids, and returns a list of what it returned, in the order of the ids.
+
+        Chunks that had to be split end up as more than one entry in the list.
+        """
+        size = self.chunk_size(key)
+        chunks = [ids[start:start + size] for start in range(0, len(ids), size)]
+        if not parallel or len(chunks) == 1 or self.max_workers <= 1:
+            return [result for chunk in chunks for result in self._run_chunk(key, chunk, function)]
+
+        # the chunks run in their own threads, but should still count as part of whatever call we're in the middle of
+        futures = [
+            self._pool().submit(contextvars.copy_context().run, self._run_chunk, key, chunk, function)
+            for chunk in chunks
+        ]
+        return [result for future in futures for result in future.result()]
+
+    def stats(self):
+        return {'chunk_sizes': {**self._sizes}, 'shrinks': self.shrinks}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _run_chunk(self, key, chunk, function):
+        try:
+            return [function(chunk)]
+        except Exception as error:
+            if len(chunk) <= 1 or not is_complexity_error(error):
+                raise
+        half = (len(chunk) + 1) // 2
+        with self._lock:
+            if half < self.chunk_size(key):
+                self._sizes[key] = half
+                self.shrinks += 1
+        return [*self._run_chunk(key, chunk[:half], function), *self._run_chunk(key, chunk[half:], function)]
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='clearskies-gql-chunk'
+                    )
+        return self._executor
@@ -0,0 +1,172 @@
+import unittest
+import threading
+import requests
+from ..benchmarks import StubGqlServer, seed_graph
+from ..benchmarks.suite import Users, build_backend
+from .chunking import Chunker, is_complexity_error
+from .instrumentation import current_call
+class ChunkerTest(unittest.TestCase):
+    def test_run_in_order(self):
+        chunker = Chunker(max_ids=3, max_workers=4)
+        threads = set()
+
+        def double(ids):
+            threads.add(threading.current_thread().name)
+            return [id * 2 for id in ids]
+
+        self.assertEquals([[0, 2, 4], [6, 8, 10], [12]], chunker.run('double', list(range(7)), double))
+        self.assertEquals([[0, 2, 4], [6, 8, 10], [12]], chunker.run('double', list(range(7)), double, parallel=False))
+        self.assertTrue(any(name.startswith('clearskies-gql-chunk') for name in threads))
+        chunker.shutdown()
+
+    def test_shrink(self):
+        chunker = Chunker(max_ids=8, max_workers=2)
+        sizes = []
+
+        def limited(ids):
+            sizes.append(len(ids))
+            if len(ids) > 3:
+                raise ValueError('Query is too complex')
+            return ids
+
+        self.assertEquals(
+            list(range(10)), [id for ids in chunker.run('limited', list(range(10)), limited) for id in ids]
+        )
+        self.assertEquals(2, chunker.chunk_size('limited'))
+        self.assertEquals(8, chunker.chunk_size('other'))
+        # the next run starts out with the smaller chunks
+        sizes.clear()
+        chunker.run('limited', list(range(4)), limited, parallel=False)
+        self.assertEquals([2, 2], sizes)
+        chunker.shutdown()
+
+    def test_other_errors(self):
+        chunker = Chunker(max_ids=2)
+
+        def broken(ids):
+            raise ValueError('Cannot query field "users"')
+
+        with self.assertRaises(ValueError):
+            chunker.run('broken', [1, 2, 3, 4], broken, parallel=False)
+        self.assertEquals(2, chunker.chunk_size('broken'))
+        self.assertTrue(is_complexity_error(ValueError('Failed request.  Status code: 413, message: b""')))
+        self.assertFalse(is_complexity_error(ValueError('Cannot query field "users"')))
+        self.assertTrue(is_complexity_error(ValueError('Query complexity of 1200 exceeds the limit of 1000')))
+        self.assertTrue(is_complexity_error(ValueError('{"extensions": {"code": "MAX_COST_EXCEEDED"}}')))
+        self.assertFalse(
+            is_complexity_error(ValueError('Failed request.  Status code: 429, message: b"Too many requests"'))
+        )
+        self.assertFalse(is_complexity_error(ValueError('Variable "$payload" got invalid value')))
+        self.assertFalse(is_complexity_error(ValueError('Failed request.  Status code: 504, message: b"Timed out"')))
+
+    def test_context(self):
+        chunker = Chunker(max_ids=1, max_workers=3)
+        token = current_call.set('outer')
+        try:
+            self.assertEquals(['outer'] * 3, chunker.run('context', [1, 2, 3], lambda ids: current_call.get()))
+        finally:
+            current_call.reset(token)
+            chunker.shutdown()
+class ChunkedOperationsTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = seed_graph(users=30, tags=30, tags_per_user=0)
+        self.graph.max_list_length = 8
+        self.session = requests.Session()
+        self.server = StubGqlServer(self.graph).start()
+        (self.di, self.gql_backend) = build_backend(
+            self.server, self.session, backend_config={
+                'max_ids_per_operation': 10,
+                'max_parallel_chunks': 3,
+            }
+        )
+        self.users = self.di.build(Users)
+        self.user_ids = sorted([record['id'] for record in self.graph._types['User']['nodes'].values()], key=int)
+        self.tag_ids = sorted([record['id'] for record in self.graph._types['Tag']['nodes'].values()], key=int)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_records_and_count(self):
+        configuration = {
+            'select_all': True,
+            'wheres': [{
+                'column': 'id',
+                'operator': 'IN',
+                'values': self.user_ids[:25] + self.user_ids[:3]
+            }],
+            'sorts': [{
+                'column': 'name',
+                'direction': 'desc'
+            }],
+        }
+        records = self.gql_backend.records(configuration, self.users.empty_model())
+        self.assertEquals(
+            sorted([f'user-{index}' for index in range(25)], reverse=True), [record['name'] for record in records]
+        )
+        self.assertEquals(25, self.gql_backend.count(configuration, self.users.empty_model()))
+        # 10 ids per chunk was too many for the server, so the chunks were split until they fit
+        self.assertEquals(5, self.gql_backend.chunking_stats()['chunk_sizes'][('records', 'user')])
+
+    def test_records_with_includes(self):
+        for (index, user_id) in enumerate(self.user_ids[:25]):
+            self.graph.link('User', 'tags', user_id, self.tag_ids[index])
+        configuration = {
+            'select_all': True,
+            'wheres': [{
+                'column': 'id',
+                'operator': 'IN',
+                'values': self.user_ids[:25]
+            }],
+            'includes': {
+                'tags': {}
+            },
+        }
+        user = self.users.empty_model()
+        records = self.gql_backend.records(configuration, user)
+        self.server.reset_stats()
+        # every chunk's tags came back with the records, and the page is all of the chunks
+        tags = user.columns()['tags']
+        self.assertEquals(
+            self.tag_ids[:25],
+            [self.gql_backend.connected_records(user, tags, record['id'], 'id')[0]['id'] for record in records],
+        )
+        self.assertEquals(self.user_ids[:25], self.gql_backend._page_state().record_pages['user'])
+        self.assertEquals(0, self.server.stats()['round_trips'])
+
+    def test_connected_records(self):
+        for (index, user_id) in enumerate(self.user_ids[:25]):
+            self.graph.link('User', 'tags', user_id, self.tag_ids[index])
+        configuration = {
+            'select_all': True,
+            'wheres': [{
+                'column': 'id',
+                'operator': 'IN',
+                'values': self.user_ids[:25]
+            }]
+        }
+        user = self.users.empty_model()
+        records = self.gql_backend.records(configuration, user)
+        tags = user.columns()['tags']
+        # the first lookup loads the tags for the whole page, which is too many ids for one query
+        self.assertEquals(
+            self.tag_ids[:25],
+            [self.gql_backend.connected_records(user, tags, record['id'], 'id')[0]['id'] for record in records],
+        )
+        self.assertEquals(5, self.gql_backend.chunking_stats()['chunk_sizes'][('connected_records', 'user')])
+
+    def test_connect(self):
+        user_id = self.user_ids[0]
+        self.gql_backend.connect('id', user_id, 'id', self.tag_ids[:25], 'tags', self.users.empty_model())
+        self.assertEquals(25, len(self.graph._types['User']['relationships']['tags']['links'][user_id]))
+        self.gql_backend.disconnect('id', user_id, 'id', self.tag_ids[:20], 'tags', self.users.empty_model())
+        self.assertEquals(self.tag_ids[20:25], self.graph._types['User']['relationships']['tags']['links'][user_id])
+
+    def test_post_save(self):
+        user = self.users.find(f'id={self.user_ids[0]}')
+        user.save({'tags': self.tag_ids[:25]})
+        self.assertEquals(25, len(self.graph._types['User']['relationships']['tags']['links'][user.id]))
+        user.save({'tags': self.tag_ids[5:30]})
+        self.assertEquals(
+            self.tag_ids[5:30], sorted(self.graph._types['User']['relationships']['tags']['links'][user.id], key=int)
+        )
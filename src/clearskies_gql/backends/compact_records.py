@@ -0,0 +1,113 @@
+import csv
+import json
+# marks a column that a row didn't have at all (as opposed to one that was null)
+_missing = object()
+class CompactRecords:
+    """
+    A compact, read-only list of records.
+
+    Each record is stored as a tuple of its values (in the order of `columns`) instead of a dictionary, which takes
+    a fraction of the memory when there are a lot of records.  Indexing or iterating returns the records as
+    dictionaries, built on the fly, and `models()` turns them into models one at a time.  `write_ndjson` and
+    `write_csv` write the records out straight from the tuples.
+    """
+    columns = None
+    _column_indexes = None
+    _rows = None
+    _dumps = None
+
+    def __init__(self, columns, records=None, dumps=None):
+        self.columns = []
+        self._column_indexes = {}
+        self._rows = []
+        self._dumps = dumps if dumps else json.dumps
+        for column_name in columns:
+            self._add_column(column_name)
+        if records is not None:
+            self.extend(records)
+
+    def _add_column(self, column_name):
+        self._column_indexes[column_name] = len(self.columns)
+        self.columns.append(column_name)
+
+    def append(self, record):
+        # records can have keys that weren't selected as columns (e.g. the data flattened in from an include),
+        # in which case we add a column for them.  Rows from before then are shorter, which reads as missing.
+        for key in record:
+            if key not in self._column_indexes:
+                self._add_column(key)
+        self._rows.append(tuple(record.get(column_name, _missing) for column_name in self.columns))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return [self._record(row) for row in self._rows[index]]
+        return self._record(self._rows[index])
+
+    def __iter__(self):
+        for row in self._rows:
+            yield self._record(row)
+
+    def _record(self, row):
+        return {column_name: value for (column_name, value) in zip(self.columns, row) if value is not _missing}
+
+    def column(self, column_name):
+        """
+        Returns all the values of one column.
+        """
+        index = self._column_indexes[column_name]
+        return [row[index] if index < len(row) and row[index] is not _missing else None for row in self._rows]
+
+    def models(self, models):
+        """
+        Returns a generator that turns the records into models (from the given models object) as you go.
+        """
+        for row in self._rows:
+            yield models.model(self._record(row))
+
+    def write_ndjson(self, fp, columns=None):
+        """
+        Writes the records to the given file object as newline-delimited JSON, one record per line.
+        """
+        indexes = self._indexes(columns)
+        for row in self._rows:
+            fp.write(
+                self._dumps({
+                    self.columns[index]: row[index]
+                    for index in indexes if index < len(row) and row[index] is not _missing
+                }) + "\n"
+            )
+
+    def write_csv(self, fp, columns=None, header=True):
+        """
+        Writes the records to the given file object as CSV.
+
+        Missing and null values are written as empty strings, and nested values (e.g. connected records) as JSON.
+        """
+        indexes = self._indexes(columns)
+        writer = csv.writer(fp)
+        if header:
+            writer.writerow([self.columns[index] for index in indexes])
+        for row in self._rows:
+            writer.writerow([self._csv_value(row[index] if index < len(row) else None) for index in indexes])
+
+    def _indexes(self, columns):
+        if columns is None:
+            return list(range(len(self.columns)))
+        unknown = [column_name for column_name in columns if column_name not in self._column_indexes]
+        if unknown:
+            raise ValueError('Unknown columns for export: ' + ', '.join(unknown))
+        return [self._column_indexes[column_name] for column_name in columns]
+
+    def _csv_value(self, value):
+        if value is None or value is _missing:
+            return ''
+        if type(value) in [dict, list]:
+            return self._dumps(value)
+        return value
@@ -0,0 +1,110 @@
+import unittest
+import io
+import json
+import requests
+import tracemalloc
+from .compact_records import CompactRecords
+from ..benchmarks import StubGqlServer, seed_graph
+from ..benchmarks.suite import Users, build_backend
+class CompactRecordsTest(unittest.TestCase):
+    def test_records(self):
+        records = CompactRecords(['id', 'name'],
+                                 records=[
+                                     {
+                                         'id': '1',
+                                         'name': 'bob'
+                                     },
+                                     {
+                                         'id': '2',
+                                         'name': None
+                                     },
+                                     {
+                                         'id': '3'
+                                     },
+                                 ])
+        records.append({'id': '4', 'name': 'jane', 'age': 5})
+
+        self.assertEquals(4, len(records))
+        self.assertEquals(['id', 'name', 'age'], records.columns)
+        self.assertEquals({'id': '2', 'name': None}, records[1])
+        # a missing column stays missing, rather than turning into a null
+        self.assertEquals({'id': '3'}, records[2])
+        self.assertEquals([{'id': '1', 'name': 'bob'}], records[:1])
+        self.assertEquals({'id': '4', 'name': 'jane', 'age': 5}, records[-1])
+        self.assertEquals(['1', '2', '3', '4'], [record['id'] for record in records])
+        self.assertEquals([None, None, None, 5], records.column('age'))
+
+        models = type('', (), {'model': lambda data: ('model', data['id'])})
+        self.assertEquals([('model', '1'), ('model', '2'), ('model', '3'), ('model', '4')],
+                          list(records.models(models)))
+
+    def test_write(self):
+        records = CompactRecords(['id', 'name', 'tags'],
+                                 records=[
+                                     {
+                                         'id': '1',
+                                         'name': 'bob',
+                                         'tags': [{
+                                             'id': 'a'
+                                         }]
+                                     },
+                                     {
+                                         'id': '2',
+                                         'name': None
+                                     },
+                                 ])
+
+        ndjson = io.StringIO()
+        records.write_ndjson(ndjson)
+        self.assertEquals(
+            [{
+                'id': '1',
+                'name': 'bob',
+                'tags': [{
+                    'id': 'a'
+                }]
+            }, {
+                'id': '2',
+                'name': None
+            }],
+            [json.loads(line) for line in ndjson.getvalue().splitlines()],
+        )
+
+        csv = io.StringIO()
+        records.write_csv(csv)
+        self.assertEquals('id,name,tags\r\n1,bob,"[{""id"": ""a""}]"\r\n2,,\r\n', csv.getvalue())
+
+        csv = io.StringIO()
+        records.write_csv(csv, columns=['name', 'id'], header=False)
+        self.assertEquals('bob,1\r\n,2\r\n', csv.getvalue())
+        with self.assertRaises(ValueError):
+            records.write_csv(io.StringIO(), columns=['nope'])
+
+    def test_memory(self):
+        rows = [{'id': str(index), 'name': f'user-{index}', 'age': index} for index in range(2000)]
+        tracemalloc.start()
+        as_dicts = [{**row} for row in rows]
+        dicts_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        compact = CompactRecords(['id', 'name', 'age'], records=rows)
+        compact_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.assertLess(compact_memory, dicts_memory / 2)
+
+    def test_backend(self):
+        session = requests.Session()
+        with StubGqlServer(seed_graph(users=25, tags=3, tags_per_user=1)) as server:
+            (di, gql_backend) = build_backend(server, session)
+            users = di.build(Users)
+            for stream in [True, False]:
+                records = gql_backend.compact_records({'select_all': True},
+                                                      users.empty_model(),
+                                                      stream=stream,
+                                                      page_size=10)
+                self.assertEquals(['id', 'name', 'age'], records.columns)
+                self.assertEquals(25, len(records))
+                self.assertEquals('user-0', records[0]['name'])
+                self.assertEquals([f'user-{index}' for index in range(25)],
+                                  [user.name for user in records.models(users)])
+        session.close()
@@ -1,23 +1,102 @@
 from clearskies.backends import ApiBackend
 from clearskies.authentication.public import Public
+from clearskies.autodoc.schema import Integer as AutoDocInteger
+from clearskies.autodoc.schema import String as AutoDocString
 from clearskies.functional import string
 from typing import Any, Callable, Dict, List, Tuple
-from clearskies.column_types import BelongsTo, HasMany
+from clearskies.column_types import BelongsTo, Float, HasMany, Integer
 from ..column_types import Connection
+from ..column_types.model_metadata import model_metadata
+from .query_cache import QueryCache
+from .response_cache import ResponseCache
+from .persisted_queries import PersistedQueries
+from .json_codec import build_json_codec
+from .streaming import JsonArrayStream
+from .compact_records import CompactRecords
+from .schema import GqlSchema, introspection_query
+from .instrumentation import GqlCall, build_instrumentation, current_call
+from .batching import BatchedResponse, MicroBatcher, OperationBatch
+from .singleflight import Singleflight, copy_json
+from .chunking import Chunker
+from contextlib import contextmanager
 import json
+import logging
+import os
+import threading
 class GqlBackend(ApiBackend):
     _requests = None
     _environment = None
     _auth = None
     _logging = None
+    _count_strategy = None
+    _count_fallback = None
+    _pages = None
+    _pages_generation = None
+    _query_cache = None
+    _batches = None
+    _micro_batcher = None
+    _pagination_style = None
+    _includes = None
+    _max_include_depth = None
+    _response_cache = None
+    _response_cache_ttl = None
+    _response_cache_ttls = None
+    _table_generations = None
+    _persisted_queries = None
+    _json_codec = None
+    _log_max_length = None
+    _schema = None
+    _instrumentation = None
+    _singleflight = None
+    _chunker = None
     url = None
 
+    count_strategies = ['aggregate', 'connection', 'records']
+    # what GQL servers say when a query asks for something that isn't in the schema
+    schema_error_patterns = ['Cannot query field', 'Unknown type', 'Unknown argument']
+    pagination_styles = {'cursor': 'after', 'offset': 'start'}
+
     def __init__(self, requests, environment, logging):
         self._requests = requests
         self._environment = environment
         self._logging = logging
+        self._pages = threading.local()
+        self._pages_generation = 0
+        self._query_cache = QueryCache()
+        self._batches = threading.local()
 
-    def configure(self, url=None, auth=None):
+    def configure(
+        self,
+        url=None,
+        auth=None,
+        count_strategy='aggregate',
+        count_fallback='records',
+        query_cache_size=256,
+        pooled_session=True,
+        pool_size=10,
+        keep_alive=True,
+        timeout=30,
+        retries=3,
+        backoff_factor=0.5,
+        batch_window=None,
+        max_batch_size=50,
+        pagination_style='cursor',
+        includes=None,
+        max_include_depth=2,
+        response_cache_ttl=None,
+        response_cache_ttls=None,
+        response_cache_size=1024,
+        response_cache=None,
+        persisted_queries=False,
+        json_codec='json',
+        log_max_length=2000,
+        introspect=False,
+        schema_file=None,
+        instrumentation=None,
+        coalesce_reads=False,
+        max_ids_per_operation=500,
+        max_parallel_chunks=4,
+    ):
         self.url = url
         if not self.url:
             self.url = self._environment.get('gql_server_url', silent=True)
@@ -26,150 +105,1086 @@ class GqlBackend(ApiBackend):
                 "Failed to find GQL Server URL.  Set it by extending the GqlBackend and setting the 'url' parameter of the configure method, or via the 'gql_server_url' environment variable"
             )
         self._auth = auth if auth is not None else Public()
+        for (config_name, strategy) in [('count_strategy', count_strategy), ('count_fallback', count_fallback)]:
+            if strategy is not None and strategy not in self.count_strategies:
+                raise ValueError(
+                    f"Invalid {config_name} for GqlBackend: '{strategy}'.  Allowed values are: " +
+                    ', '.join(self.count_strategies)
+                )
+        if not count_strategy:
+            raise ValueError("count_strategy is required for the GqlBackend")
+        if pagination_style not in self.pagination_styles:
+            raise ValueError(
+                f"Invalid pagination_style for GqlBackend: '{pagination_style}'.  Allowed values are: " +
+                ', '.join(self.pagination_styles.keys())
+            )
+        self._pagination_style = pagination_style
+        self._includes = includes if includes else {}
+        self._max_include_depth = max_include_depth
+        # the response cache is off unless a ttl (or a cache) is provided
+        self._response_cache_ttl = response_cache_ttl
+        self._response_cache_ttls = response_cache_ttls if response_cache_ttls else {}
+        self._response_cache = response_cache
+        if self._response_cache is None and (response_cache_ttl or response_cache_ttls):
+            self._response_cache = ResponseCache(max_size=response_cache_size)
+        self._table_generations = {}
+        self._persisted_queries = PersistedQueries(enabled=persisted_queries)
+        self._json_codec = build_json_codec(json_codec)
+        self._log_max_length = log_max_length
+        self._instrumentation = build_instrumentation(instrumentation)
+        self._singleflight = Singleflight() if coalesce_reads else None
+        if self._chunker is not None:
+            self._chunker.shutdown()
+        self._chunker = Chunker(max_ids=max_ids_per_operation, max_workers=max_parallel_chunks) \
+            if max_ids_per_operation else None
+        self._count_strategy = count_strategy
+        self._count_fallback = count_fallback
+        self._query_cache = QueryCache(max_size=query_cache_size)
+        self._micro_batcher = MicroBatcher(batch_window, self._send_batch, max_size=max_batch_size) \
+            if batch_window else None
+
+        # if we were given a requests session (which is what the clearskies DI provides), then give it a connection
+        # pool and retry policy for talking to our GQL server.
+        if pooled_session and hasattr(self._requests, 'mount'):
+            from .pooled_session import mount_pooled_adapter
+            mount_pooled_adapter(
+                self._requests,
+                self.url,
+                pool_size=pool_size,
+                keep_alive=keep_alive,
+                timeout=timeout,
+                retries=retries,
+                backoff_factor=backoff_factor,
+            )
+
+        self._schema = self._load_schema(schema_file) if (introspect or schema_file) else None
+
+    def _load_schema(self, schema_file):
+        """
+        Loads the schema from the schema file if it exists, and otherwise asks the server for it.
+
+        The schema fetched from the server is written to the schema file (if there is one) for the next startup.
+        """
+        if schema_file and os.path.isfile(schema_file):
+            with open(schema_file, 'r') as schema_fp:
+                return GqlSchema(json.load(schema_fp))
+
+        response_json = self._response_json(self._execute_gql(introspection_query))
+        if not (response_json.get('data') or {}).get('__schema'):
+            raise ValueError(f"Failed to introspect the GQL schema at {self.url}: {response_json.get('errors')}")
+        if schema_file:
+            with open(schema_file, 'w') as schema_fp:
+                json.dump(response_json['data'], schema_fp)
+        return GqlSchema(response_json['data'])
+
+    def query_cache_stats(self):
+        return self._query_cache.stats()
+
+    def response_cache_stats(self):
+        return self._response_cache.stats() if self._response_cache is not None else None
+
+    def clear_response_cache(self):
+        if self._response_cache is not None:
+            self._response_cache.clear()
+
+    def coalescing_stats(self):
+        """
+        Returns the number of reads that shared the request of an identical read, if coalesce_reads is enabled.
+        """
+        return self._singleflight.stats() if self._singleflight is not None else None
+
+    def chunking_stats(self):
+        """
+        Returns the current chunk size for each kind of operation that has been shrunk, and how often that happened.
+        """
+        return self._chunker.stats() if self._chunker is not None else None
+
+    def _document(self, key, build_gql_lines):
+        # our documents only depend on the key (everything else goes into the variables), so build them once
+        return self._query_cache.get(key, lambda: ' '.join(build_gql_lines()))
+
+    def _names(self, model):
+        return self._query_cache.get(('names', model.__class__), lambda: self._build_names(model))
+
+    def _build_names(self, model):
+        table_name = model.table_name()
+        title_name = string.snake_case_to_title_case(table_name)
+        names = {
+            'plural_object_name': string.make_plural(string.snake_case_to_camel_case(table_name)),
+            'plural_snake_case_name': string.make_plural(table_name),
+            'title_name': title_name,
+            'plural_title_name': string.make_plural(title_name),
+        }
+        if self._schema is None:
+            return names
+
+        # with a schema we don't have to guess, and can make sure that the model matches the server
+        names = self._schema.names(model, names)
+        self._schema.validate(model, names['title_name'])
+        return names
+
+    def _select_key(self, configuration):
+        includes_key = self._includes_key(configuration.get('includes'))
+        if configuration.get('select_all'):
+            return ('*', includes_key)
+        return (*(configuration.get('selects') or []), includes_key)
+
+    def _includes_key(self, includes):
+        if not includes:
+            return ()
+        return tuple(
+            sorted([(name, tuple(include.get('columns') or []), self._includes_key(include.get('includes')))
+                    for (name, include) in includes.items()])
+        )
 
     def records(self, configuration, model, next_page_data=None):
-        camel_case_name = string.snake_case_to_camel_case(model.table_name())
-        plural_object_name = string.make_plural(camel_case_name)
-        title_name = string.snake_case_to_title_case(model.table_name())
+        return self._records(configuration, model, next_page_data=next_page_data)
+
+    def _records(self, configuration, model, next_page_data=None, track_pages=True):
+        """
+        Fetches records for `records` and `iter_records`.
+
+        With `track_pages`, the records become the current page for their table (see `remember_page`).
+        """
+        with self._instrumented('records', model, configuration=configuration) as call:
+            configuration = self._with_includes(configuration, model)
+            chunked_condition = self._chunked_condition('records', configuration, model)
+            if chunked_condition is not None:
+                records = self._chunked_records(configuration, model, chunked_condition)
+            else:
+                records = self._unchunked_records(configuration, model, next_page_data)
+            # remembering the page clears out its connected records, so it has to happen before the includes go there
+            if track_pages:
+                self.remember_page(model, records)
+            records = self._hydrate_includes(records, model, configuration['includes'])
+            # each chunk comes back sorted, but they still have to be sorted together
+            if chunked_condition is not None and configuration.get('sorts'):
+                records = self._sort_records(records, configuration['sorts'], model)
+            return self._count_records(call, records)
+
+    def _unchunked_records(self, configuration, model, next_page_data=None):
+        if self._is_paginated(configuration):
+            records = self._paginated_records(configuration, model, next_page_data=next_page_data)
+        else:
+            response = self._execute_gql(
+                *self._build_records_request(configuration, model),
+                cache_tables=self._read_tables(configuration, model),
+            )
+            records = self._map_records(
+                self._response_json(response), model, configuration=configuration, next_page_data=next_page_data
+            )
+        return records
+
+    def _chunked_condition(self, action, configuration, model):
+        """
+        Finds the IN condition (if any) with more values than we want to send in one query.
+
+        Returns the index of the condition and its (unique) values.  Only unpaginated queries are split up, and
+        only on columns that hold one value per record, so that each record matches exactly one of the chunks.
+        """
+        if self._chunker is None or configuration.get('limit') or any((configuration.get('pagination') or {}).values()):
+            return None
+        in_conditions = [(index, condition) for (index, condition) in enumerate(configuration.get('wheres') or [])
+                         if condition.get('operator', '=').upper() == 'IN']
+        if not in_conditions:
+            return None
+        columns = model.columns()
+        largest = None
+        for (index, condition) in in_conditions:
+            if isinstance(columns.get(condition['column']), Connection):
+                continue
+            if largest is None or len(condition['values']) > len(configuration['wheres'][largest]['values']):
+                largest = index
+        if largest is None:
+            return None
+        values = list(dict.fromkeys(configuration['wheres'][largest]['values']))
+        if not self._chunker.needs_chunks((action, model.table_name()), values):
+            return None
+        return (largest, values)
+
+    def _with_chunk(self, configuration, chunked_condition, values):
+        (index, _) = chunked_condition
+        wheres = [*configuration['wheres']]
+        wheres[index] = {**wheres[index], 'values': values}
+        return {**configuration, 'wheres': wheres}
+
+    def _run_chunks(self, key, ids, function):
+        # inside of a batch() block the chunks are queued up with everything else, so there's nothing to run in parallel
+        parallel = getattr(self._batches, 'current', None) is None
+        if self._chunker is None:
+            return [function(ids)]
+        return self._chunker.run(key, ids, function, parallel=parallel)
+
+    def _chunked_records(self, configuration, model, chunked_condition):
+        """
+        Fetches the records for each chunk of ids and puts them together.
+
+        The chunks run in other threads, so they only fetch: the records are remembered as a page and their
+        includes are hydrated afterwards, in the thread that asked for them.
+        """
+        def fetch_chunk(values):
+            return self._unchunked_records(self._with_chunk(configuration, chunked_condition, values), model)
+
+        pages = self._run_chunks(('records', model.table_name()), chunked_condition[1], fetch_chunk)
+        return [record for page in pages for record in page]
+
+    def _sort_records(self, records, sorts, model):
+        columns = model.columns()
+        for sort in reversed(sorts):
+            column_name = sort['column']
+            column = columns.get(column_name)
+            # BelongsTo columns come back as the parent record (unless included), and dicts can't be compared
+            parent_id_column_name = column.parent_models.get_id_column_name() if isinstance(column, BelongsTo) else None
+
+            def sort_key(record):
+                value = record.get(column_name)
+                if parent_id_column_name and type(value) == dict:
+                    value = value.get(parent_id_column_name)
+                return (value is None, value)
+
+            records = sorted(records, key=sort_key, reverse=sort.get('direction', 'asc').lower() == 'desc')
+        return records
+
+    @contextmanager
+    def _instrumented(self, action, model, configuration=None):
+        """
+        Tracks the cost of a backend call and passes it along to the instrumentation, if there is any.
+        """
+        if not self._instrumentation:
+            yield None
+            return
+
+        call = GqlCall(action, model.table_name(), parent=current_call.get())
+        call.is_next_page = bool((configuration or {}).get('pagination'))
+        token = current_call.set(call)
+        error = None
+        try:
+            yield call
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            current_call.reset(token)
+            self._finish_call(call, error=error)
+
+    def _finish_call(self, call, error=None):
+        call.finish(error=error)
+        for instrumentation in self._instrumentation:
+            instrumentation.record(call)
+
+    def _count_records(self, call, records):
+        if call is not None:
+            call.records = len(records)
+        return records
+
+    def _with_includes(self, configuration, model):
+        """
+        Resolves the relationships to fetch along with the records.
+
+        They come from the `includes` key of the configuration if present, and otherwise from the `includes`
+        given to the configure method for the model's table.
+        """
+        includes = configuration.get('includes')
+        if includes is None:
+            includes = self._includes.get(model.table_name(), {})
+        if includes:
+            self._check_includes(includes, model, 1)
+        return {**configuration, 'includes': includes}
+
+    def _check_includes(self, includes, model, depth):
+        if depth > self._max_include_depth:
+            raise ValueError(
+                f"Includes for '{model.__class__.__name__}' are nested more than {self._max_include_depth} levels " +
+                "deep.  Increase max_include_depth in the configure method if you really need them."
+            )
+        columns = model.columns()
+        for (column_name, include) in includes.items():
+            column = columns.get(column_name)
+            if not isinstance(column, BelongsTo) and not isinstance(column,
+                                                                    Connection) and not isinstance(column, HasMany):
+                raise ValueError(
+                    f"Cannot include '{column_name}' for '{model.__class__.__name__}': only BelongsTo, HasMany, and " +
+                    "Connection columns can be included."
+                )
+            if include.get('includes'):
+                self._check_includes(include['includes'], self._included_model(column), depth + 1)
+
+    def _included_model(self, column):
+        if isinstance(column, BelongsTo):
+            return column.parent_models.empty_model()
+        if isinstance(column, HasMany):
+            return column.child_models.empty_model()
+        return column.related_models.empty_model()
+
+    def _hydrate_includes(self, records, model, includes):
+        """
+        Moves the included relationships out of the records and into the places that the columns look for them.
+
+        BelongsTo columns look for their parent data in the record (under keys like `parent_table_column`), HasMany
+        data is converted to models by `column_from_backend`, and Connection data goes into the same cache used by
+        `connected_records`.  Either way, the related models come back without another request.
+        """
+        if not includes:
+            return records
+
+        columns = model.columns()
+        for (column_name, include) in includes.items():
+            column = columns[column_name]
+            related_model = self._included_model(column)
+            if include.get('includes'):
+                related_records = []
+                for record in records:
+                    value = record.get(column_name)
+                    related_records.extend(value if type(value) == list else ([value] if value else []))
+                self._hydrate_includes(related_records, related_model, include['includes'])
+
+            if isinstance(column, BelongsTo):
+                parent_table = related_model.table_name()
+                for record in records:
+                    parent = record.get(column_name)
+                    if type(parent) != dict:
+                        continue
+                    for (key, value) in parent.items():
+                        record[f'{parent_table}_{key}'] = value
+                    record[column_name] = parent.get(related_model.id_column_name)
+            elif isinstance(column, Connection):
+                own_id_column_name = column.config('own_id_column_name')
+                batch = self._page_state().connection_batches.setdefault((model.table_name(), column_name), {})
+                for record in records:
+                    if column_name in record and own_id_column_name in record:
+                        batch[record[own_id_column_name]] = record.pop(column_name) or []
+        return records
+
+    def _is_paginated(self, configuration):
+        # with cursor pagination we have to use the connection query for pages, since that's where the cursors live.
+        # With offset pagination, the limit and offset go in the query options instead.
+        if self._pagination_style != 'cursor':
+            return False
+        return configuration.get('limit') or (configuration.get('pagination') or {}).get('after')
+
+    def _pagination_key(self):
+        return self.pagination_styles[self._pagination_style]
+
+    def _build_records_request(self, configuration, model):
+        variables = {}
         search_values = self._build_gql_search_string(configuration.get('wheres'), model)
-        where_type_declaration = ''
-        where_param_declaration = ''
         if search_values:
-            where_type_declaration = '($where: ' + title_name + 'Where)'
-            where_param_declaration = '(where: $where)'
-        gql_lines = [
-            f'query {plural_object_name}{where_type_declaration}' + ' {',
-            f'  {plural_object_name}{where_param_declaration}' + ' {',
+            variables['where'] = search_values
+        options = self._build_query_options(configuration)
+        if options:
+            variables['options'] = options
+        query = self._document(
+            ('records', model.__class__, self._select_key(configuration), *variables.keys()),
+            lambda: self._build_records_document(configuration, model, variables.keys()),
+        )
+        extra_properties = {'variables': variables} if variables else None
+        return [query, extra_properties]
+
+    def _build_query_options(self, configuration):
+        options = {}
+        sort = self._build_sort(configuration)
+        if sort:
+            options['sort'] = sort
+        if self._pagination_style == 'offset':
+            if configuration.get('limit'):
+                options['limit'] = int(configuration['limit'])
+            start = (configuration.get('pagination') or {}).get('start')
+            if start:
+                options['offset'] = int(start)
+        return options
+
+    def _build_sort(self, configuration):
+        return [{sort['column']: sort.get('direction', 'asc').upper()} for sort in (configuration.get('sorts') or [])]
+
+    def _map_records(self, json, model, configuration=None, next_page_data=None):
+        records = self._map_records_response(json, model)
+        # with offset pagination, a full page means that there may be more records
+        limit = int(configuration['limit']) if configuration and configuration.get('limit') else None
+        if self._pagination_style == 'offset' and type(next_page_data) == dict and limit and len(records) == limit:
+            start = int((configuration.get('pagination') or {}).get('start') or 0)
+            next_page_data['start'] = start + limit
+        return records
+
+    def _build_records_document(self, configuration, model, variable_names):
+        names = self._names(model)
+        plural_object_name = names['plural_object_name']
+        variable_types = {'where': names['title_name'] + 'Where', 'options': names['title_name'] + 'Options'}
+        (type_declaration, param_declaration) = self._variable_declarations(variable_names, variable_types)
+        return [
+            f'query {plural_object_name}{type_declaration}' + ' {', f'  {plural_object_name}{param_declaration}' + ' {',
             "\n    ".join(self._record_selects(configuration, model)), '  }'
             '}'
         ]
+
+    def _variable_declarations(self, variable_names, variable_types):
+        type_declarations = [f'${name}: {variable_types[name]}' for name in variable_names]
+        param_declarations = [f'{name}: ${name}' for name in variable_names]
+        type_declaration = '(' + ', '.join(type_declarations) + ')' if type_declarations else ''
+        param_declaration = '(' + ', '.join(param_declarations) + ')' if param_declarations else ''
+        return (type_declaration, param_declaration)
+
+    def iter_records(self, configuration, model, page_size=100, track_pages=True):
+        """
+        Returns a generator that yields records one page at a time.
+
+        Pages are fetched lazily, so only one page of records is held in memory at once.  If the configuration has
+        a limit, then it caps the total number of records returned.  Pass `track_pages=False` when the records
+        aren't being loaded for the current request (e.g. from a background thread), so that they don't replace
+        its current page (see `remember_page`).
+        """
+        max_records = int(configuration['limit']) if configuration.get('limit') else None
+        pagination_key = self._pagination_key()
+        page = (configuration.get('pagination') or {}).get(pagination_key)
+        number_returned = 0
+        while True:
+            limit = page_size if not max_records else min(page_size, max_records - number_returned)
+            next_page_data = {}
+            records = self._records(
+                {
+                    **configuration,
+                    'limit': limit,
+                    'pagination': {
+                        pagination_key: page
+                    } if page else {},
+                },
+                model,
+                next_page_data=next_page_data,
+                track_pages=track_pages,
+            )
+            for record in records:
+                yield record
+            number_returned += len(records)
+            page = next_page_data.get(pagination_key)
+            if not page or (max_records and number_returned >= max_records):
+                return
+
+    def stream_records(self, configuration, model, chunk_size=65536):
+        """
+        Returns a generator that yields records as they are decoded from the response.
+
+        The request is streamed and the records array is decoded incrementally, so records are available before the
+        whole response has arrived and the full response is never held in memory.  Use it for large result sets
+        that you only need to look at once.  If the configuration needs the connection query (i.e. it has a limit
+        or cursor) then it is fetched normally instead.
+        """
+        configuration = self._with_includes(configuration, model)
+        if self._is_paginated(configuration):
+            yield from self.records(configuration, model)
+            return
+
+        names = self._names(model)
+        request_json = self._build_request_json(*self._build_records_request(configuration, model))
+        # since this is a generator, the call can't be the current one while we're yielding records: anything the
+        # caller did with them would count as part of it.
+        call = GqlCall('stream_records', model.table_name(), parent=current_call.get()) \
+            if self._instrumentation else None
+        error = None
+        with self._as_current_call(call):
+            response = self._execute_streaming_request(request_json)
+        try:
+            stream = JsonArrayStream(
+                response.iter_content(chunk_size=chunk_size, decode_unicode=True),
+                [['data', names['plural_snake_case_name']], ['data', names['plural_object_name']]],
+            )
+            number_of_records = 0
+            for record in stream:
+                number_of_records += 1
+                yield self._hydrate_includes([record], model, configuration['includes'])[0]
+            if not stream.found:
+                document = stream.document()
+                data = document.get('data') if type(document) == dict else None
+                if not data or (
+                    names['plural_snake_case_name'] not in data and names['plural_object_name'] not in data
+                ):
+                    raise ValueError("Unexpected response from records request")
+            if call is not None:
+                call.records = number_of_records
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            response.close()
+            if call is not None:
+                call.add(response_bytes=getattr(response.raw, 'tell', lambda: 0)() if hasattr(response, 'raw') else 0)
+                self._finish_call(call, error=error)
+
+    @contextmanager
+    def _as_current_call(self, call):
+        if call is None:
+            yield
+            return
+        token = current_call.set(call)
+        try:
+            yield
+        finally:
+            current_call.reset(token)
+
+    def compact_records(self, configuration, model, stream=True, page_size=100):
+        """
+        Returns the records as CompactRecords, which store each record as a tuple rather than a dictionary.
+
+        Use it for large, read-only result sets (e.g. exports).  With `stream` set, the records come from
+        `stream_records` and go into compact storage as they are decoded, so the full list of dictionaries never
+        exists.  Otherwise they are fetched a page at a time via `iter_records`.
+        """
+        configuration = self._with_includes(configuration, model)
+        records = self.stream_records(configuration, model) if stream else \
+            self.iter_records(configuration, model, page_size=page_size)
+        return CompactRecords(
+            self._selected_column_names(configuration, model),
+            records=records,
+            dumps=self._json_codec.dumps,
+        )
+
+    def _selected_column_names(self, configuration, model):
+        # e.g. 'name' or 'tags{id name}' => 'name' and 'tags'
+        return [line.split('{')[0].strip() for line in self._record_selects(configuration, model)]
+
+    def _execute_streaming_request(self, request_json, retry_auth=False):
+        headers = self._auth.headers(retry_auth=retry_auth)
+        response = self._requests.request('POST', self.url, headers=headers, json=request_json, stream=True)
+        if not response.ok:
+            response.close()
+            if self._auth.has_dynamic_credentials and not retry_auth:
+                return self._execute_streaming_request(request_json, retry_auth=True)
+            raise ValueError(f'Failed request.  Status code: {response.status_code}, message: {response.content}')
+        # the response is still on its way, so stream_records counts its bytes as it reads them
+        self._record_round_trip(request_json, None)
+        return response
+
+    def _paginated_records(self, configuration, model, next_page_data=None):
+        response = self._execute_gql(
+            *self._build_paginated_records_request(configuration, model),
+            cache_tables=self._read_tables(configuration, model),
+        )
+        return self._map_paginated_records(self._response_json(response), model, next_page_data=next_page_data)
+
+    def _build_paginated_records_request(self, configuration, model):
+        search_values = self._build_gql_search_string(configuration.get('wheres'), model)
+        variables = {}
+        if configuration.get('limit'):
+            variables['first'] = int(configuration['limit'])
+        after = (configuration.get('pagination') or {}).get('after')
+        if after:
+            variables['after'] = after
         if search_values:
-            extra_properties = {'variables': {'where': search_values}}
-        else:
-            extra_properties = None
-        response = self._execute_gql(gql_lines, extra_properties=extra_properties)
-        records = self._map_records_response(response.json(), model)
-        return records
+            variables['where'] = search_values
+        sort = self._build_sort(configuration)
+        if sort:
+            variables['sort'] = sort
+        query = self._document(
+            ('paginated_records', model.__class__, self._select_key(configuration), *variables.keys()),
+            lambda: self._build_paginated_records_document(configuration, model, variables.keys()),
+        )
+        extra_properties = {'variables': variables} if variables else None
+        return [query, extra_properties]
+
+    def _map_paginated_records(self, json, model, next_page_data=None):
+        connection_object_name = self._names(model)['plural_object_name'] + 'Connection'
+        connection = self._map_paginated_records_response(json, connection_object_name)
+        page_info = connection.get('pageInfo') or {}
+        if type(next_page_data) == dict and page_info.get('hasNextPage') and page_info.get('endCursor'):
+            next_page_data['after'] = page_info['endCursor']
+        return [edge['node'] for edge in connection.get('edges', [])]
+
+    def _build_paginated_records_document(self, configuration, model, variable_names):
+        connection_object_name = self._names(model)['plural_object_name'] + 'Connection'
+        title_name = self._names(model)['title_name']
+        variable_types = {
+            'first': 'Int',
+            'after': 'String',
+            'where': f'{title_name}Where',
+            'sort': f'[{title_name}Sort!]',
+        }
+        (type_declaration, param_declaration) = self._variable_declarations(variable_names, variable_types)
+        return [
+            f'query {connection_object_name}{type_declaration}' + ' {',
+            f'  {connection_object_name}{param_declaration}' + ' {',
+            '    edges { cursor node {',
+            "\n      ".join(self._record_selects(configuration, model)),
+            '    } }',
+            '    pageInfo { hasNextPage endCursor }',
+            '  }',
+            '}',
+        ]
+
+    def remember_page(self, model, records):
+        """
+        Makes the records the current page for their table (for the current thread).
+
+        When a Connection column asks for the related records of one record in the page, the related records for
+        the whole page are fetched at once.  Backends that hand out records on behalf of this one (like the
+        MirrorBackend) call this so that their Connection columns get the same batching.
+        """
+        table_name = model.table_name()
+        id_column_name = model.id_column_name
+        page_state = self._page_state()
+        page_state.record_pages[table_name] = [
+            record[id_column_name] for record in records if record.get(id_column_name)
+        ]
+        for batch_key in [batch_key for batch_key in page_state.connection_batches if batch_key[0] == table_name]:
+            del page_state.connection_batches[batch_key]
+
+    def _page_state(self):
+        """
+        Returns the pages of records (and their connected records) loaded by the current thread.
+
+        The backend is shared between threads, but a page belongs to whichever request loaded it, so each thread
+        keeps its own.  Changing connections bumps the generation, which drops every thread's connected records
+        (but not their pages, so the next lookup still fetches the connected records for the whole page at once).
+        """
+        page_state = self._pages
+        if not hasattr(page_state, 'record_pages'):
+            page_state.record_pages = {}
+        if getattr(page_state, 'generation', None) != self._pages_generation:
+            page_state.generation = self._pages_generation
+            page_state.connection_batches = {}
+        return page_state
+
+    def _forget_connected_records(self):
+        self._pages_generation += 1
+
+    def connected_records(self, own_model, column, id, id_column_name):
+        """
+        Returns the raw records connected to the record with the given id via the given Connection column.
+
+        The first lookup fetches the connected records for every record in the page that the record was loaded
+        with, so rendering a list of records costs one query per Connection column instead of one per record.
+        """
+        own_table_name = own_model.table_name()
+        page_state = self._page_state()
+        batch = page_state.connection_batches.setdefault((own_table_name, column.name), {})
+        if id not in batch:
+            page_ids = page_state.record_pages.get(own_table_name, [])
+            ids_to_load = [page_id for page_id in page_ids if page_id not in batch] if id in page_ids else [id]
+            batch.update(self._load_connected_records(own_model, column, ids_to_load, id_column_name))
+        return batch[id]
+
+    def _load_connected_records(self, own_model, column, ids, id_column_name):
+        related_model = column.related_models.empty_model()
+        reverse_connection_name = column.config('reverse_connection_name')
+        query = self._document(
+            ('connected_records', own_model.__class__, column.name, id_column_name),
+            lambda: self._build_connected_records_document(own_model, related_model, column, id_column_name),
+        )
+
+        # a page can have more ids than the server will take in one query, so they go through the chunker too
+        def load_chunk(chunk_ids):
+            extra_properties = {
+                'variables': {
+                    'where': {
+                        f'{reverse_connection_name}_SOME': {
+                            f'{id_column_name}_IN': chunk_ids
+                        }
+                    },
+                    'parentWhere': {
+                        f'{id_column_name}_IN': chunk_ids
+                    },
+                }
+            }
+            with self._instrumented('connected_records', related_model) as call:
+                response = self._execute_gql(
+                    query,
+                    extra_properties=extra_properties,
+                    cache_tables=[own_model.table_name(), related_model.table_name()],
+                )
+                records = self._count_records(
+                    call, self._map_records_response(self._response_json(response), related_model)
+                )
+            connected = {id: [] for id in chunk_ids}
+            for record in records:
+                parents = record.pop('connectedParents', None) or []
+                for parent in parents:
+                    if parent.get(id_column_name) in connected:
+                        connected[parent[id_column_name]].append({**record})
+            return connected
+
+        connected = {}
+        for chunk in self._run_chunks(('connected_records', own_model.table_name()), list(ids), load_chunk):
+            connected.update(chunk)
+        return connected
+
+    def _build_connected_records_document(self, own_model, related_model, column, id_column_name):
+        reverse_connection_name = column.config('reverse_connection_name')
+        related_names = self._names(related_model)
+        related_plural_name = related_names['plural_object_name']
+        related_title_name = related_names['title_name']
+        own_title_name = self._names(own_model)['title_name']
+        return [
+            f'query {related_plural_name}Connected($where: {related_title_name}Where, ' +
+            f'$parentWhere: {own_title_name}Where) ' + '{',
+            f'  {related_plural_name}(where: $where) ' + '{',
+            "\n    ".join(self._record_selects({'select_all': True}, related_model)),
+            f'    connectedParents: {reverse_connection_name}(where: $parentWhere) ' + '{ ' + id_column_name + ' }',
+            '  }',
+            '}',
+        ]
 
     def _record_selects(self, configuration, model):
         lines = []
+        includes = configuration.get('includes') or {}
         if configuration.get('select_all'):
-            for column in model.columns().values():
-                if column.is_temporary or isinstance(column, HasMany):
-                    continue
-                if isinstance(column, BelongsTo):
-                    parent_id_column_name = column.parent_models.get_id_column_name()
-                    lines.append(column.name + '{' + parent_id_column_name + '}')
-                    continue
-                if isinstance(column, Connection):
-                    if not column.is_readable:
-                        continue
-                    lines.append(column.name + '{' + ' '.join(column.config('readable_related_columns')) + '}')
-                    continue
-                lines.append(column.name)
+            lines = [
+                line for (column_name, line) in model_metadata.get(model).select_all if column_name not in includes
+            ]
         elif configuration.get('selects'):
             for select in configuration.get('selects'):
                 for column_name in select.split():
-                    lines.append(column_name)
+                    if column_name not in includes:
+                        lines.append(column_name)
 
+        if includes:
+            columns = model.columns()
+            for (column_name, include) in includes.items():
+                lines.append(
+                    column_name + ' { ' + ' '.join(self._include_selects(columns[column_name], include)) + ' }'
+                )
         return lines
 
+    def _include_selects(self, column, include):
+        related_model = self._included_model(column)
+        related_id_column_name = related_model.id_column_name
+        if include.get('columns'):
+            configuration = {
+                'selects': [related_id_column_name] +
+                [column_name for column_name in include['columns'] if column_name != related_id_column_name]
+            }
+        else:
+            configuration = {'select_all': True}
+        return self._record_selects({**configuration, 'includes': include.get('includes') or {}}, related_model)
+
     def _map_records_response(self, json, model):
-        if 'data' not in json:
-            raise ValueError("Unexpected response from records request")
-        plural_object_names = [
-            string.make_plural(model.table_name()),
-            string.make_plural(string.snake_case_to_camel_case(model.table_name())),
-        ]
+        if 'data' not in json or not json['data']:
+            raise ValueError(f"Unexpected response from records request: {json.get('errors')}")
+        names = self._names(model)
+        plural_object_names = [names['plural_snake_case_name'], names['plural_object_name']]
         for plural_object_name in plural_object_names:
             if plural_object_name in json['data']:
                 return json['data'][plural_object_name]
-        raise ValueError("Unexpected response from records request")
+        raise ValueError(f"Unexpected response from records request: {json.get('errors')}")
+
+    def _map_paginated_records_response(self, json, connection_object_name):
+        if 'data' not in json or not json['data'] or connection_object_name not in json['data']:
+            raise ValueError(f"Unexpected response from records request: {json.get('errors')}")
+        return json['data'][connection_object_name]
+
+    # how the clearskies operators map to the suffixes of the GQL filter fields
+    operator_suffixes = {
+        '=': '',
+        '<=>': '',
+        'IS': '',
+        '!=': '_NOT',
+        'IS NOT': '_NOT',
+        '<': '_LT',
+        '<=': '_LTE',
+        '>': '_GT',
+        '>=': '_GTE',
+        'IN': '_IN',
+    }
 
     def _build_gql_search_string(self, conditions, model):
+        """
+        Converts the conditions into a GQL where input.
+
+        Conditions are ANDed together.  In addition to the standard clearskies conditions, a condition can be
+        `{'operator': 'OR', 'conditions': [...]}` or `{'operator': 'AND', 'conditions': [...]}` to group others.
+        """
         if not conditions:
             return {}
 
-        search_values = {}
-        columns = model.columns()
-        for condition in conditions:
-            # we're being really stupid for now
-            column_name = condition['column']
-            value = condition['values'][0]
-            if isinstance(columns.get(column_name), BelongsTo):
-                parent_id_column_name = columns.get(column_name).parent_models.id_column_name
-                search_values[f'{column_name}_SOME'] = {parent_id_column_name: value}
-            elif isinstance(columns.get(column_name), Connection):
-                related_id_column_name = columns.get(column_name).config('related_id_column_name')
-                search_values[f'{column_name}_SOME'] = {related_id_column_name: value}
+        return self._combine_filters([self._build_gql_filter(condition, model.columns()) for condition in conditions],
+                                     'AND')
+
+    def _combine_filters(self, filters, operator):
+        if len(filters) == 1:
+            return filters[0]
+        if operator == 'OR':
+            return {'OR': filters}
+
+        # with AND we can merge everything into one where input, as long as the same field doesn't show up twice
+        combined = {}
+        leftovers = []
+        for gql_filter in filters:
+            if set(gql_filter.keys()) & set(combined.keys()):
+                leftovers.append(gql_filter)
             else:
-                search_values[column_name] = value
+                combined.update(gql_filter)
+        if leftovers:
+            return {'AND': [combined, *leftovers]}
+        return combined
 
-        return search_values
+    def _build_gql_filter(self, condition, columns):
+        operator = condition.get('operator', '=').upper()
+        if operator in ['AND', 'OR']:
+            return self._combine_filters(
+                [self._build_gql_filter(sub_condition, columns) for sub_condition in condition['conditions']],
+                operator,
+            )
+
+        column_name = condition['column']
+        column = columns.get(column_name)
+        (key_suffix, value) = self.filter_suffix_and_value(operator, condition.get('values', []))
+
+        if isinstance(column, BelongsTo) or isinstance(column, Connection):
+            # a null check on a relationship checks for the existence of the relationship itself
+            if value is None:
+                return {column_name + key_suffix: None}
+            if isinstance(column, BelongsTo):
+                related_id_column_name = column.parent_models.id_column_name
+            else:
+                related_id_column_name = column.config('related_id_column_name')
+            # "not connected to x" means none of the related records are x, not that at least one of them isn't
+            if key_suffix == '_NOT':
+                return {f'{column_name}_NONE': {related_id_column_name: value}}
+            return {f'{column_name}_SOME': {related_id_column_name + key_suffix: value}}
+
+        if isinstance(column, Integer) or isinstance(column, Float):
+            if type(value) == list:
+                value = [column.to_backend({column_name: item})[column_name] for item in value]
+            else:
+                value = column.to_backend({column_name: value})[column_name]
+        return {column_name + key_suffix: value}
+
+    def filter_suffix_and_value(self, operator, values):
+        """
+        Returns the suffix for the GQL filter key and the value to filter on, for a clearskies operator and values.
+
+        e.g. `('_GT', 5)` for `>` and `[5]`.
+        """
+        if operator == 'IS NULL':
+            return ('', None)
+        if operator == 'IS NOT NULL':
+            return ('_NOT', None)
+        if operator == 'IN':
+            return ('_IN', values)
+        value = values[0]
+        if operator == 'LIKE':
+            return self._like_suffix_and_value(value)
+        if operator not in self.operator_suffixes:
+            raise ValueError(f"The GqlBackend does not support the '{operator}' operator")
+        if operator in ['IS', 'IS NOT'] and str(value).upper() == 'NULL':
+            value = None
+        return (self.operator_suffixes[operator], value)
+
+    def _like_suffix_and_value(self, value):
+        starts_with_wildcard = value.startswith('%')
+        ends_with_wildcard = value.endswith('%') and len(value) > 1
+        search = value[(1 if starts_with_wildcard else 0):(-1 if ends_with_wildcard else len(value))]
+        if '%' in search:
+            raise ValueError(
+                f"The GqlBackend only supports LIKE searches with wildcards at the beginning and/or end, not '{value}'"
+            )
+        if starts_with_wildcard and ends_with_wildcard:
+            return ('_CONTAINS', search)
+        if starts_with_wildcard:
+            return ('_ENDS_WITH', search)
+        if ends_with_wildcard:
+            return ('_STARTS_WITH', search)
+        return ('', search)
 
     def count(self, configuration, model):
-        # cheating badly and ugl-ly
-        return len(self.records(configuration, model))
+        with self._instrumented('count', model):
+            chunked_condition = self._chunked_condition('count', configuration, model)
+            if chunked_condition is None:
+                return self._unchunked_count(configuration, model)
 
-    def create(self, data, model):
-        plural_snake_case_name = string.make_plural(model.table_name())
-        singular_title_name = string.snake_case_to_title_case(model.table_name())
-        plural_title_name = string.make_plural(singular_title_name)
-        input_name = f'[{singular_title_name}CreateInput!]!'
-        input_variables = {}
-        gql_lines = [f'mutation Create{plural_title_name}($input: ' + input_name + ') {']
-        gql_lines.append(f'create{plural_title_name}(' + 'input: $input) {')
-        gql_lines.append('  info { nodesCreated }')
-        for (key, value) in data.items():
-            input_variables[key] = value
-        gql_lines.append('  }')
-        gql_lines.append('}')
-        result = self._execute_gql(
-            gql_lines,
-            extra_properties={'variables': {
-                'input': input_variables
-            }},
-            operation_name=f'Create{plural_title_name}',
+            def count_chunk(values):
+                return self._unchunked_count(self._with_chunk(configuration, chunked_condition, values), model)
+
+            return sum(self._run_chunks(('count', model.table_name()), chunked_condition[1], count_chunk))
+
+    def _unchunked_count(self, configuration, model):
+        if self._count_strategy != 'records':
+            strategy = self._count_strategy
+            # failed requests (e.g. a 503 once the retries run out) raise from here: they aren't a reason to fall back
+            response_json = self._response_json(
+                self._execute_gql(
+                    *self._build_count_request(configuration, model, strategy), cache_tables=[model.table_name()]
+                )
+            )
+            (count_object_name, count_field_name) = self._count_names(model, strategy)
+            try:
+                return self._map_count_response(response_json, count_object_name, count_field_name)
+            except ValueError as error:
+                if not self._is_schema_error(response_json):
+                    raise error
+                self._fall_back_from_count_error(error)
+                return self._unchunked_count(configuration, model)
+
+        # no server-side counting available, so we have to fetch everything and count it ourselves.
+        # Stream through it a page at a time so that we at least don't have to hold it all in memory.
+        configuration = {**configuration, 'limit': None, 'pagination': {}, 'includes': {}}
+        return sum(1 for record in self.iter_records(configuration, model))
+
+    def _fall_back_from_count_error(self, error):
+        if not self._count_fallback or self._count_fallback == self._count_strategy:
+            raise error
+        # the server doesn't support our count query, so remember that and stop asking
+        self._logging.warning(
+            f"Count strategy '{self._count_strategy}' failed against {self.url}, " +
+            f"switching to '{self._count_fallback}': {error}"
         )
+        self._count_strategy = self._count_fallback
 
-        # now fetch out the newly created record
-        id_column_name = model.id_column_name
-        results = self.records({
-            'table_name':
-            model.table_name(),
-            'select_all':
-            True,
-            'wheres': [{
-                'column': id_column_name,
-                'operator': '=',
-                'values': [data[id_column_name]],
-            }]
-        }, model)
-        return results[0]
+    def _is_schema_error(self, response_json):
+        """
+        Returns True if the GQL server responded that our query doesn't match its schema (e.g. an unknown field).
+        """
+        errors = response_json.get('errors') if type(response_json) == dict else None
+        if not errors or type(errors) != list:
+            return False
+        return any(
+            pattern in str(error.get('message') if type(error) == dict else error) for error in errors
+            for pattern in self.schema_error_patterns
+        )
+
+    def _build_count_request(self, configuration, model, strategy):
+        search_values = self._build_gql_search_string(configuration.get('wheres'), model)
+        query = self._document(
+            ('count', model.__class__, strategy, bool(search_values)),
+            lambda: self._build_count_document(model, strategy, bool(search_values)),
+        )
+        extra_properties = {'variables': {'where': search_values}} if search_values else None
+        return [query, extra_properties]
+
+    def _count_names(self, model, strategy):
+        plural_object_name = self._names(model)['plural_object_name']
+        if strategy == 'aggregate':
+            return (f'{plural_object_name}Aggregate', 'count')
+        return (f'{plural_object_name}Connection', 'totalCount')
+
+    def _build_count_document(self, model, strategy, has_where):
+        (count_object_name, count_field_name) = self._count_names(model, strategy)
+        where_type_declaration = ''
+        where_param_declaration = ''
+        if has_where:
+            where_type_declaration = '($where: ' + self._names(model)['title_name'] + 'Where)'
+            where_param_declaration = '(where: $where)'
+        return [
+            f'query {count_object_name}{where_type_declaration}' + ' {',
+            f'  {count_object_name}{where_param_declaration} ' + '{ ' + count_field_name + ' }',
+            '}',
+        ]
+
+    def _map_count_response(self, json, count_object_name, count_field_name):
+        data = json.get('data')
+        if not data or not data.get(count_object_name) or count_field_name not in data[count_object_name]:
+            errors = json.get('errors')
+            raise ValueError(f"Unexpected response from count request for '{count_object_name}': {errors}")
+        return int(data[count_object_name][count_field_name])
+
+    def create(self, data, model):
+        return self.create_many([data], model)[0]
+
+    def create_many(self, datas, model):
+        """
+        Creates several records with one mutation, and returns the created records.
+
+        Note that, unlike `create`, this is not called by clearskies itself, so the data is sent as-is: it doesn't
+        go through the column to_backend transformations.
+        """
+        with self._instrumented('create', model) as call:
+            response = self._execute_gql(*self._build_create_request(datas, model))
+            self._invalidate_tables([model.table_name()])
+            return self._count_records(call, self._map_create_response(self._response_json(response), model))
+
+    def _build_create_request(self, datas, model):
+        plural_title_name = self._names(model)['plural_title_name']
+        query = self._document(('create', model.__class__), lambda: self._build_create_document(model))
+        input_variables = []
+        for data in datas:
+            input_variables.append({key: value for (key, value) in data.items()})
+        return [query, {'variables': {'input': input_variables}}, f'Create{plural_title_name}']
+
+    def _map_create_response(self, json, model):
+        return self._map_mutation_response(json, model, 'create')
+
+    def _map_mutation_response(self, json, model, action):
+        names = self._names(model)
+        mutation_name = f'{action}{names["plural_title_name"]}'
+        data = json.get('data')
+        if not data or not data.get(mutation_name) or names['plural_object_name'] not in data[mutation_name]:
+            raise ValueError(f"Unexpected response from {action} request: {json.get('errors')}")
+        return data[mutation_name][names['plural_object_name']]
+
+    def _build_create_document(self, model):
+        # select the new records in the mutation response, so we don't have to go back and fetch them afterwards
+        names = self._names(model)
+        plural_title_name = names['plural_title_name']
+        input_name = f'[{names["title_name"]}CreateInput!]!'
+        return [
+            f'mutation Create{plural_title_name}($input: ' + input_name + ') {',
+            f'create{plural_title_name}(' + 'input: $input) {',
+            f'  {names["plural_object_name"]} ' + '{',
+            "\n    ".join(self._record_selects({'select_all': True}, model)),
+            '  }',
+            '  }',
+            '}',
+        ]
 
     def update(self, id, data, model):
         if not data:
             return model.data
 
-        plural_title_name = string.make_plural(string.snake_case_to_title_case(model.table_name()))
-        gql_lines = [f'mutation update{plural_title_name}( input: [']
-        gql_lines.append('    {')
-        for (key, value) in data.items():
-            gql_lines.append(f'{key}: {value}')
-        gql_lines.append('    }')
-        gql_lines.append('] )')
-        return self._execute_gql(gql_lines)
+        with self._instrumented('update', model) as call:
+            response = self._execute_gql(*self._build_update_request({model.id_column_name: id}, data, model))
+            self._invalidate_tables([model.table_name()])
+            records = self._count_records(call, self._map_update_response(self._response_json(response), model))
+        if not records:
+            raise ValueError(f"Update failed because record with id '{id}' was not found")
+        return records[0]
 
-    def delete(self, id, model):
-        singular_title_name = string.snake_case_to_title_case(model.table_name())
-        plural_title_name = string.make_plural(singular_title_name)
-        gql_lines = [
-            f'mutation Delete{plural_title_name}($where: {singular_title_name}Where) ' + '{',
-            f'  delete{plural_title_name}(where: $where) ' + '{',
-            '    nodesDeleted',
+    def update_many(self, wheres, data, model):
+        """
+        Applies the same changes to every record matching the given conditions with one mutation.
+
+        The conditions are in the same format as the `wheres` of a records configuration, and the updated records
+        are returned.  As with `create_many`, the data is sent as-is.
+        """
+        if not wheres:
+            raise ValueError("update_many requires conditions: it won't update every record in the table")
+        if not data:
+            return []
+
+        with self._instrumented('update_many', model) as call:
+            response = self._execute_gql(
+                *self._build_update_request(self._build_gql_search_string(wheres, model), data, model)
+            )
+            self._invalidate_tables([model.table_name()])
+            return self._count_records(call, self._map_update_response(self._response_json(response), model))
+
+    def _build_update_request(self, where, data, model):
+        plural_title_name = self._names(model)['plural_title_name']
+        query = self._document(('update', model.__class__), lambda: self._build_update_document(model))
+        return [query, {'variables': {'where': where, 'update': data}}, f'Update{plural_title_name}']
+
+    def _map_update_response(self, json, model):
+        return self._map_mutation_response(json, model, 'update')
+
+    def _build_update_document(self, model):
+        names = self._names(model)
+        singular_title_name = names['title_name']
+        plural_title_name = names['plural_title_name']
+        return [
+            f'mutation Update{plural_title_name}($where: {singular_title_name}Where, ' +
+            f'$update: {singular_title_name}UpdateInput) ' + '{',
+            f'  update{plural_title_name}(where: $where, update: $update) ' + '{',
+            f'    {names["plural_object_name"]} ' + '{',
+            "\n      ".join(self._record_selects({'select_all': True}, model)),
+            '    }',
             '  }',
             '}',
         ]
+
+    def delete(self, id, model):
+        with self._instrumented('delete', model):
+            self._execute_gql(*self._build_delete_request(id, model), deferrable=True)
+        self._invalidate_tables([model.table_name()])
+        return True
+
+    def _build_delete_request(self, id, model):
+        plural_title_name = self._names(model)['plural_title_name']
+        query = self._document(('delete', model.__class__), lambda: self._build_delete_document(model))
         where = {
             'variables': {
                 'where': {
@@ -177,22 +1192,46 @@ class GqlBackend(ApiBackend):
                 }
             }
         }
-        result = self._execute_gql(gql_lines, extra_properties=where, operation_name=f'Delete{plural_title_name}')
+        return [query, where, f'Delete{plural_title_name}']
+
+    def _build_delete_document(self, model):
+        names = self._names(model)
+        singular_title_name = names['title_name']
+        plural_title_name = names['plural_title_name']
+        return [
+            f'mutation Delete{plural_title_name}($where: {singular_title_name}Where) ' + '{',
+            f'  delete{plural_title_name}(where: $where) ' + '{',
+            '    nodesDeleted',
+            '  }',
+            '}',
+        ]
 
     def connect(
         self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
         model
     ):
-        singular_title_name = string.snake_case_to_title_case(model.table_name())
-        plural_title_name = string.make_plural(singular_title_name)
-        gql_lines = [
-            f'mutation Mutation($connect: {singular_title_name}ConnectInput, $where: {singular_title_name}Where) ' +
-            '{',
-            f'  update{plural_title_name}(connect: $connect, where: $where) ' + '{',
-            '    info { relationshipsCreated }',
-            '  }',
-            '}',
-        ]
+        with self._instrumented('connect', model):
+            self._run_chunks(
+                ('connect', model.table_name()),
+                list(to_record_ids),
+                lambda ids: self._check_mutation_response(
+                    self._execute_gql(
+                        *self._build_connect_request(
+                            from_record_id_column_name, from_record_id, to_record_id_column_name, ids, connection_name,
+                            model
+                        ),
+                        deferrable=True,
+                    )
+                ),
+            )
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [connection_name]))
+
+    def _build_connect_request(
+        self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
+        model
+    ):
+        query = self._document(('connect', model.__class__), lambda: self._build_connect_document(model))
         connection_entries = []
         # could probably make this a one-liner but it would be harder to read
         for to_record_id in to_record_ids:
@@ -207,22 +1246,46 @@ class GqlBackend(ApiBackend):
                 },
             }
         }
-        self._execute_gql(gql_lines, extra_properties=query_data)
+        return [query, query_data]
+
+    def _build_connect_document(self, model):
+        names = self._names(model)
+        singular_title_name = names['title_name']
+        return [
+            f'mutation Mutation($connect: {singular_title_name}ConnectInput, $where: {singular_title_name}Where) ' +
+            '{',
+            f'  update{names["plural_title_name"]}(connect: $connect, where: $where) ' + '{',
+            '    info { relationshipsCreated }',
+            '  }',
+            '}',
+        ]
 
     def disconnect(
         self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
         model
     ):
-        singular_title_name = string.snake_case_to_title_case(model.table_name())
-        plural_title_name = string.make_plural(singular_title_name)
-        gql_lines = [
-            f'mutation Mutation($disconnect: {singular_title_name}DisconnectInput, $where: {singular_title_name}Where) '
-            + '{',
-            f'  update{plural_title_name}(disconnect: $disconnect, where: $where) ' + '{',
-            '    info { relationshipsDeleted }',
-            '  }',
-            '}',
-        ]
+        with self._instrumented('disconnect', model):
+            self._run_chunks(
+                ('disconnect', model.table_name()),
+                list(to_record_ids),
+                lambda ids: self._check_mutation_response(
+                    self._execute_gql(
+                        *self._build_disconnect_request(
+                            from_record_id_column_name, from_record_id, to_record_id_column_name, ids, connection_name,
+                            model
+                        ),
+                        deferrable=True,
+                    )
+                ),
+            )
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [connection_name]))
+
+    def _build_disconnect_request(
+        self, from_record_id_column_name, from_record_id, to_record_id_column_name, to_record_ids, connection_name,
+        model
+    ):
+        query = self._document(('disconnect', model.__class__), lambda: self._build_disconnect_document(model))
         disconnection_entries = []
         # could probably make this a one-liner but it would be harder to read
         for to_record_id in to_record_ids:
@@ -237,10 +1300,354 @@ class GqlBackend(ApiBackend):
                 },
             }
         }
-        self._execute_gql(gql_lines, extra_properties=query_data)
+        return [query, query_data]
+
+    def _build_disconnect_document(self, model):
+        names = self._names(model)
+        singular_title_name = names['title_name']
+        return [
+            f'mutation Mutation($disconnect: {singular_title_name}DisconnectInput, $where: {singular_title_name}Where) '
+            + '{',
+            f'  update{names["plural_title_name"]}(disconnect: $disconnect, where: $where) ' + '{',
+            '    info { relationshipsDeleted }',
+            '  }',
+            '}',
+        ]
+
+    def update_connections(self, from_record_id_column_name, from_record_id, changes, model):
+        """
+        Applies the connects and disconnects for any number of connections in a single update mutation.
+
+        `changes` is a list of dictionaries, one per connection, with the `connection_name`, the
+        `to_record_id_column_name`, and the lists of ids to `connect` and `disconnect`.
+        """
+        # every id to connect or disconnect, so that a long list can be split across several mutations
+        changed_ids = [(change['connection_name'], change['to_record_id_column_name'], action, to_record_id)
+                       for change in changes for action in ['connect', 'disconnect']
+                       for to_record_id in (change.get(action) or [])]
+        if not changed_ids:
+            return
+
+        def send(chunk):
+            (connect, disconnect) = self._connection_entries(self._changes_from_ids(chunk))
+            return self._check_mutation_response(
+                self._execute_gql(
+                    *self._build_update_connections_request(
+                        from_record_id_column_name, from_record_id, connect, disconnect, model
+                    ),
+                    deferrable=True,
+                )
+            )
+
+        with self._instrumented('update_connections', model):
+            self._run_chunks(('update_connections', model.table_name()), changed_ids, send)
+        # connections changed, so anything we loaded for them is out of date.
+        self._forget_connected_records()
+        self._invalidate_tables(self._connection_tables(model, [change['connection_name'] for change in changes]))
+
+    def _changes_from_ids(self, changed_ids):
+        changes = {}
+        for (connection_name, to_record_id_column_name, action, to_record_id) in changed_ids:
+            change = changes.setdefault(
+                connection_name,
+                {
+                    'connection_name': connection_name,
+                    'to_record_id_column_name': to_record_id_column_name,
+                    'connect': [],
+                    'disconnect': [],
+                },
+            )
+            change[action].append(to_record_id)
+        return list(changes.values())
+
+    def _check_mutation_response(self, response):
+        # deferred operations (inside of a batch() block) are checked when the batch is sent
+        if response is None:
+            return
+        json = self._response_json(response)
+        if type(json) == dict and json.get('errors'):
+            raise ValueError(f"Error response from GQL server: {json['errors']}")
+
+    def _connection_tables(self, model, connection_names):
+        tables = [model.table_name()]
+        columns = model.columns()
+        for connection_name in connection_names:
+            column = columns.get(connection_name)
+            if isinstance(column, Connection):
+                tables.append(column.related_models.get_table_name())
+        return tables
+
+    def _read_tables(self, configuration, model):
+        # the tables that a records query reads from, so we know which changes should invalidate its cached response
+        includes = configuration.get('includes')
+        tables = [model.table_name(), *self._include_tables(includes, model)]
+        if configuration.get('select_all'):
+            # select_all also selects the related records of the readable Connection columns
+            connection_names = [
+                name for (name, connection) in model_metadata.get(model).connections.items()
+                if connection.is_readable and name not in (includes or {})
+            ]
+            columns = model.columns() if connection_names else {}
+            tables.extend([columns[name].related_models.get_table_name() for name in connection_names])
+        return tables
+
+    def _include_tables(self, includes, model):
+        tables = []
+        columns = model.columns()
+        for (column_name, include) in (includes or {}).items():
+            related_model = self._included_model(columns[column_name])
+            tables.extend([related_model.table_name(), *self._include_tables(include.get('includes'), related_model)])
+        return tables
+
+    def _invalidate_tables(self, tables):
+        # bumping the generation keeps reads that were already in flight from caching what they found
+        for table in tables:
+            self._table_generations[table] = self._table_generations.get(table, 0) + 1
+        if self._response_cache is not None:
+            self._response_cache.invalidate(tables)
+
+    def _cached_response(self, request_json, tables):
+        """
+        Returns the cache key, the table generations, and the cached response (if any) for a read query.
+        """
+        key = self._read_key(request_json)
+        generations = [self._table_generations.get(table, 0) for table in tables]
+        cached = self._response_cache.get(key)
+        # the records in a response are modified as they are mapped, so everyone gets their own copy
+        return (key, generations, BatchedResponse(copy_json(cached)) if cached is not None else None)
+
+    def _read_key(self, request_json):
+        return json.dumps([' '.join(request_json['query'].split()), request_json.get('variables')], sort_keys=True)
+
+    def _cache_response(self, key, generations, tables, response_json):
+        if generations != [self._table_generations.get(table, 0) for table in tables]:
+            return
+        if type(response_json) != dict or not response_json.get('data') or response_json.get('errors'):
+            return
+        ttls = [self._response_cache_ttls.get(table, self._response_cache_ttl) for table in tables]
+        if all(ttls):
+            self._response_cache.set(key, copy_json(response_json), min(ttls), tables)
+
+    def _connection_entries(self, changes):
+        connect = {}
+        disconnect = {}
+        for change in changes:
+            for (action, entries) in [('connect', connect), ('disconnect', disconnect)]:
+                if not change.get(action):
+                    continue
+                entries[change['connection_name']] = [{
+                    'where': {
+                        'node': {
+                            change['to_record_id_column_name']: to_record_id
+                        }
+                    }
+                } for to_record_id in change[action]]
+        return (connect, disconnect)
+
+    def _build_update_connections_request(self, from_record_id_column_name, from_record_id, connect, disconnect, model):
+        query = self._document(
+            ('update_connections', model.__class__),
+            lambda: self._build_update_connections_document(model),
+        )
+        variables = {'where': {from_record_id_column_name: from_record_id}}
+        if connect:
+            variables['connect'] = connect
+        if disconnect:
+            variables['disconnect'] = disconnect
+        return [query, {'variables': variables}]
+
+    def _build_update_connections_document(self, model):
+        names = self._names(model)
+        singular_title_name = names['title_name']
+        return [
+            f'mutation Mutation($connect: {singular_title_name}ConnectInput, ' +
+            f'$disconnect: {singular_title_name}DisconnectInput, $where: {singular_title_name}Where) ' + '{',
+            f'  update{names["plural_title_name"]}(connect: $connect, disconnect: $disconnect, where: $where) ' + '{',
+            '    info { relationshipsCreated relationshipsDeleted }',
+            '  }',
+            '}',
+        ]
+
+    @contextmanager
+    def batch(self):
+        """
+        Sends the operations executed inside the block together, in as few requests as possible.
+
+        Operations that don't return anything (delete, connect, and disconnect) are queued up and sent along with
+        the next operation that does return something, or when the block ends.  Use it like so:
 
-    def _execute_gql(self, gql_lines, extra_properties=None, operation_name=None):
-        request_json = {"query": ' '.join(gql_lines)}
+        ```
+        with gql_backend.batch():
+            gql_backend.disconnect(...)
+            gql_backend.connect(...)
+        ```
+        """
+        outer_batch = getattr(self._batches, 'current', None)
+        if outer_batch is not None:
+            yield outer_batch
+            return
+
+        self._batches.current = OperationBatch()
+        try:
+            yield self._batches.current
+            self._flush_batch(self._batches.current)
+        finally:
+            self._batches.current = None
+
+    def _flush_batch(self, batch, last_is_deferred=True):
+        request_jsons = batch.take()
+        if not request_jsons:
+            return []
+        responses = self._send_batch(request_jsons)
+        # nobody is waiting on the results of the deferred operations, so we have to check them for errors here.
+        for response in (responses if last_is_deferred else responses[:-1]):
+            self._check_deferred_response(response)
+        return responses
+
+    def _check_deferred_response(self, response):
+        json = self._response_json(response)
+        if type(json) == dict and json.get('errors'):
+            raise ValueError(f"Error response from GQL server for batched operation: {json['errors']}")
+
+    def _send_batch(self, request_jsons):
+        if len(request_jsons) == 1:
+            return [self._post_gql(request_jsons[0])]
+
+        response_jsons = self._post_gql_batch(request_jsons)
+        if type(response_jsons) != list or len(response_jsons) != len(request_jsons):
+            raise ValueError(
+                f"Unexpected response from GQL server for a batch of {len(request_jsons)} operations.  " +
+                "Does the server support batched requests?"
+            )
+        return [BatchedResponse(response_json) for response_json in response_jsons]
+
+    def _execute_gql(self, gql_lines, extra_properties=None, operation_name=None, deferrable=False, cache_tables=None):
+        request_json = self._build_request_json(
+            gql_lines, extra_properties=extra_properties, operation_name=operation_name
+        )
+        if not cache_tables:
+            return self._send_request_json(request_json, deferrable)
+
+        # only reads have cache tables.  They can come out of the response cache, or share the request of an
+        # identical read that another thread has in flight.
+        if self._response_cache is None:
+            return self._coalesced(request_json, lambda: self._send_request_json(request_json, deferrable))
+        (key, generations, cached) = self._cached_response(request_json, cache_tables)
+        self._record_cache_lookup(cached is not None)
+        if cached is not None:
+            return cached
+
+        def send():
+            # decode once: the cache and the caller both work from the same decoded response
+            response_json = self._response_json(self._send_request_json(request_json, deferrable))
+            self._cache_response(key, generations, cache_tables, response_json)
+            return BatchedResponse(response_json)
+
+        return self._coalesced(request_json, send)
+
+    def _coalesced(self, request_json, send):
+        # inside of a batch() block the response comes back with the rest of the batch, so there's nothing to share
+        if self._singleflight is None or getattr(self._batches, 'current', None) is not None:
+            return send()
+        return BatchedResponse(self._singleflight.do(self._read_key(request_json), lambda: self._response_json(send())))
+
+    def _send_request_json(self, request_json, deferrable):
+        batch = getattr(self._batches, 'current', None)
+        if batch is not None:
+            batch.add(request_json)
+            if deferrable:
+                return None
+            return self._flush_batch(batch, last_is_deferred=False)[-1]
+        if self._micro_batcher:
+            return self._micro_batcher.execute(request_json)
+        return self._post_gql(request_json)
+
+    def _post_gql(self, request_json):
+        if not self._persisted_queries.enabled:
+            return self._execute_request(self.url, 'POST', json=request_json)
+
+        # try with just the hash of the query first, and send the full query if the server doesn't know it yet
+        persisted_queries = self._persisted_queries
+        try:
+            response = self._execute_request(self.url, 'POST', json=persisted_queries.request_json(request_json))
+            response_json = self._response_json(response)
+        except ValueError as error:
+            # some servers respond to an unknown hash with an error status, which _execute_request raises
+            if 'PERSISTED_QUERY_NOT' not in str(error) and 'PersistedQueryNot' not in str(error):
+                raise error
+            response_json = {'errors': [{'message': str(error), 'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]}
+        if not persisted_queries.is_miss(response_json):
+            return response
+        self._check_persisted_queries_support(response_json)
+        return self._execute_request(
+            self.url, 'POST', json=persisted_queries.request_json(request_json, include_query=True)
+        )
+
+    def _post_gql_batch(self, request_jsons):
+        if not self._persisted_queries.enabled:
+            return self._response_json(self._execute_request(self.url, 'POST', json=request_jsons))
+
+        persisted_queries = self._persisted_queries
+        response_jsons = self._response_json(
+            self._execute_request(
+                self.url, 'POST', json=[persisted_queries.request_json(request_json) for request_json in request_jsons]
+            )
+        )
+        if type(response_jsons) != list or len(response_jsons) != len(request_jsons):
+            return response_jsons
+
+        # send the full queries for any operations that the server didn't have yet, all together
+        misses = [
+            index for (index, response_json) in enumerate(response_jsons) if persisted_queries.is_miss(response_json)
+        ]
+        if not misses:
+            return response_jsons
+        self._check_persisted_queries_support(response_jsons[misses[0]])
+        retried = self._response_json(
+            self._execute_request(
+                self.url,
+                'POST',
+                json=[persisted_queries.request_json(request_jsons[index], include_query=True) for index in misses],
+            )
+        )
+        if type(retried) != list or len(retried) != len(misses):
+            return retried
+        for (index, response_json) in zip(misses, retried):
+            response_jsons[index] = response_json
+        return response_jsons
+
+    def _check_persisted_queries_support(self, response_json):
+        if self._persisted_queries.is_unsupported(response_json):
+            self._logging.warning(f"The GQL server at {self.url} doesn't support persisted queries, disabling them")
+            self._persisted_queries.enabled = False
+
+    def _record_cache_lookup(self, hit):
+        call = current_call.get()
+        if call is not None:
+            call.add(**{'cache_hits' if hit else 'cache_misses': 1})
+
+    def _record_round_trip(self, request_json, response, request_bytes=None):
+        call = current_call.get()
+        if call is None:
+            return
+        if call.operation_name is None and type(request_json) == dict:
+            call.operation_name = request_json.get('operation_name') or self._operation_name(request_json.get('query'))
+        if request_bytes is None:
+            request_bytes = len(self._json_codec.dumps(request_json).encode('utf-8')) if request_json else 0
+        content = getattr(response, 'content', None)
+        call.add(
+            round_trips=1,
+            request_bytes=request_bytes,
+            response_bytes=len(content) if type(content) in [bytes, str] else 0,
+        )
+
+    def _operation_name(self, query):
+        # e.g. 'query users($where: UserWhere) {' => 'users'
+        words = (query or '').split('(')[0].split('{')[0].split()
+        return words[1] if len(words) > 1 else None
+
+    def _build_request_json(self, gql_lines, extra_properties=None, operation_name=None):
+        request_json = {"query": gql_lines if type(gql_lines) == str else ' '.join(gql_lines)}
         if extra_properties:
             request_json = {
                 **request_json,
@@ -248,35 +1655,97 @@ class GqlBackend(ApiBackend):
             }
         if operation_name:
             request_json['operation_name'] = operation_name
+        self._log_request(request_json)
+        return request_json
+
+    def _log_request(self, request_json):
+        # serializing the request just to log it is expensive for large requests, so only do it if it will be logged
+        logger = self._logging.getLogger() if hasattr(self._logging, 'getLogger') else self._logging
+        if hasattr(logger, 'isEnabledFor') and not logger.isEnabledFor(logging.INFO):
+            return
+        payload = self._json_codec.dumps(request_json)
+        if self._log_max_length and len(payload) > self._log_max_length:
+            payload = payload[:self._log_max_length] + f'... ({len(payload) - self._log_max_length} more characters)'
         self._logging.info(f'Sending the following JSON to {self.url}:')
-        self._logging.info(json.dumps(request_json))
-        return self._execute_request(self.url, 'POST', json=request_json)
+        self._logging.info(payload)
+
+    def _response_json(self, response):
+        # the standard library decoding is what response.json() already does, so only decode ourselves otherwise
+        content = getattr(response, 'content', None)
+        if self._json_codec.name == 'json' or type(content) not in [bytes, str]:
+            return response.json()
+        return self._json_codec.loads(content)
+
+    def _execute_request(self, url, method, json=None, headers=None, retry_auth=False):
+        """
+        Sends a request, and retries it once with fresh credentials if it fails and the credentials are dynamic.
+
+        `retry_auth` is True for that second attempt, as for streaming and async requests.  Only the encoding
+        depends on the JSON codec: the faster codecs encode the body themselves.
+        """
+        request_headers = {**(headers if headers else {}), **self._auth.headers(retry_auth=retry_auth)}
+        request_bytes = None
+        if not json:
+            # the requests library builds a slightly different request if you specify the json parameter, even if it
+            # is null, and this causes trouble for some picky servers
+            response = self._requests.request(method, url, headers=request_headers)
+        elif self._json_codec.name == 'json':
+            response = self._requests.request(method, url, headers=request_headers, json=json)
+        else:
+            body = self._json_codec.dumps_bytes(json)
+            request_bytes = len(body)
+            request_headers['Content-Type'] = 'application/json'
+            response = self._requests.request(method, url, headers=request_headers, data=body)
+        if not response.ok:
+            if self._auth.has_dynamic_credentials and not retry_auth:
+                return self._execute_request(url, method, json=json, headers=headers, retry_auth=True)
+            raise ValueError(f'Failed request.  Status code: {response.status_code}, message: {response.content}')
+        self._record_round_trip(json, response, request_bytes=request_bytes)
+        return response
 
     def allowed_pagination_keys(self) -> List[str]:
-        return ['after']
+        return [self._pagination_key()]
 
     def validate_pagination_kwargs(self, kwargs: Dict[str, Any], case_mapping: Callable) -> str:
+        pagination_key = self._pagination_key()
+        key_name = case_mapping(pagination_key)
         extra_keys = set(kwargs.keys()) - set(self.allowed_pagination_keys())
         if len(extra_keys):
-            key_name = case_mapping('after')
             return "Invalid pagination key(s): '" + "','".join(extra_keys) + f"'.  Only '{key_name}' is allowed"
-        if 'after' not in kwargs:
-            key_name = case_mapping('after')
-            return f"You must specify '{after}' when setting pagination"
+        if pagination_key not in kwargs:
+            return f"You must specify '{key_name}' when setting pagination"
+        if pagination_key == 'start':
+            try:
+                int(kwargs['start'])
+            except (TypeError, ValueError):
+                return f"Invalid value for '{key_name}': it should be an integer"
         return ''
 
     def documentation_pagination_next_page_response(self, case_mapping: Callable) -> List[Any]:
-        return [AutoDocInteger(case_mapping('after'), example=10)]
+        if self._pagination_key() == 'start':
+            return [AutoDocInteger(case_mapping('start'), example=10)]
+        return [AutoDocString(case_mapping('after'), example='cursor-param')]
 
     def documentation_pagination_next_page_example(self, case_mapping: Callable) -> Dict[str, Any]:
+        if self._pagination_key() == 'start':
+            return {case_mapping('start'): 10}
         return {case_mapping('after'): 'cursor-param'}
 
     def documentation_pagination_parameters(self, case_mapping: Callable) -> List[Tuple[Any]]:
+        if self._pagination_key() == 'start':
+            return [(AutoDocInteger(case_mapping('start'), example=10), 'The zero-indexed record number to start at')]
         return [(
-            AutoDocInteger(case_mapping('after'),
-                           example='cursor-param'), 'The next cursor value to return records after'
+            AutoDocString(case_mapping('after'),
+                          example='cursor-param'), 'The next cursor value to return records after'
         )]
 
+    def column_from_backend(self, column, value):
+        # included HasMany data comes back as a list of records, which we turn into models
+        if isinstance(column, HasMany) and type(value) == list:
+            child_models = column.child_models
+            return [child_models.model(child) for child in value]
+        return super().column_from_backend(column, value)
+
     def column_to_backend(self, column, backend_data):
         # the main thing that we need to handle differently are relationships, as GQL has their own
         # formalizm for those.  Let's work our way down the tree.
@@ -4,8 +4,11 @@ from collections import OrderedDict
 from types import SimpleNamespace
 from .gql_backend import GqlBackend
 from clearskies.authentication.public import Public
+from clearskies.condition_parser import ConditionParser
 import clearskies
 import logging
+import threading
+import json
 from clearskies.di import StandardDependencies
 class User(clearskies.Model):
     def __init__(self, gql_backend, columns):
@@ -59,49 +62,801 @@ class GqlBackendTest(unittest.TestCase):
     def test_query(self):
         response = type('', (), {'ok': True, 'json': lambda: {"data": {"users": [{"id": 5}, {"id": 10}]}}})
         self.requests.request = MagicMock(return_value=response)
+        records = self.gql_backend.records({
+            'wheres': [
+                {
+                    'column': 'age',
+                    'operator': '=',
+                    'values': [5],
+                    'parsed': ''
+                },
+                {
+                    'column': 'id',
+                    'operator': '=',
+                    'values': [123],
+                    'parsed': ''
+                },
+            ],
+            'select_all':
+            True,
+        }, self.user)
+        self.assertEquals([{'id': 5}, {'id': 10}], records)
+        self.requests.request.assert_called_with(
+            'POST',
+            'https://example.gql',
+            headers={'Authorization': 'Bearer: asdfer'},
+            json={
+                'query':
+                'query users($where: UserWhere) {   users(where: $where) { id\n    name\n    category_id\n    age   }}',
+                'variables': {
+                    'where': {
+                        'age': 5,
+                        'id': 123
+                    }
+                },
+            }
+        )
+
+    def test_query_paginated(self):
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "usersConnection": {
+                            "edges": [{
+                                "cursor": "a",
+                                "node": {
+                                    "id": 5
+                                }
+                            }, {
+                                "cursor": "b",
+                                "node": {
+                                    "id": 10
+                                }
+                            }],
+                            "pageInfo": {
+                                "hasNextPage": True,
+                                "endCursor": "b"
+                            },
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        next_page_data = {}
         records = self.gql_backend.records(
             {
-                'wheres': [
-                    {
-                        'column': 'age',
-                        'operator': '=',
-                        'values': [5],
-                        'parsed': ''
-                    },
-                    {
-                        'column': 'id',
-                        'operator': '=',
-                        'values': [123],
-                        'parsed': ''
-                    },
-                ],
-                'select_all':
-                True,
-        #'sorts': [{
-        #'column': 'age',
-        #'direction': 'desc'
-        #}],
-        #'pagination': {
-        #'start': 200
-        #},
-                'limit':
-                100,
+                'wheres': [{
+                    'column': 'age',
+                    'operator': '=',
+                    'values': [5],
+                    'parsed': ''
+                }],
+                'select_all': True,
+                'limit': 2,
+                'pagination': {
+                    'after': 'z'
+                },
             },
-            self.user
+            self.user,
+            next_page_data=next_page_data,
         )
         self.assertEquals([{'id': 5}, {'id': 10}], records)
+        self.assertEquals({'after': 'b'}, next_page_data)
         self.requests.request.assert_called_with(
             'POST',
             'https://example.gql',
             headers={'Authorization': 'Bearer: asdfer'},
             json={
                 'query':
-                'query users($where: UserWhere) {   users(where: $where) { id\n    name\n    category_id\n    age   }}',
+                'query usersConnection($first: Int, $after: String, $where: UserWhere) {   ' +
+                'usersConnection(first: $first, after: $after, where: $where) {     edges { cursor node { ' +
+                'id\n      name\n      category_id\n      age     } }     pageInfo { hasNextPage endCursor }   } }',
                 'variables': {
+                    'first': 2,
+                    'after': 'z',
                     'where': {
                         'age': 5,
-                        'id': 123
                     }
                 },
             }
         )
+
+    def test_iter_records(self):
+        def page(ids, end_cursor):
+            return type(
+                '', (), {
+                    'ok': True,
+                    'json': lambda: {
+                        "data": {
+                            "usersConnection": {
+                                "edges": [{
+                                    "cursor": str(id),
+                                    "node": {
+                                        "id": id
+                                    }
+                                } for id in ids],
+                                "pageInfo": {
+                                    "hasNextPage": end_cursor is not None,
+                                    "endCursor": end_cursor
+                                },
+                            }
+                        }
+                    }
+                }
+            )
+
+        self.requests.request = MagicMock(side_effect=[page([1, 2], '2'), page([3], None)])
+        records = self.gql_backend.iter_records({'select_all': True}, self.user, page_size=2)
+        self.assertEquals(0, self.requests.request.call_count)
+        self.assertEquals([{'id': 1}, {'id': 2}, {'id': 3}], list(records))
+        self.assertEquals(2, self.requests.request.call_count)
+        self.assertEquals({'first': 2, 'after': '2'}, self.requests.request.call_args.kwargs['json']['variables'])
+
+    def test_count(self):
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"usersAggregate": {"count": 12}}}})
+        self.requests.request = MagicMock(return_value=response)
+        count = self.gql_backend.count(
+            {
+                'wheres': [{
+                    'column': 'age',
+                    'operator': '=',
+                    'values': [5],
+                    'parsed': ''
+                }],
+                'select_all': True,
+            },
+            self.user,
+        )
+        self.assertEquals(12, count)
+        self.requests.request.assert_called_with(
+            'POST',
+            'https://example.gql',
+            headers={'Authorization': 'Bearer: asdfer'},
+            json={
+                'query': 'query usersAggregate($where: UserWhere) {   usersAggregate(where: $where) { count } }',
+                'variables': {
+                    'where': {
+                        'age': 5
+                    }
+                },
+            }
+        )
+
+    def test_count_connection(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, count_strategy='connection')
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"usersConnection": {"totalCount": 3}}}})
+        self.requests.request = MagicMock(return_value=response)
+        count = self.gql_backend.count({'select_all': True}, self.user)
+        self.assertEquals(3, count)
+        self.requests.request.assert_called_with(
+            'POST',
+            'https://example.gql',
+            headers={'Authorization': 'Bearer: asdfer'},
+            json={'query': 'query usersConnection {   usersConnection { totalCount } }'},
+        )
+
+    def test_count_fallback(self):
+        error_response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "errors": [{
+                        "message": 'Cannot query field "usersAggregate"'
+                    }]
+                }
+            }
+        )
+        records_response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "usersConnection": {
+                            "edges": [{
+                                "cursor": "a",
+                                "node": {
+                                    "id": 5
+                                }
+                            }, {
+                                "cursor": "b",
+                                "node": {
+                                    "id": 10
+                                }
+                            }],
+                            "pageInfo": {
+                                "hasNextPage": False,
+                                "endCursor": "b"
+                            },
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(side_effect=[error_response, records_response, records_response])
+        self.assertEquals(2, self.gql_backend.count({'select_all': True}, self.user))
+        # and the fallback should be remembered so we don't keep trying the aggregate
+        self.assertEquals(2, self.gql_backend.count({'select_all': True}, self.user))
+        self.assertEquals(3, self.requests.request.call_count)
+
+    def test_count_no_fallback(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, count_fallback=None)
+        error_response = type('', (), {'ok': True, 'json': lambda: {"errors": [{"message": 'nope'}]}})
+        self.requests.request = MagicMock(return_value=error_response)
+        with self.assertRaises(ValueError):
+            self.gql_backend.count({'select_all': True}, self.user)
+
+    def test_count_no_fallback_for_other_errors(self):
+        # only a schema error means that the server can't count: anything else is raised as-is
+        error_response = type('', (), {'ok': True, 'json': lambda: {"errors": [{"message": 'database unavailable'}]}})
+        self.requests.request = MagicMock(return_value=error_response)
+        with self.assertRaises(ValueError):
+            self.gql_backend.count({'select_all': True}, self.user)
+        self.assertEquals(1, self.requests.request.call_count)
+
+    def test_query_cache(self):
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"users": [{"id": 5}]}}})
+        self.requests.request = MagicMock(return_value=response)
+        configuration = {
+            'wheres': [{
+                'column': 'age',
+                'operator': '=',
+                'values': [5],
+                'parsed': ''
+            }],
+            'select_all': True,
+        }
+        self.gql_backend.records(configuration, self.user)
+        misses = self.gql_backend.query_cache_stats()['misses']
+        first_query = self.requests.request.call_args.kwargs['json']['query']
+
+        configuration['wheres'][0]['values'] = [10]
+        self.gql_backend.records(configuration, self.user)
+        stats = self.gql_backend.query_cache_stats()
+        self.assertEquals(misses, stats['misses'])
+        self.assertEquals(misses, stats['size'])
+        self.assertTrue(stats['hits'] > 0)
+        self.assertEquals(first_query, self.requests.request.call_args.kwargs['json']['query'])
+        self.assertEquals({'where': {'age': 10}}, self.requests.request.call_args.kwargs['json']['variables'])
+
+        # a different selection is a different document
+        self.gql_backend.records({**configuration, 'select_all': False, 'selects': ['name']}, self.user)
+        self.assertEquals(misses + 1, self.gql_backend.query_cache_stats()['misses'])
+        self.assertEquals(
+            'query users($where: UserWhere) {   users(where: $where) { name   }}',
+            self.requests.request.call_args.kwargs['json']['query'],
+        )
+
+    def test_batch(self):
+        response = type(
+            '', (), {
+                'ok':
+                True,
+                'json':
+                lambda: [
+                    {
+                        "data": {
+                            "deleteUsers": {
+                                "nodesDeleted": 1
+                            }
+                        }
+                    },
+                    {
+                        "data": {
+                            "deleteUsers": {
+                                "nodesDeleted": 1
+                            }
+                        }
+                    },
+                    {
+                        "data": {
+                            "users": [{
+                                "id": 5
+                            }]
+                        }
+                    },
+                ]
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        with self.gql_backend.batch():
+            self.gql_backend.delete('1', self.user)
+            self.gql_backend.delete('2', self.user)
+            self.requests.request.assert_not_called()
+            records = self.gql_backend.records({'select_all': True}, self.user)
+
+        self.assertEquals([{'id': 5}], records)
+        self.assertEquals(1, self.requests.request.call_count)
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertEquals(3, len(request_json))
+        self.assertEquals({'where': {'id': '1'}}, request_json[0]['variables'])
+        self.assertEquals({'where': {'id': '2'}}, request_json[1]['variables'])
+        self.assertEquals('DeleteUsers', request_json[1]['operation_name'])
+
+    def test_batch_flushes_on_exit(self):
+        response = type('', (), {'ok': True, 'json': lambda: [{"data": {}}, {"errors": [{"message": "nope"}]}]})
+        self.requests.request = MagicMock(return_value=response)
+        with self.assertRaises(ValueError):
+            with self.gql_backend.batch():
+                self.gql_backend.delete('1', self.user)
+                self.gql_backend.delete('2', self.user)
+        self.assertEquals(1, self.requests.request.call_count)
+
+        # and we should be back to normal operation afterwards
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {}}})
+        self.requests.request = MagicMock(return_value=response)
+        self.gql_backend.delete('1', self.user)
+        self.assertEquals({'where': {'id': '1'}}, self.requests.request.call_args.kwargs['json']['variables'])
+
+    def test_micro_batching(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, batch_window=0.05)
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: [{
+                    "data": {
+                        "users": [{
+                            "id": 5
+                        }]
+                    }
+                }, {
+                    "data": {
+                        "users": [{
+                            "id": 10
+                        }]
+                    }
+                }]
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        results = {}
+
+        def fetch(name):
+            results[name] = self.gql_backend.records({'select_all': True}, self.user)
+
+        threads = [threading.Thread(target=fetch, args=(name, )) for name in ['a', 'b']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(1, self.requests.request.call_count)
+        self.assertEquals([[{'id': 5}], [{'id': 10}]], sorted(results.values(), key=lambda records: records[0]['id']))
+
+    def test_create(self):
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "createUsers": {
+                            "users": [{
+                                "id": "5",
+                                "name": "bob",
+                                "category_id": "1",
+                                "age": 10
+                            }]
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        record = self.gql_backend.create({'id': '5', 'name': 'bob', 'category_id': '1', 'age': 10}, self.user)
+        self.assertEquals({'id': '5', 'name': 'bob', 'category_id': '1', 'age': 10}, record)
+        self.requests.request.assert_called_once_with(
+            'POST',
+            'https://example.gql',
+            headers={'Authorization': 'Bearer: asdfer'},
+            json={
+                'query': 'mutation CreateUsers($input: [UserCreateInput!]!) { createUsers(input: $input) {   users { ' +
+                'id\n    name\n    category_id\n    age   }   } }',
+                'variables': {
+                    'input': [{
+                        'id': '5',
+                        'name': 'bob',
+                        'category_id': '1',
+                        'age': 10
+                    }]
+                },
+                'operation_name': 'CreateUsers',
+            }
+        )
+
+    def test_create_many(self):
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "createUsers": {
+                            "users": [{
+                                "id": "5"
+                            }, {
+                                "id": "6"
+                            }]
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        records = self.gql_backend.create_many([{'id': '5'}, {'id': '6'}], self.user)
+        self.assertEquals([{'id': '5'}, {'id': '6'}], records)
+        self.assertEquals(1, self.requests.request.call_count)
+        self.assertEquals({'input': [{
+            'id': '5'
+        }, {
+            'id': '6'
+        }]}, self.requests.request.call_args.kwargs['json']['variables'])
+
+        response = type('', (), {'ok': True, 'json': lambda: {"errors": [{"message": "nope"}]}})
+        self.requests.request = MagicMock(return_value=response)
+        with self.assertRaises(ValueError):
+            self.gql_backend.create_many([{'id': '5'}], self.user)
+
+    def test_update(self):
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "updateUsers": {
+                            "users": [{
+                                "id": "5",
+                                "name": "bob",
+                                "category_id": "1",
+                                "age": 11
+                            }]
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        record = self.gql_backend.update('5', {'age': 11}, self.user)
+        self.assertEquals({'id': '5', 'name': 'bob', 'category_id': '1', 'age': 11}, record)
+        self.requests.request.assert_called_once_with(
+            'POST',
+            'https://example.gql',
+            headers={'Authorization': 'Bearer: asdfer'},
+            json={
+                'query':
+                'mutation UpdateUsers($where: UserWhere, $update: UserUpdateInput) {   ' +
+                'updateUsers(where: $where, update: $update) {     users { id\n      name\n      category_id\n      ' +
+                'age     }   } }',
+                'variables': {
+                    'where': {
+                        'id': '5'
+                    },
+                    'update': {
+                        'age': 11
+                    }
+                },
+                'operation_name':
+                'UpdateUsers',
+            }
+        )
+
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"updateUsers": {"users": []}}}})
+        self.requests.request = MagicMock(return_value=response)
+        with self.assertRaises(ValueError):
+            self.gql_backend.update('5', {'age': 11}, self.user)
+
+    def test_update_many(self):
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "updateUsers": {
+                            "users": [{
+                                "id": "5",
+                                "age": 11
+                            }, {
+                                "id": "6",
+                                "age": 11
+                            }]
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        records = self.gql_backend.update_many([{
+            'column': 'category_id',
+            'operator': '=',
+            'values': ['1']
+        }], {'age': 11}, self.user)
+        self.assertEquals([{'id': '5', 'age': 11}, {'id': '6', 'age': 11}], records)
+        self.assertEquals({
+            'where': {
+                'category_id': '1'
+            },
+            'update': {
+                'age': 11
+            }
+        }, self.requests.request.call_args.kwargs['json']['variables'])
+
+        with self.assertRaises(ValueError):
+            self.gql_backend.update_many([], {'age': 11}, self.user)
+
+    def test_search_string(self):
+        parser = ConditionParser()
+        search = lambda *conditions: self.gql_backend._build_gql_search_string(
+            [parser.parse_condition(condition) if type(condition) == str else condition for condition in conditions],
+            self.user,
+        )
+        self.assertEquals({'name': 'bob', 'age_GT': 5}, search('name=bob', 'age>5'))
+        self.assertEquals({'age_GTE': 5, 'age_LT': 10, 'age_LTE': 9}, search('age>=5', 'age<10', 'age<=9'))
+        self.assertEquals({'name_NOT': 'bob'}, search('name!=bob'))
+        self.assertEquals({'age_IN': [1, 2]}, search('age IN (1,2)'))
+        self.assertEquals({'name': None, 'category_id_NOT': None}, search('name IS NULL', 'category_id IS NOT NULL'))
+        self.assertEquals({'name_CONTAINS': 'ob'}, search("name LIKE '%ob%'"))
+        self.assertEquals({'name_STARTS_WITH': 'bo'}, search("name LIKE 'bo%'"))
+        self.assertEquals({'name_ENDS_WITH': 'ob'}, search("name LIKE '%ob'"))
+        self.assertEquals({'AND': [{'age_GT': 5}, {'age_GT': 6}]}, search('age>5', 'age>6'))
+        self.assertEquals(
+            {
+                'age': 5,
+                'OR': [{
+                    'name': 'bob'
+                }, {
+                    'name': 'jane',
+                    'category_id': '2'
+                }]
+            },
+            search(
+                'age=5', {
+                    'operator':
+                    'OR',
+                    'conditions': [
+                        parser.parse_condition('name=bob'), {
+                            'operator': 'AND',
+                            'conditions':
+                            [parser.parse_condition('name=jane'),
+                             parser.parse_condition('category_id=2')]
+                        }
+                    ]
+                }
+            ),
+        )
+        with self.assertRaises(ValueError):
+            search("name LIKE 'b%b'")
+
+    def test_query_sorted(self):
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"users": [{"id": "5"}]}}})
+        self.requests.request = MagicMock(return_value=response)
+        self.gql_backend.records({
+            'select_all':
+            True,
+            'sorts': [{
+                'column': 'age',
+                'direction': 'desc'
+            }, {
+                'column': 'name',
+                'direction': 'asc'
+            }]
+        }, self.user)
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertEquals(
+            'query users($options: UserOptions) {   users(options: $options) { id\n    name\n    category_id\n    ' +
+            'age   }}',
+            request_json['query'],
+        )
+        self.assertEquals({'options': {'sort': [{'age': 'DESC'}, {'name': 'ASC'}]}}, request_json['variables'])
+
+        response = type(
+            '', (), {
+                'ok': True,
+                'json': lambda: {
+                    "data": {
+                        "usersConnection": {
+                            "edges": [],
+                            "pageInfo": {
+                                "hasNextPage": False
+                            }
+                        }
+                    }
+                }
+            }
+        )
+        self.requests.request = MagicMock(return_value=response)
+        self.gql_backend.records({
+            'select_all': True,
+            'limit': 5,
+            'sorts': [{
+                'column': 'age',
+                'direction': 'desc'
+            }]
+        }, self.user)
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertTrue(
+            request_json['query'].startswith(
+                'query usersConnection($first: Int, $sort: [UserSort!]) {   usersConnection(first: $first, sort: $sort)'
+            )
+        )
+        self.assertEquals({'first': 5, 'sort': [{'age': 'DESC'}]}, request_json['variables'])
+
+    def test_query_offset_pagination(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, pagination_style='offset')
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"users": [{"id": "5"}, {"id": "6"}]}}})
+        self.requests.request = MagicMock(return_value=response)
+        next_page_data = {}
+        records = self.gql_backend.records({
+            'select_all': True,
+            'limit': 2,
+            'pagination': {
+                'start': 4
+            },
+            'sorts': [{
+                'column': 'age',
+                'direction': 'asc'
+            }]
+        },
+                                           self.user,
+                                           next_page_data=next_page_data)
+        self.assertEquals([{'id': '5'}, {'id': '6'}], records)
+        self.assertEquals({'start': 6}, next_page_data)
+        self.assertEquals({'options': {
+            'sort': [{
+                'age': 'ASC'
+            }],
+            'limit': 2,
+            'offset': 4
+        }}, self.requests.request.call_args.kwargs['json']['variables'])
+        self.assertEquals(['start'], self.gql_backend.allowed_pagination_keys())
+        self.assertEquals('', self.gql_backend.validate_pagination_kwargs({'start': '5'}, str))
+        self.assertNotEquals('', self.gql_backend.validate_pagination_kwargs({'start': 'asdf'}, str))
+        self.assertNotEquals('', self.gql_backend.validate_pagination_kwargs({'after': 'a'}, str))
+
+        response = type('', (), {'ok': True, 'json': lambda: {"data": {"users": [{"id": "7"}]}}})
+        self.requests.request = MagicMock(return_value=response)
+        next_page_data = {}
+        self.gql_backend.records({'select_all': True, 'limit': 2}, self.user, next_page_data=next_page_data)
+        self.assertEquals({}, next_page_data)
+
+    def test_response_cache(self):
+        self.gql_backend.configure(
+            url='https://example.gql', auth=self.auth, response_cache_ttl=60, response_cache_ttls={'pet': 0}
+        )
+        response_json = MagicMock(side_effect=lambda: {"data": {"users": [{"id": "5"}]}})
+        response = type('', (), {'ok': True, 'json': response_json})
+        self.requests.request = MagicMock(return_value=response)
+        configuration = {'wheres': [{'column': 'age', 'operator': '=', 'values': [5]}], 'select_all': True}
+        self.assertEquals([{'id': '5'}], self.gql_backend.records(configuration, self.user))
+        # the response is decoded once, and that's shared by the cache and the records
+        self.assertEquals(1, response_json.call_count)
+        # the cached response is a copy, so changes to the records we got back don't leak into it
+        self.gql_backend.records(configuration, self.user)[0]['id'] = '6'
+        self.assertEquals([{'id': '5'}], self.gql_backend.records(configuration, self.user))
+        self.assertEquals(1, self.requests.request.call_count)
+
+        # different variables are a different query
+        self.gql_backend.records({
+            **configuration, 'wheres': [{
+                'column': 'age',
+                'operator': '=',
+                'values': [6]
+            }]
+        }, self.user)
+        self.assertEquals(2, self.requests.request.call_count)
+
+        # and changes to the table clear out the cache
+        self.gql_backend.delete('5', self.user)
+        self.gql_backend.records(configuration, self.user)
+        self.assertEquals(4, self.requests.request.call_count)
+        self.assertEquals(2, self.gql_backend.response_cache_stats()['hits'])
+
+    def test_pages_per_thread(self):
+        def respond(method, url, headers=None, json=None):
+            age = json['variables']['where']['age']
+            users = [{'id': f'{age}-a'}, {'id': f'{age}-b'}]
+            return type('', (), {'ok': True, 'json': lambda: {'data': {'users': users}}})
+
+        self.requests.request = MagicMock(side_effect=respond)
+        barrier = threading.Barrier(4)
+        pages = {}
+
+        def load_page(age):
+            configuration = {'wheres': [{'column': 'age', 'operator': '=', 'values': [age]}], 'select_all': True}
+            for _ in range(20):
+                self.gql_backend.records(configuration, self.user)
+            barrier.wait()
+            # every thread still has its own page, rather than whichever one was loaded last
+            pages[age] = self.gql_backend._page_state().record_pages['user']
+
+        threads = [threading.Thread(target=load_page, args=(age, )) for age in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals({age: [f'{age}-a', f'{age}-b'] for age in range(4)}, pages)
+
+    def test_pages_survive_connection_changes(self):
+        response = type('', (), {'ok': True, 'json': lambda: {'data': {'users': [{'id': '1'}, {'id': '2'}]}}})
+        self.requests.request = MagicMock(return_value=response)
+        self.gql_backend.records({'select_all': True}, self.user)
+        self.gql_backend._page_state().connection_batches[('user', 'tags')] = {'1': []}
+
+        # another thread changes some connections, which drops our connected records but not our page
+        thread = threading.Thread(target=self.gql_backend._forget_connected_records)
+        thread.start()
+        thread.join()
+        self.assertEquals(['1', '2'], self.gql_backend._page_state().record_pages['user'])
+        self.assertEquals({}, self.gql_backend._page_state().connection_batches)
+
+    def test_response_cache_errors(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, response_cache_ttl=60)
+        response = type('', (), {'ok': True, 'json': lambda: {"errors": [{"message": "nope"}]}})
+        self.requests.request = MagicMock(return_value=response)
+        for i in range(2):
+            with self.assertRaises(ValueError):
+                self.gql_backend.records({'select_all': True}, self.user)
+        self.assertEquals(2, self.requests.request.call_count)
+
+    def test_stream_records(self):
+        body = json.dumps({'data': {'users': [{'id': '1'}, {'id': '2'}]}})
+        response = SimpleNamespace(
+            ok=True,
+            iter_content=MagicMock(return_value=[body[:10], body[10:25], body[25:]]),
+            close=MagicMock(),
+        )
+        self.requests.request = MagicMock(return_value=response)
+        records = self.gql_backend.stream_records({'select_all': True}, self.user)
+        self.assertEquals({'id': '1'}, next(records))
+        self.assertEquals([{'id': '2'}], list(records))
+        self.assertTrue(self.requests.request.call_args.kwargs['stream'])
+        response.close.assert_called_once()
+
+        response.iter_content = MagicMock(return_value=['{"errors": [{"message": "nope"}]}'])
+        with self.assertRaises(ValueError):
+            list(self.gql_backend.stream_records({'select_all': True}, self.user))
+
+    def test_request_logging(self):
+        logger = SimpleNamespace(isEnabledFor=MagicMock(return_value=False), info=MagicMock())
+        backend = GqlBackend(self.requests, 'environment', logger)
+        backend.configure(url='https://example.gql', auth=self.auth, log_max_length=20)
+        backend._build_request_json('query { users { id name category_id age } }')
+        logger.info.assert_not_called()
+
+        logger.isEnabledFor = MagicMock(return_value=True)
+        backend._build_request_json('query { users { id name category_id age } }')
+        self.assertEquals('{"query": "query { u... (36 more characters)', logger.info.call_args.args[0])
+
+    def test_auth_retry(self):
+        auth = SimpleNamespace(headers=MagicMock(return_value={}), has_dynamic_credentials=True)
+        body = b'{"data": {"usersAggregate": {"count": 5}}}'
+        for json_codec in ['json', 'orjson']:
+            self.gql_backend.configure(url='https://example.gql', auth=auth, json_codec=json_codec)
+            failed = SimpleNamespace(ok=False, status_code=401, content=b'expired')
+            response = SimpleNamespace(ok=True, content=body, json=lambda: json.loads(body))
+            self.requests.request = MagicMock(side_effect=[failed, response])
+            auth.headers.reset_mock()
+            # the same retry with fresh credentials whichever codec encodes the request
+            self.assertEquals(5, self.gql_backend.count({}, self.user))
+            self.assertEquals(2, self.requests.request.call_count)
+            self.assertEquals([{
+                'retry_auth': False
+            }, {
+                'retry_auth': True
+            }], [call.kwargs for call in auth.headers.call_args_list])
+
+            self.requests.request = MagicMock(return_value=failed)
+            with self.assertRaises(ValueError):
+                self.gql_backend.count({}, self.user)
+            self.assertEquals(2, self.requests.request.call_count)
+
+    def test_orjson_codec(self):
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth, json_codec='orjson')
+        response = SimpleNamespace(ok=True, content=b'{"data": {"usersAggregate": {"count": 5}}}')
+        self.requests.request = MagicMock(return_value=response)
+        self.assertEquals(5, self.gql_backend.count({}, self.user))
+        kwargs = self.requests.request.call_args.kwargs
+        self.assertNotIn('json', kwargs)
+        self.assertEquals('application/json', kwargs['headers']['Content-Type'])
+        self.assertEquals('query usersAggregate {   usersAggregate { count } }', json.loads(kwargs['data'])['query'])
+
+        with self.assertRaises(ValueError):
+            self.gql_backend.configure(url='https://example.gql', auth=self.auth, json_codec='yaml')
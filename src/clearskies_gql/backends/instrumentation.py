@@ -0,0 +1,187 @@
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+# the call that is currently running, so that the requests it sends can be attributed to it.
+current_call = contextvars.ContextVar('clearskies_gql_current_call', default=None)
+# calls can be added to from several threads at once (e.g. when the ids of an operation are sent in parallel chunks)
+_add_lock = threading.Lock()
+class GqlCall:
+    """
+    One call to a method of the GqlBackend (e.g. `records` or `create`), and what it cost.
+
+    Calls made while another is running (e.g. the `records` calls that a `count` falls back to) have that call as
+    their `parent`, and their round trips, bytes, and cache lookups are added to the parent's totals as well.
+    """
+    action = None
+    table_name = None
+    operation_name = None
+    parent = None
+    is_next_page = None
+    started_at = None
+    latency = None
+    round_trips = None
+    request_bytes = None
+    response_bytes = None
+    records = None
+    cache_hits = None
+    cache_misses = None
+    error = None
+    _start = None
+
+    def __init__(self, action, table_name, parent=None):
+        self.action = action
+        self.table_name = table_name
+        self.parent = parent
+        self.is_next_page = False
+        self.started_at = time.time_ns()
+        self.round_trips = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._start = time.perf_counter()
+
+    def add(self, **counts):
+        with _add_lock:
+            call = self
+            while call is not None:
+                for (name, count) in counts.items():
+                    setattr(call, name, getattr(call, name) + count)
+                call = call.parent
+
+    def finish(self, error=None):
+        self.latency = time.perf_counter() - self._start
+        self.error = error
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'table_name': self.table_name,
+            'operation_name': self.operation_name,
+            'is_next_page': self.is_next_page,
+            'latency': self.latency,
+            'round_trips': self.round_trips,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'records': self.records,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'error': str(self.error) if self.error is not None else None,
+        }
+class Instrumentation:
+    """
+    Receives every finished GqlCall.  Extend this and override `record`.
+    """
+    def record(self, call):
+        pass
+class CallbackInstrumentation(Instrumentation):
+    """
+    Passes every finished GqlCall along to a function.
+    """
+    _callback = None
+
+    def __init__(self, callback):
+        self._callback = callback
+
+    def record(self, call):
+        self._callback(call)
+class OpenTelemetryInstrumentation(Instrumentation):
+    """
+    Turns every GqlCall into an OpenTelemetry span.
+
+    Pass in a tracer (e.g. `opentelemetry.trace.get_tracer(__name__)`).  The span is created after the call
+    finishes, with the start and end times of the call, so it is a child of whatever span was current at the time.
+    """
+    _tracer = None
+
+    def __init__(self, tracer):
+        self._tracer = tracer
+
+    def record(self, call):
+        # OpenTelemetry attributes can't be None
+        attributes = {
+            f'gql.{name}': value
+            for (name, value) in call.as_dict().items() if value is not None and name != 'error'
+        }
+        span = self._tracer.start_span(f'gql {call.action}', start_time=call.started_at, attributes=attributes)
+        if call.error is not None:
+            span.record_exception(call.error)
+        span.end(end_time=call.started_at + int(call.latency * 1e9))
+class QueryCounter(Instrumentation):
+    """
+    Counts the GQL calls made while handling a request, and flags the ones that look like N+1 queries.
+
+    Wrap the handling of each request in `scope()`.  Any action that runs against the same table more than
+    `threshold` times within a scope is logged as a warning (once per scope) and listed by `repeated()`.  Only
+    top-level calls count, and follow-up pages of a paginated query don't count, since fetching page after page
+    isn't an N+1 problem.
+
+    ```
+    with query_counter.scope():
+        handle_request()
+    ```
+    """
+    threshold = None
+    _logging = None
+    _scope = None
+
+    def __init__(self, threshold=3, logging=None):
+        self.threshold = threshold
+        self._logging = logging
+        self._scope = contextvars.ContextVar(f'clearskies_gql_query_counter_{id(self)}', default=None)
+
+    @contextmanager
+    def scope(self):
+        token = self._scope.set({'counts': {}, 'round_trips': 0, 'repeated': []})
+        try:
+            yield self
+        finally:
+            self._scope.reset(token)
+
+    def record(self, call):
+        scope = self._scope.get()
+        if scope is None or call.parent is not None:
+            return
+        scope['round_trips'] += call.round_trips
+        if call.is_next_page:
+            return
+        key = (call.action, call.table_name)
+        scope['counts'][key] = scope['counts'].get(key, 0) + 1
+        if scope['counts'][key] == self.threshold + 1:
+            scope['repeated'].append(key)
+            if self._logging:
+                self._logging.warning(
+                    f"Possible N+1 queries: '{call.action}' ran against '{call.table_name}' more than " +
+                    f"{self.threshold} times while handling one request"
+                )
+
+    def counts(self):
+        """
+        Returns the number of calls per (action, table name) in the current scope.
+        """
+        scope = self._scope.get()
+        return {**scope['counts']} if scope else {}
+
+    def round_trips(self):
+        scope = self._scope.get()
+        return scope['round_trips'] if scope else 0
+
+    def repeated(self):
+        """
+        Returns the (action, table name) pairs that went over the threshold in the current scope.
+        """
+        scope = self._scope.get()
+        return [*scope['repeated']] if scope else []
+def build_instrumentation(instrumentation):
+    """
+    Returns a list of Instrumentation objects, from one object, a function, or a list of either.
+    """
+    if not instrumentation:
+        return []
+    if type(instrumentation) not in [list, tuple]:
+        instrumentation = [instrumentation]
+    return [
+        CallbackInstrumentation(instrument)
+        if not hasattr(instrument, 'record') and callable(instrument) else instrument for instrument in instrumentation
+    ]
@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import MagicMock
+import logging
+import requests
+from ..benchmarks import StubGqlServer, seed_graph
+from ..benchmarks.suite import Users, build_backend
+from .instrumentation import OpenTelemetryInstrumentation, QueryCounter
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.session = requests.Session()
+        self.server = StubGqlServer(seed_graph(users=10, tags=5, tags_per_user=2)).start()
+        self.calls = []
+        self.query_counter = QueryCounter(threshold=3, logging=logging)
+        (self.di, self.gql_backend) = build_backend(
+            self.server,
+            self.session,
+            backend_config={
+                'instrumentation': [self.calls.append, self.query_counter],
+                'response_cache_ttl': 60,
+            },
+        )
+        self.users = self.di.build(Users)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_calls(self):
+        records = self.gql_backend.records({'select_all': True}, self.users.empty_model())
+        self.gql_backend.records({'select_all': True}, self.users.empty_model())
+        self.users.create({'name': 'jane', 'age': 5})
+
+        self.assertEquals(['records', 'records', 'create'], [call.action for call in self.calls])
+        (first, second, create) = self.calls
+        self.assertEquals('user', first.table_name)
+        self.assertEquals('users', first.operation_name)
+        self.assertEquals(1, first.round_trips)
+        self.assertEquals(10, first.records)
+        self.assertEquals(1, first.cache_misses)
+        self.assertGreater(first.request_bytes, 0)
+        self.assertGreater(first.response_bytes, 0)
+        self.assertGreater(first.latency, 0)
+        # the second one came out of the response cache
+        self.assertEquals(0, second.round_trips)
+        self.assertEquals(1, second.cache_hits)
+        self.assertEquals('CreateUsers', create.operation_name)
+        self.assertEquals(1, create.records)
+
+    def test_nested_calls(self):
+        self.gql_backend.configure(
+            url=self.server.url,
+            count_strategy='records',
+            instrumentation=self.calls.append,
+        )
+        self.assertEquals(10, self.gql_backend.count({}, self.users.empty_model()))
+        self.assertEquals(['records', 'count'], [call.action for call in self.calls])
+        (records, count) = self.calls
+        self.assertEquals(count, records.parent)
+        self.assertEquals(1, count.round_trips)
+        self.assertEquals(records.response_bytes, count.response_bytes)
+
+    def test_query_counter(self):
+        with self.query_counter.scope():
+            # loading the tags for a whole page of users is one query
+            for user in self.users:
+                user.tags
+            self.assertEquals([], self.query_counter.repeated())
+
+            # but finding users one at a time means one query for the tags of each
+            for name in ['user-1', 'user-2', 'user-3', 'user-4', 'user-5']:
+                self.users.find(f'name={name}').tags
+            self.assertEquals([('records', 'user'), ('connected_records', 'tag')], self.query_counter.repeated())
+            self.assertEquals(6, self.query_counter.counts()[('connected_records', 'tag')])
+
+        with self.query_counter.scope():
+            self.assertEquals([], self.query_counter.repeated())
+            # paging through records is not an N+1 problem
+            list(self.gql_backend.iter_records({'select_all': True}, self.users.empty_model(), page_size=2))
+            self.assertEquals([], self.query_counter.repeated())
+            self.assertEquals(5, self.query_counter.round_trips())
+
+    def test_open_telemetry(self):
+        span = MagicMock()
+        tracer = MagicMock()
+        tracer.start_span = MagicMock(return_value=span)
+        self.gql_backend.configure(url=self.server.url, instrumentation=OpenTelemetryInstrumentation(tracer))
+        self.gql_backend.records({'select_all': True}, self.users.empty_model())
+
+        self.assertEquals('gql records', tracer.start_span.call_args.args[0])
+        attributes = tracer.start_span.call_args.kwargs['attributes']
+        self.assertEquals('user', attributes['gql.table_name'])
+        self.assertEquals(10, attributes['gql.records'])
+        self.assertNotIn('gql.error', attributes)
+        self.assertGreaterEqual(span.end.call_args.kwargs['end_time'], tracer.start_span.call_args.kwargs['start_time'])
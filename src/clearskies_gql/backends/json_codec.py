@@ -0,0 +1,47 @@
+import json
+class JsonCodec:
+    """
+    Encodes and decodes JSON with the standard library.
+    """
+    name = 'json'
+
+    def dumps(self, value):
+        return json.dumps(value)
+
+    def loads(self, value):
+        return json.loads(value)
+class OrjsonCodec(JsonCodec):
+    """
+    Encodes and decodes JSON with orjson, which is considerably faster for large payloads.
+    """
+    name = 'orjson'
+    _orjson = None
+
+    def __init__(self):
+        # by importing orjson here, it only needs to be installed if you actually use it
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, value):
+        return self._orjson.dumps(value).decode('utf-8')
+
+    def dumps_bytes(self, value):
+        return self._orjson.dumps(value)
+
+    def loads(self, value):
+        return self._orjson.loads(value)
+json_codecs = ['json', 'orjson', 'auto']
+def build_json_codec(name):
+    """
+    Returns the codec with the given name.  'auto' uses orjson if it is installed, and the standard library otherwise.
+    """
+    if name not in json_codecs:
+        raise ValueError(f"Invalid json_codec for GqlBackend: '{name}'.  Allowed values are: " + ', '.join(json_codecs))
+    if name == 'json':
+        return JsonCodec()
+    if name == 'orjson':
+        return OrjsonCodec()
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
@@ -0,0 +1,476 @@
+from clearskies.backends.backend import Backend
+from clearskies.autodoc.schema import Integer as AutoDocInteger
+from clearskies.column_types import BelongsTo, Float, Integer
+from typing import Any, Callable, Dict, List, Tuple
+from ..column_types import Connection
+from ..column_types.model_metadata import model_metadata
+import threading
+import time
+class MirrorTable:
+    """
+    An in-memory copy of one table, with an index (value => ids) for each of the indexed columns.
+    """
+    model = None
+    id_column_name = None
+    watermark_column_name = None
+    index_column_names = None
+    records = None
+    indexes = None
+    watermark = None
+    synced_at = None
+    reloaded_at = None
+    lock = None
+    sync_lock = None
+    deleted_ids = None
+
+    def __init__(self, model, watermark_column_name, index_column_names):
+        self.model = model
+        self.id_column_name = model.id_column_name
+        self.watermark_column_name = watermark_column_name
+        self.index_column_names = index_column_names
+        self.records = {}
+        self.indexes = {column_name: {} for column_name in index_column_names}
+        self.deleted_ids = set()
+        self.lock = threading.Lock()
+        # only one sync per table at a time, but reads don't have to wait for it
+        self.sync_lock = threading.Lock()
+
+    def start_sync(self):
+        """
+        Starts tracking deletes, so that a sync which fetched a record before it was deleted doesn't put it back.
+        """
+        with self.lock:
+            self.deleted_ids = set()
+
+    def replace(self, records, synced_at):
+        with self.lock:
+            self.records = {}
+            self.indexes = {column_name: {} for column_name in self.index_column_names}
+            self.watermark = None
+            for record in records:
+                self._upsert(record, from_sync=True)
+            self.synced_at = synced_at
+            self.reloaded_at = synced_at
+
+    def merge(self, records, synced_at):
+        with self.lock:
+            for record in records:
+                self._upsert(record, from_sync=True)
+            self.synced_at = synced_at
+
+    def upsert(self, record):
+        with self.lock:
+            self._upsert(record)
+
+    def _upsert(self, record, from_sync=False):
+        id = record.get(self.id_column_name)
+        if id is None:
+            return
+        if from_sync and id in self.deleted_ids:
+            return
+        if not from_sync:
+            self.deleted_ids.discard(id)
+        watermark = record.get(self.watermark_column_name)
+        existing = self.records.get(id)
+        if existing is not None:
+            # a sync that started before a write can finish after it, in which case its copy is the older one
+            existing_watermark = existing.get(self.watermark_column_name)
+            if _is_after(existing_watermark, watermark):
+                return
+            self._unindex(id, existing)
+        self.records[id] = record
+        for (column_name, index) in self.indexes.items():
+            value = record.get(column_name)
+            if _is_indexable(value):
+                index.setdefault(value, set()).add(id)
+        # the watermark is where the next sync picks up from, so only records from the server query can move it: a
+        # write of ours can be newer than changes made elsewhere that we haven't synced yet.
+        if from_sync and _is_after(watermark, self.watermark):
+            self.watermark = watermark
+
+    def remove(self, id):
+        with self.lock:
+            self.deleted_ids.add(id)
+            existing = self.records.pop(id, None)
+            if existing is not None:
+                self._unindex(id, existing)
+
+    def _unindex(self, id, record):
+        for (column_name, index) in self.indexes.items():
+            value = record.get(column_name)
+            if not _is_indexable(value) or value not in index:
+                continue
+            index[value].discard(id)
+            if not index[value]:
+                del index[value]
+def _is_indexable(value):
+    return value is None or type(value) in [str, int, float, bool]
+def _is_after(watermark, other_watermark):
+    if watermark is None:
+        return False
+    if other_watermark is None:
+        return True
+    try:
+        return watermark > other_watermark
+    except TypeError:
+        return str(watermark) > str(other_watermark)
+class MirrorBackend(Backend):
+    """
+    Keeps a local copy of small, read-mostly tables and answers `records` and `count` from it.
+
+    Each table is loaded in full (through the GqlBackend) the first time it is used, with an index for each of
+    its columns so that equality and IN conditions don't have to scan every record.  After that, the mirror is
+    refreshed every `refresh_interval` seconds by fetching only the records whose watermark column (e.g.
+    `updated_at`) is at or after the newest value already in the mirror.  Writes go through to the GqlBackend,
+    and the records it returns are written into the mirror.
+
+    Records deleted on the server (by someone other than this backend) don't show up in a watermark query, so they
+    stay in the mirror until the next full reload: set `full_reload_interval` if that matters for your tables.
+    Connection columns still fetch their related records from the server, via the GqlBackend.
+    """
+    _logging = None
+    _gql_backend = None
+    _watermark_column_name = None
+    _refresh_interval = None
+    _background_refresh = None
+    _full_reload_interval = None
+    _index_columns = None
+    _page_size = None
+    _tables = None
+    _lock = None
+    _refresher = None
+    _stop = None
+
+    def __init__(self, logging):
+        self._logging = logging
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def configure(
+        self,
+        gql_backend,
+        watermark_column_name='updated_at',
+        refresh_interval=60,
+        background_refresh=True,
+        full_reload_interval=None,
+        index_columns=None,
+        page_size=500,
+    ):
+        if not watermark_column_name:
+            raise ValueError("watermark_column_name is required for the MirrorBackend")
+        self._gql_backend = gql_backend
+        self._watermark_column_name = watermark_column_name
+        self._refresh_interval = refresh_interval
+        self._background_refresh = background_refresh
+        self._full_reload_interval = full_reload_interval
+        self._index_columns = index_columns if index_columns else {}
+        self._page_size = page_size
+        self.close()
+        self._tables = {}
+
+    def close(self):
+        """
+        Stops the background refresh.
+        """
+        if self._refresher is not None:
+            self._stop.set()
+            self._refresher.join()
+            self._refresher = None
+        self._stop = threading.Event()
+
+    def mirror_stats(self):
+        now = time.monotonic()
+        return {
+            table_name: {
+                'records': len(table.records),
+                'watermark': table.watermark,
+                'seconds_since_sync': now - table.synced_at if table.synced_at is not None else None,
+            }
+            for (table_name, table) in self._tables.items()
+        }
+
+    def records(self, configuration, model, next_page_data=None):
+        table = self._table(model)
+        records = self._sort(
+            self._matching_records(table, configuration.get('wheres'), model), configuration.get('sorts'), model
+        )
+        start = int((configuration.get('pagination') or {}).get('start') or 0)
+        end = start + int(configuration['limit']) if configuration.get('limit') else len(records)
+        if end < len(records) and type(next_page_data) == dict:
+            next_page_data['start'] = end
+        records = [{**record} for record in records[start:end]]
+        # so that Connection columns can still fetch their related records for the whole page at once
+        self._gql_backend.remember_page(model, records)
+        return records
+
+    def count(self, configuration, model):
+        return len(self._matching_records(self._table(model), configuration.get('wheres'), model))
+
+    def create(self, data, model):
+        record = self._gql_backend.create(data, model)
+        self._write_to_mirror(record, model)
+        return record
+
+    def update(self, id, data, model):
+        record = self._gql_backend.update(id, data, model)
+        self._write_to_mirror(record, model)
+        return record
+
+    def delete(self, id, model):
+        self._gql_backend.delete(id, model)
+        table = self._tables.get(model.table_name())
+        if table is not None:
+            table.remove(id)
+        return True
+
+    def connected_records(self, own_model, column, id, id_column_name):
+        return self._gql_backend.connected_records(own_model, column, id, id_column_name)
+
+    def update_connections(self, from_record_id_column_name, from_record_id, changes, model):
+        return self._gql_backend.update_connections(from_record_id_column_name, from_record_id, changes, model)
+
+    def refresh(self, table_name=None):
+        """
+        Brings the mirrored tables (or just the given one) up to date with the server.
+        """
+        tables = [self._tables[table_name]] if table_name else list(self._tables.values())
+        for table in tables:
+            self._sync(table)
+
+    def reload(self, table_name=None):
+        """
+        Reloads the mirrored tables (or just the given one) in full, which also drops records deleted elsewhere.
+        """
+        tables = [self._tables[table_name]] if table_name else list(self._tables.values())
+        for table in tables:
+            self._sync(table, full=True)
+
+    def _table(self, model):
+        table_name = model.table_name()
+        table = self._tables.get(table_name)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(table_name)
+                if table is None:
+                    table = MirrorTable(model, self._watermark_column_name, self._index_column_names(model))
+                    self._tables[table_name] = table
+                    self._start_background_refresh()
+
+        if table.synced_at is None:
+            self._sync(table, unless=lambda: table.synced_at is not None)
+        elif not self._background_refresh and self._is_stale(table):
+            self._sync(table, unless=lambda: not self._is_stale(table))
+        return table
+
+    def _index_column_names(self, model):
+        table_name = model.table_name()
+        if table_name in self._index_columns:
+            return tuple(self._index_columns[table_name])
+        # by default, index everything that comes back as a plain value
+        return tuple(
+            column_name for (column_name, selection) in model_metadata.get(model).select_all if column_name == selection
+        )
+
+    def _is_stale(self, table):
+        if not self._refresh_interval:
+            return False
+        return time.monotonic() - table.synced_at >= self._refresh_interval
+
+    def _sync(self, table, full=False, unless=None):
+        with table.sync_lock:
+            # another thread may have done the work while we waited for the lock
+            if unless is not None and unless():
+                return
+            reload_is_due = self._full_reload_interval and table.reloaded_at is not None and \
+                time.monotonic() - table.reloaded_at >= self._full_reload_interval
+            synced_at = time.monotonic()
+            table.start_sync()
+            if full or reload_is_due or table.watermark is None:
+                table.replace(self._fetch(table.model, []), synced_at)
+                return
+            wheres = [{'column': self._watermark_column_name, 'operator': '>=', 'values': [table.watermark]}]
+            table.merge(self._fetch(table.model, wheres), synced_at)
+
+    def _fetch(self, model, wheres):
+        # refreshes run outside of any request, so they shouldn't replace the current page of records
+        records = self._gql_backend.iter_records(
+            {
+                'select_all': True,
+                'wheres': wheres,
+                'sorts': [],
+            },
+            model,
+            page_size=self._page_size,
+            track_pages=False,
+        )
+        return [self._mirrorable(record, model) for record in records]
+
+    def _mirrorable(self, record, model):
+        # Connection data lives with the GqlBackend (see connected_records), so we don't need to keep a copy
+        connection_names = model_metadata.get(model).connection_names
+        if not connection_names:
+            return record
+        return {key: value for (key, value) in record.items() if key not in connection_names}
+
+    def _write_to_mirror(self, record, model):
+        table = self._tables.get(model.table_name())
+        if table is not None and record:
+            table.upsert(self._mirrorable(record, model))
+
+    def _start_background_refresh(self):
+        if not self._background_refresh or not self._refresh_interval or self._refresher is not None:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(self._stop, ), daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self, stop):
+        while not stop.wait(self._refresh_interval):
+            for table in list(self._tables.values()):
+                if table.synced_at is None:
+                    continue
+                try:
+                    self._sync(table)
+                except Exception as error:
+                    # keep serving what we have, and try again next time
+                    self._logging.warning(f"Failed to refresh the mirror of '{table.model.table_name()}': {error}")
+
+    def _matching_records(self, table, wheres, model):
+        columns = model.columns()
+        conditions = []
+        candidate_ids = None
+        for condition in (wheres or []):
+            ids = self._indexed_ids(table, condition, columns)
+            if ids is None:
+                conditions.append(self._condition_filter(condition, columns))
+            else:
+                candidate_ids = ids if candidate_ids is None else candidate_ids & ids
+
+        with table.lock:
+            if candidate_ids is None:
+                records = list(table.records.values())
+            else:
+                records = [table.records[id] for id in table.records if id in candidate_ids]
+        return [record for record in records if all(condition(record) for condition in conditions)]
+
+    def _indexed_ids(self, table, condition, columns):
+        """
+        Returns the ids that match an equality or IN condition on an indexed column, or None for other conditions.
+        """
+        operator = condition.get('operator', '=').upper()
+        column_name = condition.get('column')
+        if operator not in ['=', '<=>', 'IN'] or column_name not in table.indexes:
+            return None
+        values = condition.get('values', [])
+        values = values if operator == 'IN' else values[:1]
+        values = [self._backend_value(columns.get(column_name), value) for value in values]
+        if not all(_is_indexable(value) for value in values):
+            return None
+        with table.lock:
+            index = table.indexes[column_name]
+            return set().union(*[index.get(value, set()) for value in values])
+
+    def _condition_filter(self, condition, columns):
+        operator = condition.get('operator', '=').upper()
+        if operator in ['AND', 'OR']:
+            filters = [self._condition_filter(sub_condition, columns) for sub_condition in condition['conditions']]
+            if operator == 'OR':
+                return lambda record: any(check(record) for check in filters)
+            return lambda record: all(check(record) for check in filters)
+
+        column_name = condition['column']
+        column = columns.get(column_name)
+        if isinstance(column, Connection):
+            raise ValueError(
+                f"The MirrorBackend can't filter on the Connection column '{column_name}', since it doesn't " +
+                "keep a copy of connected records"
+            )
+        # the same operators (and LIKE patterns) as the GqlBackend, so a query means the same thing either way
+        (suffix, expected) = self._gql_backend.filter_suffix_and_value(operator, condition.get('values', []))
+        if type(expected) == list:
+            expected = [self._backend_value(column, item) for item in expected]
+        elif expected is not None:
+            expected = self._backend_value(column, expected)
+        if isinstance(column, BelongsTo):
+            parent_id_column_name = column.parent_models.get_id_column_name()
+            return lambda record: _matches(_parent_id(record.get(column_name), parent_id_column_name), suffix, expected)
+        return lambda record: _matches(record.get(column_name), suffix, expected)
+
+    def _backend_value(self, column, value):
+        if (isinstance(column, Integer) or isinstance(column, Float)) and value is not None:
+            return column.to_backend({column.name: value})[column.name]
+        return value
+
+    def _sort(self, records, sorts, model):
+        columns = model.columns()
+        for sort in reversed(sorts or []):
+            column_name = sort['column']
+            column = columns.get(column_name)
+            parent_id_column_name = column.parent_models.get_id_column_name() if isinstance(column, BelongsTo) else None
+
+            def sort_key(record):
+                value = record.get(column_name)
+                if parent_id_column_name:
+                    value = _parent_id(value, parent_id_column_name)
+                return (value is None, value)
+
+            records = sorted(records, key=sort_key, reverse=sort.get('direction', 'asc').lower() == 'desc')
+        return records
+
+    def allowed_pagination_keys(self) -> List[str]:
+        return ['start']
+
+    def validate_pagination_kwargs(self, kwargs: Dict[str, Any], case_mapping: Callable) -> str:
+        key_name = case_mapping('start')
+        extra_keys = set(kwargs.keys()) - set(self.allowed_pagination_keys())
+        if len(extra_keys):
+            return "Invalid pagination key(s): '" + "','".join(extra_keys) + f"'.  Only '{key_name}' is allowed"
+        if 'start' not in kwargs:
+            return f"You must specify '{key_name}' when setting pagination"
+        try:
+            int(kwargs['start'])
+        except (TypeError, ValueError):
+            return f"Invalid value for '{key_name}': it should be an integer"
+        return ''
+
+    def documentation_pagination_next_page_response(self, case_mapping: Callable) -> List[Any]:
+        return [AutoDocInteger(case_mapping('start'), example=10)]
+
+    def documentation_pagination_next_page_example(self, case_mapping: Callable) -> Dict[str, Any]:
+        return {case_mapping('start'): 10}
+
+    def documentation_pagination_parameters(self, case_mapping: Callable) -> List[Tuple[Any]]:
+        return [(AutoDocInteger(case_mapping('start'), example=10), 'The zero-indexed record number to start at')]
+
+    def column_from_backend(self, column, value):
+        return self._gql_backend.column_from_backend(column, value)
+
+    def column_to_backend(self, column, backend_data):
+        return self._gql_backend.column_to_backend(column, backend_data)
+def _parent_id(value, parent_id_column_name):
+    # the parent id comes back flattened when the relationship was included, and as a nested record otherwise
+    return value.get(parent_id_column_name) if type(value) == dict else value
+def _matches(value, suffix, expected):
+    if suffix == '':
+        return value == expected
+    if suffix == '_NOT':
+        return value != expected
+    if suffix == '_IN':
+        return value in expected
+    if value is None:
+        return False
+    if suffix == '_CONTAINS':
+        return expected in value
+    if suffix == '_STARTS_WITH':
+        return value.startswith(expected)
+    if suffix == '_ENDS_WITH':
+        return value.endswith(expected)
+    try:
+        return {
+            '_LT': lambda: value < expected,
+            '_LTE': lambda: value <= expected,
+            '_GT': lambda: value > expected,
+            '_GTE': lambda: value >= expected,
+        }[suffix]()
+    except TypeError:
+        return False
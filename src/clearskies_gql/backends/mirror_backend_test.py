@@ -0,0 +1,212 @@
+import unittest
+from collections import OrderedDict
+import clearskies
+import requests
+import time
+from ..benchmarks import StubGqlGraph, StubGqlServer
+from ..benchmarks.suite import build_backend
+from .mirror_backend import MirrorBackend
+class Country(clearskies.Model):
+    def __init__(self, mirror_backend, columns):
+        super().__init__(mirror_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'country'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.string('code'),
+            clearskies.column_types.integer('population'),
+            clearskies.column_types.string('updated_at'),
+        ])
+class Countries(clearskies.Models):
+    def __init__(self, mirror_backend, columns):
+        super().__init__(mirror_backend, columns)
+
+    def model_class(self):
+        return Country
+class City(clearskies.Model):
+    def __init__(self, mirror_backend, columns):
+        super().__init__(mirror_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'city'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.belongs_to('country_id', parent_models_class=Countries),
+            clearskies.column_types.string('updated_at'),
+        ])
+class Cities(clearskies.Models):
+    def __init__(self, mirror_backend, columns):
+        super().__init__(mirror_backend, columns)
+
+    def model_class(self):
+        return City
+class MirrorBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = StubGqlGraph()
+        self.graph.add_type('Country')
+        for (index, (name, code, population)) in enumerate([
+            ('Canada', 'CA', 38),
+            ('United States', 'US', 331),
+            ('Mexico', 'MX', 126),
+            ('Chile', 'CL', 19),
+        ]):
+            self.graph.add_node(
+                'Country', {
+                    'name': name,
+                    'code': code,
+                    'population': population,
+                    'updated_at': f'2024-01-0{index + 1}T00:00:00'
+                }
+            )
+        self.session = requests.Session()
+        self.server = StubGqlServer(self.graph).start()
+        self.calls = []
+        (self.di, self.gql_backend
+         ) = build_backend(self.server, self.session, backend_config={'instrumentation': self.calls.append})
+        self.mirror_backend = self.di.build(MirrorBackend)
+        self.mirror_backend.configure(self.gql_backend, background_refresh=False, refresh_interval=None)
+        self.di.bind('mirror_backend', self.mirror_backend)
+        self.countries = self.di.build(Countries)
+
+    def tearDown(self):
+        self.mirror_backend.close()
+        self.session.close()
+        self.server.stop()
+
+    def test_reads_locally(self):
+        self.assertEquals('US', self.countries.find('code=US').code)
+        self.assertEquals(1, self.server.stats()['round_trips'])
+
+        self.assertEquals(['Chile', 'Mexico'], [
+            country.name for country in self.countries.where('code IN (MX,CL,XX)').sort_by('name', 'asc')
+        ])
+        self.assertEquals(['Chile', 'Canada'], [
+            country.name for country in self.countries.where('population<100').sort_by('population', 'asc')
+        ])
+        self.assertEquals(['Canada', 'Chile'],
+                          [country.name for country in self.countries.where("name LIKE 'C%'").sort_by('name', 'asc')])
+        self.assertEquals(2, len(self.countries.where('population>100')))
+        self.assertEquals(1, self.server.stats()['round_trips'])
+
+        next_page_data = {}
+        configuration = {'sorts': [{'column': 'name', 'direction': 'desc'}], 'limit': 3}
+        records = self.mirror_backend.records(configuration, self.countries.empty_model(), next_page_data)
+        self.assertEquals(['United States', 'Mexico', 'Chile'], [record['name'] for record in records])
+        self.assertEquals({'start': 3}, next_page_data)
+        stats = self.mirror_backend.mirror_stats()['country']
+        self.assertEquals(4, stats['records'])
+        self.assertEquals('2024-01-04T00:00:00', stats['watermark'])
+
+    def test_belongs_to(self):
+        self.graph.add_type('City', plural_object_name='cities', plural_title_name='Cities')
+        self.graph.relate('City', 'country_id', 'Country', many=False)
+        country_ids = {country.code: country.id for country in self.countries}
+        for (name, code) in [('Toronto', 'CA'), ('Santiago', 'CL'), ('Montreal', 'CA')]:
+            city = self.graph.add_node('City', {'name': name, 'updated_at': '2024-01-01T00:00:00'})
+            self.graph.link('City', 'country_id', city['id'], country_ids[code])
+        cities = self.di.build(Cities)
+
+        canadian = cities.where(f"country_id={country_ids['CA']}").sort_by('name', 'asc')
+        self.assertEquals(['Montreal', 'Toronto'], [city.name for city in canadian])
+        # BelongsTo columns sort on the parent id
+        by_country = sorted([(country_ids['CA'], 'Toronto'), (country_ids['CL'], 'Santiago')])
+        self.assertEquals(
+            [name for (_, name) in by_country],
+            [city.name for city in cities.where('name IN (Toronto,Santiago)').sort_by('country_id', 'asc')],
+        )
+
+    def test_refresh(self):
+        self.assertEquals(4, len(self.countries))
+        self.server.reset_stats()
+        brazil = self.graph.add_node('Country', {'name': 'Brazil', 'code': 'BR', 'population': 216})
+        brazil['updated_at'] = '2024-02-01T00:00:00'
+        node = [node for node in self.graph._types['Country']['nodes'].values() if node['code'] == 'CA'][0]
+        node.update({'population': 40, 'updated_at': '2024-02-02T00:00:00'})
+
+        self.mirror_backend.refresh()
+        self.assertEquals(1, self.server.stats()['round_trips'])
+        # only the records at or after the watermark come back: the two changes, and Chile (at the old watermark)
+        self.assertEquals(3, self.calls[-1].records)
+        self.assertEquals(40, self.countries.find('code=CA').population)
+        self.assertEquals('Brazil', self.countries.find('code=BR').name)
+        self.assertEquals(0, len(self.countries.where('population=38')))
+        self.assertEquals('2024-02-02T00:00:00', self.mirror_backend.mirror_stats()['country']['watermark'])
+
+    def test_refresh_keeps_current_page(self):
+        canada = self.countries.find('code=CA')
+        self.graph.add_node('Country', {'name': 'Peru', 'code': 'PE', 'updated_at': '2024-02-01T00:00:00'})
+        self.mirror_backend.refresh()
+        # the records fetched by the refresh don't replace the page that was last read from the mirror
+        self.assertEquals([canada.id], self.gql_backend._page_state().record_pages['country'])
+
+    def test_writes_keep_the_watermark(self):
+        self.assertEquals(4, len(self.countries))
+        # someone else changes Canada, and then we save a newer change to Mexico before the next refresh
+        canada = [node for node in self.graph._types['Country']['nodes'].values() if node['code'] == 'CA'][0]
+        canada.update({'population': 40, 'updated_at': '2024-02-01T00:00:00'})
+        self.countries.find('code=MX').save({'population': 130, 'updated_at': '2024-02-02T00:00:00'})
+        self.assertEquals('2024-01-04T00:00:00', self.mirror_backend.mirror_stats()['country']['watermark'])
+
+        self.mirror_backend.refresh()
+        self.assertEquals(40, self.countries.find('code=CA').population)
+        self.assertEquals(130, self.countries.find('code=MX').population)
+        self.assertEquals('2024-02-02T00:00:00', self.mirror_backend.mirror_stats()['country']['watermark'])
+
+    def test_writes(self):
+        self.assertEquals(4, len(self.countries))
+        mexico = self.countries.find('code=MX')
+        mexico.save({'population': 130, 'updated_at': '2024-03-01T00:00:00'})
+        peru = self.countries.create({'name': 'Peru', 'code': 'PE', 'population': 34, 'updated_at': '2024-03-02'})
+        self.countries.find('code=CL').delete()
+        self.server.reset_stats()
+
+        self.assertEquals(130, self.countries.find('code=MX').population)
+        self.assertEquals(peru.id, self.countries.find('code=PE').id)
+        self.assertEquals(0, len(self.countries.where('code=CL')))
+        self.assertEquals(4, len(self.countries))
+        self.assertEquals(0, self.server.stats()['round_trips'])
+        self.assertEquals(4, self.graph.node_count('Country'))
+
+    def test_delete_during_refresh(self):
+        self.assertEquals(4, len(self.countries))
+        fetch = self.mirror_backend._fetch
+
+        def fetch_then_delete(model, wheres):
+            records = fetch(model, wheres)
+            # Chile is at the watermark, so the refresh fetched it before we deleted it
+            self.countries.find('code=CL').delete()
+            return records
+
+        self.mirror_backend._fetch = fetch_then_delete
+        self.mirror_backend.refresh()
+        self.assertEquals(0, len(self.countries.where('code=CL')))
+        self.mirror_backend._fetch = fetch
+        self.mirror_backend.reload()
+        self.assertEquals(3, len(self.countries.clone()))
+
+    def test_reload_drops_deleted_records(self):
+        self.assertEquals(4, len(self.countries))
+        chile_id = self.countries.find('code=CL').id
+        del self.graph._types['Country']['nodes'][chile_id]
+
+        self.mirror_backend.refresh()
+        self.assertEquals(4, len(self.countries.clone()))
+        self.mirror_backend.reload()
+        self.assertEquals(3, len(self.countries.clone()))
+
+    def test_background_refresh(self):
+        self.mirror_backend.configure(self.gql_backend, refresh_interval=0.05)
+        self.assertEquals(4, len(self.countries))
+        self.graph.add_node('Country', {'name': 'Peru', 'code': 'PE', 'updated_at': '2024-02-01T00:00:00'})
+        for _ in range(100):
+            if self.mirror_backend.mirror_stats()['country']['records'] == 5:
+                break
+            time.sleep(0.02)
+        self.assertEquals('Peru', self.countries.find('code=PE').name)
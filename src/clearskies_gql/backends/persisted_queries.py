@@ -0,0 +1,59 @@
+import hashlib
+class PersistedQueries:
+    """
+    Builds requests for Automatic Persisted Queries (APQ).
+
+    With APQ, a request only sends the sha256 hash of the query document (along with the variables).  If the
+    server doesn't know the hash, it responds with a `PersistedQueryNotFound` error, and the request is sent
+    again with the full document, which the server then stores for next time.  In the steady state, requests
+    only contain hashes and variables.  The hashes are calculated once per document and kept here.
+    """
+    enabled = None
+    _hashes = None
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._hashes = {}
+
+    def hash(self, query):
+        if query not in self._hashes:
+            self._hashes[query] = hashlib.sha256(query.encode('utf-8')).hexdigest()
+        return self._hashes[query]
+
+    def request_json(self, request_json, include_query=False):
+        """
+        Returns the APQ version of the request JSON, without the query unless `include_query` is set.
+        """
+        persisted_json = {key: value for (key, value) in request_json.items() if key != 'query' or include_query}
+        persisted_json['extensions'] = {
+            **request_json.get('extensions', {}),
+            'persistedQuery': {
+                'version': 1,
+                'sha256Hash': self.hash(request_json['query']),
+            },
+        }
+        return persisted_json
+
+    def is_miss(self, response_json):
+        """
+        Returns True if the server needs the full query document for this response.
+        """
+        return self.error_code(response_json) in ['PERSISTED_QUERY_NOT_FOUND', 'PERSISTED_QUERY_NOT_SUPPORTED']
+
+    def is_unsupported(self, response_json):
+        return self.error_code(response_json) == 'PERSISTED_QUERY_NOT_SUPPORTED'
+
+    def error_code(self, response_json):
+        if type(response_json) != dict:
+            return None
+        for error in response_json.get('errors') or []:
+            if type(error) != dict:
+                continue
+            code = (error.get('extensions') or {}).get('code')
+            if code:
+                return code
+            if error.get('message') == 'PersistedQueryNotFound':
+                return 'PERSISTED_QUERY_NOT_FOUND'
+            if error.get('message') == 'PersistedQueryNotSupported':
+                return 'PERSISTED_QUERY_NOT_SUPPORTED'
+        return None
@@ -0,0 +1,126 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import logging
+import threading
+import requests
+from .gql_backend import GqlBackend
+from .persisted_queries import PersistedQueries
+from clearskies.authentication.public import Public
+class StubApqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        if type(body) == list:
+            self.send_json([self.respond(operation) for operation in body])
+        else:
+            self.send_json(self.respond(body))
+
+    def respond(self, operation):
+        persisted_query = (operation.get('extensions') or {}).get('persistedQuery')
+        if not self.server.supports_apq and persisted_query and 'query' not in operation:
+            return {'errors': [{'message': 'PersistedQueryNotSupported'}]}
+        if persisted_query and self.server.supports_apq:
+            if 'query' in operation:
+                if hashlib.sha256(operation['query'].encode('utf-8')).hexdigest() != persisted_query['sha256Hash']:
+                    return {'errors': [{'message': 'provided sha does not match query'}]}
+                self.server.stored_queries[persisted_query['sha256Hash']] = operation['query']
+            elif persisted_query['sha256Hash'] not in self.server.stored_queries:
+                return {
+                    'errors': [{
+                        'message': 'PersistedQueryNotFound',
+                        'extensions': {
+                            'code': 'PERSISTED_QUERY_NOT_FOUND'
+                        }
+                    }]
+                }
+        return {'data': {'usersAggregate': {'count': 5}, 'deleteUsers': {'nodesDeleted': 1}}}
+
+    def send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+class User:
+    id_column_name = 'id'
+
+    def table_name(self):
+        return 'user'
+class PersistedQueriesTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubApqHandler)
+        self.server.requests = []
+        self.server.stored_queries = {}
+        self.server.supports_apq = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/graphql'
+        self.session = requests.Session()
+        self.gql_backend = GqlBackend(self.session, 'environment', logging)
+        self.gql_backend.configure(url=self.url, auth=Public(), persisted_queries=True, count_fallback=None)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_hash_then_query(self):
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(2, len(self.server.requests))
+        self.assertNotIn('query', self.server.requests[0])
+        self.assertIn('query', self.server.requests[1])
+
+        # now that the server knows the query, only the hash is sent
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(3, len(self.server.requests))
+        self.assertNotIn('query', self.server.requests[2])
+        self.assertEquals(
+            hashlib.sha256(self.server.requests[1]['query'].encode('utf-8')).hexdigest(),
+            self.server.requests[2]['extensions']['persistedQuery']['sha256Hash'],
+        )
+
+    def test_batch(self):
+        with self.gql_backend.batch():
+            self.gql_backend.delete('1', User())
+            self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(2, len(self.server.requests))
+        self.assertEquals(2, len(self.server.requests[1]))
+        self.assertTrue(all(['query' in operation for operation in self.server.requests[1]]))
+
+        with self.gql_backend.batch():
+            self.gql_backend.delete('2', User())
+            self.gql_backend.delete('3', User())
+        self.assertEquals(3, len(self.server.requests))
+        self.assertTrue(all(['query' not in operation for operation in self.server.requests[2]]))
+
+    def test_not_supported(self):
+        self.server.supports_apq = False
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(3, len(self.server.requests))
+        self.assertIn('query', self.server.requests[2])
+        self.assertNotIn('extensions', self.server.requests[2])
+
+    def test_request_json(self):
+        persisted_queries = PersistedQueries()
+        request_json = {'query': 'query { users { id } }', 'variables': {'a': 1}}
+        query_hash = hashlib.sha256('query { users { id } }'.encode('utf-8')).hexdigest()
+        self.assertEquals({
+            'variables': {
+                'a': 1
+            },
+            'extensions': {
+                'persistedQuery': {
+                    'version': 1,
+                    'sha256Hash': query_hash
+                }
+            }
+        }, persisted_queries.request_json(request_json))
+        self.assertEquals('query { users { id } }', persisted_queries.request_json(request_json, True)['query'])
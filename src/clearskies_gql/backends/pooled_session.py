@@ -0,0 +1,53 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+retry_statuses = (429, 500, 502, 503, 504)
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    An HTTP adapter for talking to the GQL server.
+
+    It keeps a pool of persistent connections to the server, retries (with backoff) when the server responds
+    with a 429 or 5xx, and applies a default timeout to every request.  Note that GQL sends everything (including
+    queries) via POST, so unlike the default retry policy of the requests library, POST requests are retried.
+    """
+    timeout = None
+    keep_alive = None
+
+    def __init__(self, pool_size=10, keep_alive=True, timeout=30, retries=3, backoff_factor=0.5):
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        super().__init__(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=build_retry(retries, backoff_factor),
+        )
+
+    def add_headers(self, request, **kwargs):
+        if not self.keep_alive:
+            request.headers['Connection'] = 'close'
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+def build_retry(retries, backoff_factor):
+    # raise_on_status=False returns the final response rather than raising, so the backend can report the status code
+    retry_kwargs = {
+        'total': retries,
+        'backoff_factor': backoff_factor,
+        'status_forcelist': retry_statuses,
+        'raise_on_status': False,
+    }
+    try:
+        return Retry(**retry_kwargs, allowed_methods=None)
+    except TypeError:
+        # older versions of urllib3 call it method_whitelist
+        return Retry(**retry_kwargs, method_whitelist=False)
+def mount_pooled_adapter(session, url, **kwargs):
+    """
+    Mounts a PooledHTTPAdapter on the session for the given URL.
+
+    Adapters are mounted by URL prefix, so this only changes how the session talks to the GQL server.
+    """
+    session.mount(url, PooledHTTPAdapter(**kwargs))
+    return session
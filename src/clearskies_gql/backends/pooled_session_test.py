@@ -0,0 +1,81 @@
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+import requests
+from .gql_backend import GqlBackend
+from clearskies.authentication.public import Public
+class StubGqlHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.client_ports.add(self.client_address[1])
+        self.server.request_count += 1
+        if self.server.failures_remaining:
+            self.server.failures_remaining -= 1
+            self.send_json(503, {'errors': [{'message': 'try again'}]})
+            return
+        self.send_json(200, {'data': {'usersAggregate': {'count': 5}}})
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+class User:
+    id_column_name = 'id'
+
+    def table_name(self):
+        return 'user'
+class PooledSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGqlHandler)
+        self.server.client_ports = set()
+        self.server.request_count = 0
+        self.server.failures_remaining = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/graphql'
+        self.session = requests.Session()
+        self.gql_backend = GqlBackend(self.session, 'environment', logging)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        self.gql_backend.configure(url=self.url, auth=Public())
+        for i in range(3):
+            self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(3, self.server.request_count)
+        self.assertEquals(1, len(self.server.client_ports))
+
+    def test_retry(self):
+        self.gql_backend.configure(url=self.url, auth=Public(), retries=2, backoff_factor=0)
+        self.server.failures_remaining = 2
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(3, self.server.request_count)
+
+    def test_retries_exhausted(self):
+        self.gql_backend.configure(url=self.url, auth=Public(), retries=1, backoff_factor=0)
+        self.server.failures_remaining = 5
+        with self.assertRaises(ValueError):
+            self.gql_backend.count({}, User())
+        self.assertEquals(2, self.server.request_count)
+        # a failed request doesn't mean that the server can't count, so we keep asking for the aggregate
+        self.server.failures_remaining = 0
+        self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(3, self.server.request_count)
+
+    def test_no_keep_alive(self):
+        self.gql_backend.configure(url=self.url, auth=Public(), keep_alive=False)
+        for i in range(2):
+            self.assertEquals(5, self.gql_backend.count({}, User()))
+        self.assertEquals(2, len(self.server.client_ports))
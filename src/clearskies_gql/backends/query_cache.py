@@ -0,0 +1,60 @@
+from collections import OrderedDict
+import threading
+class QueryCache:
+    """
+    A size-bounded LRU cache for the things that the GqlBackend would otherwise rebuild on every request.
+
+    The GqlBackend uses this to hold on to compiled GQL documents and model name derivations.  Everything that
+    changes from call to call goes in the query variables, so the documents themselves only depend on the
+    model class, the operation, and the general shape of the query.
+    """
+    max_size = None
+    hits = None
+    misses = None
+    _entries = None
+    _lock = None
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """
+        Returns the cached value for the given key, calling `build` to create (and cache) it if it isn't cached.
+        """
+        if not self.max_size:
+            self.misses += 1
+            return build()
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        # build outside of the lock: two threads may build the same thing, but that's harmless.
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+        }
@@ -0,0 +1,32 @@
+import unittest
+from unittest.mock import MagicMock
+from .query_cache import QueryCache
+class QueryCacheTest(unittest.TestCase):
+    def test_get(self):
+        cache = QueryCache(max_size=2)
+        build = MagicMock(return_value='query')
+        self.assertEquals('query', cache.get('a', build))
+        self.assertEquals('query', cache.get('a', build))
+        build.assert_called_once()
+        self.assertEquals({'hits': 1, 'misses': 1, 'size': 1, 'max_size': 2}, cache.stats())
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_size=2)
+        cache.get('a', lambda: 'a')
+        cache.get('b', lambda: 'b')
+        cache.get('a', lambda: 'a')
+        cache.get('c', lambda: 'c')
+        # 'b' was the least recently used, so it should be the one that was evicted
+        build = MagicMock(return_value='b2')
+        self.assertEquals('a', cache.get('a', MagicMock()))
+        self.assertEquals('b2', cache.get('b', build))
+        build.assert_called_once()
+        self.assertEquals(2, cache.stats()['size'])
+
+    def test_disabled(self):
+        cache = QueryCache(max_size=0)
+        build = MagicMock(return_value='query')
+        cache.get('a', build)
+        cache.get('a', build)
+        self.assertEquals(2, build.call_count)
+        self.assertEquals(0, cache.stats()['size'])
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+import threading
+import time
+class ResponseCache:
+    """
+    An in-process, size-bounded LRU cache for the responses to read queries.
+
+    Every entry has its own expiration time and is tagged with the tables that it came from, so that all the
+    entries for a table can be dropped when the table changes.  This is the default storage for the response
+    cache of the GqlBackend: to use something else (e.g. to share the cache between processes), pass an object
+    with the same `get`, `set`, `invalidate`, `clear`, and `stats` methods to the configure method.
+    """
+    max_size = None
+    hits = None
+    misses = None
+    _entries = None
+    _tags = None
+    _lock = None
+    _now = None
+
+    def __init__(self, max_size=1024, now=None):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+        self._now = now if now is not None else time.monotonic
+
+    def get(self, key):
+        """
+        Returns the cached value for the given key, or None if it isn't cached (or has expired).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._now():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl, tags):
+        if not self.max_size or not ttl:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._now() + ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        """
+        Removes all the entries with any of the given tags.
+        """
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, [])):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._tags = {}
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+        }
+
+    def _remove(self, key):
+        (value, expires_at, tags) = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
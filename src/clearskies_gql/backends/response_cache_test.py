@@ -0,0 +1,93 @@
+import unittest
+from collections import OrderedDict
+import clearskies
+import requests
+from .. import column_types
+from ..benchmarks import StubGqlServer, seed_graph
+from ..benchmarks.suite import Tags, build_backend
+from .response_cache import ResponseCache
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100
+        self.cache = ResponseCache(max_size=2, now=lambda: self.now)
+
+    def test_get(self):
+        self.assertEquals(None, self.cache.get('a'))
+        self.cache.set('a', {'data': 1}, 10, ['user'])
+        self.assertEquals({'data': 1}, self.cache.get('a'))
+        self.assertEquals({'hits': 1, 'misses': 1, 'size': 1, 'max_size': 2}, self.cache.stats())
+
+    def test_ttl(self):
+        self.cache.set('a', {'data': 1}, 10, ['user'])
+        self.now = 109
+        self.assertEquals({'data': 1}, self.cache.get('a'))
+        self.now = 110
+        self.assertEquals(None, self.cache.get('a'))
+        self.assertEquals(0, self.cache.stats()['size'])
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 'a', 10, ['user'])
+        self.cache.set('b', 'b', 10, ['user'])
+        self.cache.get('a')
+        self.cache.set('c', 'c', 10, ['user'])
+        self.assertEquals(None, self.cache.get('b'))
+        self.assertEquals('a', self.cache.get('a'))
+        self.assertEquals('c', self.cache.get('c'))
+
+    def test_invalidate(self):
+        self.cache.set('a', 'a', 10, ['user', 'tag'])
+        self.cache.set('b', 'b', 10, ['pet'])
+        self.cache.invalidate(['tag'])
+        self.assertEquals(None, self.cache.get('a'))
+        self.assertEquals('b', self.cache.get('b'))
+class TaggedUser(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'user'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            column_types.connection(
+                'tags',
+                related_models_class=Tags,
+                reverse_connection_name='users',
+                is_readable=True,
+                readable_related_columns=['name'],
+            ),
+        ])
+class TaggedUsers(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return TaggedUser
+class ResponseCacheBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = seed_graph(users=3, tags=2, tags_per_user=2)
+        self.session = requests.Session()
+        self.server = StubGqlServer(self.graph).start()
+        (self.di,
+         self.gql_backend) = build_backend(self.server, self.session, backend_config={'response_cache_ttl': 300})
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_connection_tables(self):
+        user = self.di.build(TaggedUsers).empty_model()
+        tags = self.di.build(Tags)
+        self.assertEquals(['user', 'tag'], self.gql_backend._read_tables({'select_all': True}, user))
+
+        # select_all embeds the tags in the users, so changing a tag clears out the cached users
+        self.gql_backend.records({'select_all': True}, user)
+        for tag in tags:
+            tag.save({'name': 'renamed-' + tag.name})
+        tag_names = {
+            tag['name']
+            for record in self.gql_backend.records({'select_all': True}, user) for tag in record['tags']
+        }
+        self.assertEquals({'renamed-tag-0', 'renamed-tag-1'}, tag_names)
@@ -0,0 +1,106 @@
+from clearskies.column_types import HasMany
+
+introspection_query = ' '.join([
+    'query IntrospectionQuery {',
+    '  __schema {',
+    '    queryType { name }',
+    '    mutationType { name }',
+    '    types { name kind fields { name type { ...TypeRef } args { name type { ...TypeRef } } } inputFields { name } }',
+    '  }',
+    '}',
+    'fragment TypeRef on __Type { kind name ofType { kind name ofType { kind name ofType { kind name } } } }',
+])
+class GqlSchema:
+    """
+    The parts of an introspected GQL schema that the GqlBackend cares about.
+
+    The backend normally guesses type and field names from the table name of the model (e.g. a table name of
+    `user` means a `User` type, a `users` query, and a `createUsers` mutation).  With a schema, it can look up the
+    actual names instead, and check that the columns of the model exist on the type.
+    """
+    _types = None
+    _query_fields = None
+    _mutation_fields = None
+
+    def __init__(self, introspection):
+        schema = introspection.get('__schema', introspection)
+        self._types = {gql_type['name']: gql_type for gql_type in schema.get('types') or []}
+        self._query_fields = self._fields_of((schema.get('queryType') or {}).get('name'))
+        self._mutation_fields = self._fields_of((schema.get('mutationType') or {}).get('name'))
+
+    def _fields_of(self, type_name):
+        if not type_name or type_name not in self._types:
+            return {}
+        return {field['name']: field for field in self._types[type_name].get('fields') or []}
+
+    def _named_type(self, type_ref):
+        # unwrap the NON_NULL and LIST wrappers to get to the actual type name
+        while type_ref and not type_ref.get('name'):
+            type_ref = type_ref.get('ofType')
+        return type_ref.get('name') if type_ref else None
+
+    def _is_list(self, type_ref):
+        while type_ref:
+            if type_ref.get('kind') == 'LIST':
+                return True
+            type_ref = type_ref.get('ofType')
+        return False
+
+    def has_type(self, type_name):
+        return type_name in self._types
+
+    def field_names(self, type_name):
+        return [field['name'] for field in self._types.get(type_name, {}).get('fields') or []]
+
+    def names(self, model, guessed_names):
+        """
+        Returns the names for the given model (in the same format as `GqlBackend._build_names`) from the schema.
+        """
+        model_class_name = model.__class__.__name__
+        title_name = guessed_names['title_name']
+        if title_name not in self._types:
+            raise ValueError(
+                f"The GQL schema doesn't have a type named '{title_name}' for model '{model_class_name}' " +
+                f"(with table name '{model.table_name()}')"
+            )
+
+        # the query that returns a list of our type.  If there's more than one, prefer the one we would have guessed
+        list_fields = [
+            name for (name, field) in self._query_fields.items()
+            if self._named_type(field['type']) == title_name and self._is_list(field['type'])
+        ]
+        if not list_fields:
+            raise ValueError(f"The GQL schema doesn't have a query that returns a list of '{title_name}'")
+        plural_object_name = guessed_names['plural_object_name'] \
+            if guessed_names['plural_object_name'] in list_fields else list_fields[0]
+
+        # and the create mutation, which takes a list of our create input type
+        plural_title_name = guessed_names['plural_title_name']
+        for (name, field) in self._mutation_fields.items():
+            if not name.startswith('create'):
+                continue
+            if any([self._named_type(arg['type']) == f'{title_name}CreateInput' for arg in field.get('args') or []]):
+                plural_title_name = name[len('create'):]
+                break
+
+        return {
+            'plural_object_name': plural_object_name,
+            'plural_snake_case_name': plural_object_name,
+            'title_name': title_name,
+            'plural_title_name': plural_title_name,
+        }
+
+    def validate(self, model, title_name):
+        """
+        Checks that every column the backend would select for the model exists on its type.
+        """
+        field_names = set(self.field_names(title_name))
+        missing = [
+            column.name for column in model.columns().values()
+            if not column.is_temporary and not isinstance(column, HasMany) and column.name not in field_names
+        ]
+        if missing:
+            raise ValueError(
+                f"Model '{model.__class__.__name__}' has columns that don't exist on GQL type '{title_name}': " +
+                ', '.join(missing)
+            )
@@ -0,0 +1,187 @@
+import unittest
+from unittest.mock import MagicMock
+from collections import OrderedDict
+import json
+import logging
+import os
+import tempfile
+from .gql_backend import GqlBackend
+from .schema import GqlSchema
+from clearskies.authentication.public import Public
+from clearskies.di import StandardDependencies
+import clearskies
+class Person(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def table_name(cls):
+        return 'person'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.integer('age'),
+        ])
+class Place(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def table_name(cls):
+        return 'place'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.string('country'),
+        ])
+def list_of(name):
+    return {
+        'kind': 'NON_NULL',
+        'name': None,
+        'ofType': {
+            'kind': 'LIST',
+            'name': None,
+            'ofType': {
+                'kind': 'NON_NULL',
+                'name': None,
+                'ofType': {
+                    'kind': 'OBJECT',
+                    'name': name
+                }
+            }
+        }
+    }
+introspection = {
+    '__schema': {
+        'queryType': {
+            'name': 'Query'
+        },
+        'mutationType': {
+            'name': 'Mutation'
+        },
+        'types': [
+            {
+                'name':
+                'Query',
+                'kind':
+                'OBJECT',
+                'fields': [
+                    {
+                        'name': 'people',
+                        'type': list_of('Person'),
+                        'args': []
+                    },
+                    {
+                        'name': 'places',
+                        'type': list_of('Place'),
+                        'args': []
+                    },
+                ],
+            },
+            {
+                'name':
+                'Mutation',
+                'kind':
+                'OBJECT',
+                'fields': [
+                    {
+                        'name': 'createPeople',
+                        'type': {
+                            'kind': 'OBJECT',
+                            'name': 'CreatePeopleMutationResponse'
+                        },
+                        'args': [{
+                            'name': 'input',
+                            'type': list_of('PersonCreateInput')
+                        }]
+                    },
+                ],
+            },
+            {
+                'name': 'Person',
+                'kind': 'OBJECT',
+                'fields': [{
+                    'name': 'id'
+                }, {
+                    'name': 'name'
+                }, {
+                    'name': 'age'
+                }]
+            },
+            {
+                'name': 'Place',
+                'kind': 'OBJECT',
+                'fields': [{
+                    'name': 'id'
+                }, {
+                    'name': 'name'
+                }]
+            },
+        ],
+    }
+}
+class SchemaTest(unittest.TestCase):
+    def setUp(self):
+        response = type('', (), {'ok': True, 'json': lambda: {'data': {'people': [{'id': '1', 'name': 'bob'}]}}})
+        self.requests = type('', (), {'request': MagicMock(return_value=response)})()
+        self.di = StandardDependencies()
+        self.di.bind('requests', self.requests)
+        self.di.bind('environment', 'environment')
+        self.di.bind('logging', logging)
+        self.gql_backend = self.di.build(GqlBackend)
+        self.di.bind('gql_backend', self.gql_backend)
+        (schema_fd, self.schema_file) = tempfile.mkstemp(suffix='.json')
+        os.close(schema_fd)
+        os.unlink(self.schema_file)
+
+    def tearDown(self):
+        if os.path.isfile(self.schema_file):
+            os.unlink(self.schema_file)
+
+    def test_names(self):
+        schema = GqlSchema(introspection)
+        names = schema.names(
+            self.di.build(Person), {
+                'plural_object_name': 'persons',
+                'plural_snake_case_name': 'persons',
+                'title_name': 'Person',
+                'plural_title_name': 'Persons',
+            }
+        )
+        self.assertEquals({
+            'plural_object_name': 'people',
+            'plural_snake_case_name': 'people',
+            'title_name': 'Person',
+            'plural_title_name': 'People',
+        }, names)
+
+    def test_validate(self):
+        schema = GqlSchema(introspection)
+        schema.validate(self.di.build(Person), 'Person')
+        with self.assertRaises(ValueError) as context:
+            schema.validate(self.di.build(Place), 'Place')
+        self.assertIn('country', str(context.exception))
+
+    def test_introspect_and_save(self):
+        introspection_response = type('', (), {'ok': True, 'json': lambda: {'data': introspection}})
+        self.requests.request = MagicMock(return_value=introspection_response)
+        self.gql_backend.configure(
+            url='https://example.gql', auth=Public(), introspect=True, schema_file=self.schema_file
+        )
+        self.assertIn('__schema', self.requests.request.call_args.kwargs['json']['query'])
+        with open(self.schema_file) as schema_fp:
+            self.assertEquals(introspection, json.load(schema_fp))
+
+    def test_schema_file(self):
+        with open(self.schema_file, 'w') as schema_fp:
+            json.dump(introspection, schema_fp)
+        self.gql_backend.configure(url='https://example.gql', schema_file=self.schema_file)
+        self.requests.request.assert_not_called()
+
+        records = self.gql_backend.records({'select_all': True}, self.di.build(Person))
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertIn('people {', request_json['query'])
+        self.assertEquals([{'id': '1', 'name': 'bob'}], records)
+
+        with self.assertRaises(ValueError):
+            self.gql_backend.records({'select_all': True}, self.di.build(Place))
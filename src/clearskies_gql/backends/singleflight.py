@@ -0,0 +1,72 @@
+import threading
+def copy_json(value):
+    """
+    Copies decoded JSON (much faster than copy.deepcopy, since it only has to deal with dicts and lists).
+    """
+    if type(value) == dict:
+        return {key: copy_json(item) for (key, item) in value.items()}
+    if type(value) == list:
+        return [copy_json(item) for item in value]
+    return value
+class InFlightCall:
+    result = None
+    error = None
+    followers = None
+    done = None
+
+    def __init__(self):
+        self.followers = 0
+        self.done = threading.Event()
+class Singleflight:
+    """
+    Coalesces identical calls that are in flight at the same time, across threads.
+
+    The first caller for a key (the leader) runs the function, and anyone who asks for the same key before it
+    finishes waits for it and gets the same result, rather than running the function again.  Since the callers
+    may modify what they get back, everyone gets their own copy of the result when it was shared.
+    """
+    deduplicated = None
+    _calls = None
+    _lock = None
+    _copy = None
+
+    def __init__(self, copy=copy_json):
+        self.deduplicated = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._copy = copy
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = InFlightCall()
+                self._calls[key] = call
+            else:
+                call.followers += 1
+                self.deduplicated += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self._copy(call.result)
+
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            # once the call is out of the list no one else can join, so the number of followers is final
+            with self._lock:
+                del self._calls[key]
+                followers = call.followers
+            call.done.set()
+        # the followers are copying the result now, so the leader can't have the original either
+        return self._copy(call.result) if followers else call.result
+
+    def stats(self):
+        with self._lock:
+            return {'deduplicated': self.deduplicated, 'in_flight': len(self._calls)}
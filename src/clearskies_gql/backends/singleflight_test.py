@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import MagicMock
+from collections import OrderedDict
+import logging
+import threading
+import time
+from .gql_backend import GqlBackend
+from .singleflight import Singleflight
+from clearskies.di import StandardDependencies
+import clearskies
+class User(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def table_name(cls):
+        return 'user'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+        ])
+class SingleflightTest(unittest.TestCase):
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        raise AssertionError('Timed out waiting for the other threads')
+
+    def run_threads(self, number_of_threads, target):
+        results = [None] * number_of_threads
+
+        def run(index):
+            results[index] = target()
+
+        threads = [threading.Thread(target=run, args=[index]) for index in range(number_of_threads)]
+        for thread in threads:
+            thread.start()
+        return (threads, results)
+
+    def test_do(self):
+        singleflight = Singleflight()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            release.wait()
+            return {'data': [1, 2]}
+
+        (threads, results) = self.run_threads(4, lambda: singleflight.do('key', function))
+        self.wait_for(lambda: singleflight.stats()['deduplicated'] == 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(1, len(calls))
+        self.assertEquals([{'data': [1, 2]}] * 4, results)
+        # everyone has their own copy
+        self.assertEquals(4, len(set([id(result) for result in results])))
+        self.assertEquals(4, len(set([id(result['data']) for result in results])))
+        self.assertEquals({'deduplicated': 3, 'in_flight': 0}, singleflight.stats())
+
+        # and once it's done, the next call runs the function again
+        self.assertEquals({'data': [1, 2]}, singleflight.do('key', function))
+        self.assertEquals(2, len(calls))
+
+    def test_errors(self):
+        singleflight = Singleflight()
+        release = threading.Event()
+
+        def function():
+            release.wait()
+            raise ValueError('nope')
+
+        def call():
+            try:
+                singleflight.do('key', function)
+            except ValueError as error:
+                return str(error)
+
+        (threads, results) = self.run_threads(3, call)
+        self.wait_for(lambda: singleflight.stats()['deduplicated'] == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(['nope'] * 3, results)
+
+    def test_backend(self):
+        release = threading.Event()
+
+        def request(*args, **kwargs):
+            release.wait()
+            if 'createUsers' in kwargs['json']['query']:
+                return type('', (), {'ok': True, 'json': lambda: {'data': {'createUsers': {'users': [{'id': '2'}]}}}})
+            return type('', (), {'ok': True, 'json': lambda: {'data': {'users': [{'id': '1', 'name': 'bob'}]}}})
+
+        requests = type('', (), {'request': MagicMock(side_effect=request)})()
+        di = StandardDependencies()
+        di.bind('requests', requests)
+        di.bind('environment', 'environment')
+        di.bind('logging', logging)
+        gql_backend = di.build(GqlBackend)
+        gql_backend.configure(url='https://example.gql', coalesce_reads=True)
+        di.bind('gql_backend', gql_backend)
+        user = di.build(User)
+
+        (threads, results) = self.run_threads(5, lambda: gql_backend.records({'select_all': True}, user))
+        self.wait_for(lambda: gql_backend.coalescing_stats()['deduplicated'] == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(1, requests.request.call_count)
+        self.assertEquals([[{'id': '1', 'name': 'bob'}]] * 5, results)
+
+        # mutations are never shared
+        (threads, results) = self.run_threads(3, lambda: gql_backend.create({'name': 'jane'}, user))
+        for thread in threads:
+            thread.join()
+        self.assertEquals(4, requests.request.call_count)
+        self.assertEquals(4, gql_backend.coalescing_stats()['deduplicated'])
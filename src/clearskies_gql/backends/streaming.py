@@ -0,0 +1,141 @@
+import codecs
+import json
+class JsonArrayStream:
+    """
+    Incrementally decodes the elements of one array out of a JSON document that arrives in chunks.
+
+    Give it an iterable of text chunks and the possible paths of keys to the array (e.g. `[['data', 'users']]`),
+    and iterate over it to get the elements of the array as soon as each one has fully arrived.  Nothing outside
+    of the array is decoded, and only the current element (plus one chunk) is held in memory.  If the document
+    doesn't have the array, then iteration stops, `found` is False, and the `document` method returns the whole
+    decoded document, so the caller can figure out what happened (e.g. an error response).
+    """
+    found = None
+    _chunks = None
+    _paths = None
+    _decoder = None
+    _buffer = None
+    _position = None
+    _consumed = None
+    _exhausted = None
+    _utf8_decoder = None
+
+    def __init__(self, chunks, paths):
+        self.found = False
+        self._chunks = iter(chunks)
+        self._paths = [list(path) for path in paths]
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._consumed = ''
+        self._exhausted = False
+        # multi-byte characters can be split across chunks of bytes
+        self._utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def __iter__(self):
+        self.found = self._find_array()
+        if not self.found:
+            return
+        while True:
+            element_start = self._skip_whitespace_and_commas()
+            if element_start is None:
+                raise ValueError('Truncated JSON document while reading an array')
+            if self._buffer[element_start] == ']':
+                self._position = element_start + 1
+                return
+            try:
+                (element, end) = self._decoder.raw_decode(self._buffer, element_start)
+                # a number at the end of the buffer may just be the first part of a longer number
+                complete = self._next_significant(end) is not None or self._exhausted
+            except json.JSONDecodeError:
+                complete = False
+            if not complete:
+                if not self._read():
+                    raise ValueError('Truncated JSON document while reading an array')
+                continue
+            # drop what we've already decoded so the buffer doesn't grow with the array
+            self._buffer = self._buffer[end:]
+            self._position = 0
+            yield element
+
+    def document(self):
+        """
+        Returns the whole document, decoded.  Only available if the array wasn't found.
+        """
+        while self._read():
+            pass
+        return json.loads(self._consumed + self._buffer)
+
+    def _read(self):
+        if self._exhausted:
+            return False
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self._buffer += self._utf8_decoder.decode(chunk) if type(chunk) == bytes else chunk
+            return True
+        self._exhausted = True
+        return False
+
+    def _next_significant(self, start):
+        for index in range(start, len(self._buffer)):
+            if not self._buffer[index].isspace():
+                return index
+        return None
+
+    def _skip_whitespace_and_commas(self):
+        while True:
+            index = self._position
+            while index < len(self._buffer) and (self._buffer[index].isspace() or self._buffer[index] == ','):
+                index += 1
+            if index < len(self._buffer):
+                return index
+            self._buffer = ''
+            self._position = 0
+            if not self._read():
+                return None
+
+    def _find_array(self):
+        # a tiny tokenizer that tracks which key each open object is on, until it finds our array
+        stack = []
+        in_string = False
+        escaped = False
+        string = []
+        while True:
+            while self._position < len(self._buffer):
+                char = self._buffer[self._position]
+                self._position += 1
+                if in_string:
+                    if escaped:
+                        escaped = False
+                        string.append(char)
+                    elif char == '\\':
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                        if stack and stack[-1]['type'] == '{' and stack[-1]['expecting_key']:
+                            stack[-1]['key'] = ''.join(string)
+                            stack[-1]['expecting_key'] = False
+                    elif stack and stack[-1]['type'] == '{' and stack[-1]['expecting_key']:
+                        string.append(char)
+                    continue
+
+                if char == '"':
+                    in_string = True
+                    string = []
+                elif char in '{[':
+                    if char == '[' and all([entry['type'] == '{' for entry in stack]) and \
+                            [entry['key'] for entry in stack] in self._paths:
+                        return True
+                    stack.append({'type': char, 'expecting_key': char == '{', 'key': None})
+                elif char in '}]':
+                    if stack:
+                        stack.pop()
+                elif char == ',' and stack and stack[-1]['type'] == '{':
+                    stack[-1]['expecting_key'] = True
+            # hold on to what we've scanned in case we need to decode the whole document
+            self._consumed += self._buffer
+            self._buffer = ''
+            self._position = 0
+            if not self._read():
+                return False
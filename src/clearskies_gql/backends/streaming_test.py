@@ -0,0 +1,43 @@
+import unittest
+import json
+from .streaming import JsonArrayStream
+class JsonArrayStreamTest(unittest.TestCase):
+    def chunked(self, document, size):
+        return [document[i:i + size] for i in range(0, len(document), size)]
+
+    def test_elements(self):
+        records = [{'id': '1', 'name': 'a "quoted" [name]'}, {'id': '2', 'users': [{'id': 3}]}, {'id': '3'}]
+        document = json.dumps({
+            'extensions': {
+                'users': ['not', 'these'],
+                'note': '{"data": {"users": [1]}}'
+            },
+            'data': {
+                'users': records
+            },
+        })
+        for size in [1, 2, 7, 1000]:
+            stream = JsonArrayStream(self.chunked(document, size), [['data', 'users']])
+            self.assertEquals(records, list(stream))
+            self.assertTrue(stream.found)
+
+    def test_numbers(self):
+        stream = JsonArrayStream(self.chunked('{"data": {"users": [12345, 6]}}', 1), [['data', 'users']])
+        self.assertEquals([12345, 6], list(stream))
+
+    def test_bytes(self):
+        document = json.dumps({'data': {'users': [{'name': 'café'}]}}, ensure_ascii=False).encode('utf-8')
+        stream = JsonArrayStream(self.chunked(document, 1), [['data', 'users']])
+        self.assertEquals([{'name': 'café'}], list(stream))
+
+    def test_not_found(self):
+        document = '{"errors": [{"message": "nope"}], "data": null}'
+        stream = JsonArrayStream(self.chunked(document, 3), [['data', 'users']])
+        self.assertEquals([], list(stream))
+        self.assertFalse(stream.found)
+        self.assertEquals({'errors': [{'message': 'nope'}], 'data': None}, stream.document())
+
+    def test_truncated(self):
+        stream = JsonArrayStream(['{"data": {"users": [{"id": 1}, {"id"'], [['data', 'users']])
+        with self.assertRaises(ValueError):
+            list(stream)
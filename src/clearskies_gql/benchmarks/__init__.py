@@ -0,0 +1,2 @@
+from .stub_server import StubGqlGraph, StubGqlServer, GqlParser
+from .suite import run, measure, seed_graph, format_results
@@ -0,0 +1,21 @@
+import argparse
+import json
+from .suite import run, format_results
+
+parser = argparse.ArgumentParser(description='Benchmarks the GqlBackend against a local stub GQL server')
+parser.add_argument('--users', type=int, default=1000, help='The number of user nodes to seed')
+parser.add_argument('--tags', type=int, default=50, help='The number of tag nodes to seed')
+parser.add_argument('--tags-per-user', type=int, default=5, help='The number of tags connected to each user')
+parser.add_argument('--page-size', type=int, default=100, help='The page size for the paged benchmarks')
+parser.add_argument('--repeat', type=int, default=5, help='The number of times to run each benchmark')
+parser.add_argument('--json', action='store_true', help='Output the results as JSON')
+args = parser.parse_args()
+
+results = run(
+    users=args.users,
+    tags=args.tags,
+    tags_per_user=args.tags_per_user,
+    page_size=args.page_size,
+    repeat=args.repeat,
+)
+print(json.dumps(results, indent=2) if args.json else format_results(results))
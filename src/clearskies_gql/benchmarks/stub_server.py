@@ -0,0 +1,618 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from clearskies.functional import string
+import json
+import re
+import threading
+class GqlSyntaxError(ValueError):
+    pass
+class GqlParser:
+    """
+    Parses the subset of the GQL query language that the GqlBackend sends.
+
+    That's operations (with variables), fields with aliases and arguments, and nested selection sets.  Fragments
+    and directives aren't supported.  The result is a dictionary with the operation `type` and its `selections`,
+    where each selection has an `alias`, a `name`, its `arguments`, and its own `selections`.  Arguments that
+    reference variables are left as `('$', name)` tuples, to be filled in by `resolve_value`.
+    """
+    token_pattern = re.compile(
+        r'(?P<ignored>[\s,]+|#[^\n]*)|(?P<spread>\.\.\.)|(?P<punctuator>[!$():=@\[\]{}|])|' +
+        r'(?P<name>[_A-Za-z][_0-9A-Za-z]*)|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|' +
+        r'(?P<string>"(?:[^"\\]|\\.)*")'
+    )
+    _tokens = None
+    _position = None
+
+    def parse(self, document):
+        self._tokens = self._tokenize(document)
+        self._position = 0
+        operation_type = 'query'
+        if self._peek() in ['query', 'mutation']:
+            operation_type = self._next()
+            if self._peek() not in ['(', '{']:
+                self._next()
+            if self._peek() == '(':
+                self._skip_variable_definitions()
+        selections = self._selection_set()
+        if self._peek() is not None:
+            raise GqlSyntaxError(f"Unexpected '{self._peek()}' after the operation (only one is supported)")
+        return {'type': operation_type, 'selections': selections}
+
+    def _tokenize(self, document):
+        tokens = []
+        position = 0
+        while position < len(document):
+            match = self.token_pattern.match(document, position)
+            if not match:
+                raise GqlSyntaxError(f"Unexpected character '{document[position]}' at position {position}")
+            position = match.end()
+            if match.lastgroup == 'ignored':
+                continue
+            if match.lastgroup == 'spread':
+                raise GqlSyntaxError('Fragments are not supported')
+            if match.lastgroup == 'string':
+                tokens.append(('string', json.loads(match.group())))
+            elif match.lastgroup == 'number':
+                tokens.append(('number', match.group()))
+            else:
+                tokens.append((match.lastgroup, match.group()))
+        return tokens
+
+    def _peek(self):
+        return self._tokens[self._position][1] if self._position < len(self._tokens) else None
+
+    def _next(self, expected=None):
+        if self._position >= len(self._tokens):
+            raise GqlSyntaxError('Unexpected end of document')
+        (kind, value) = self._tokens[self._position]
+        if expected is not None and (kind == 'string' or value != expected):
+            raise GqlSyntaxError(f"Expected '{expected}' but found '{value}'")
+        self._position += 1
+        return value
+
+    def _skip_variable_definitions(self):
+        # the backend always declares its variables, but the stub doesn't check types, so we just skip past them.
+        depth = 0
+        while True:
+            token = self._next()
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if not depth:
+                    return
+
+    def _selection_set(self):
+        self._next('{')
+        selections = []
+        while self._peek() != '}':
+            selections.append(self._field())
+        self._next('}')
+        return selections
+
+    def _field(self):
+        alias = self._next()
+        name = alias
+        if self._peek() == ':':
+            self._next(':')
+            name = self._next()
+        arguments = {}
+        if self._peek() == '(':
+            self._next('(')
+            while self._peek() != ')':
+                argument_name = self._next()
+                self._next(':')
+                arguments[argument_name] = self._value()
+            self._next(')')
+        selections = self._selection_set() if self._peek() == '{' else []
+        return {'alias': alias, 'name': name, 'arguments': arguments, 'selections': selections}
+
+    def _value(self):
+        (kind, value) = self._tokens[self._position]
+        if kind == 'string':
+            self._position += 1
+            return value
+        if kind == 'number':
+            self._position += 1
+            return float(value) if any(char in value for char in '.eE') else int(value)
+        if value == '$':
+            self._next('$')
+            return ('$', self._next())
+        if value == '[':
+            self._next('[')
+            values = []
+            while self._peek() != ']':
+                values.append(self._value())
+            self._next(']')
+            return values
+        if value == '{':
+            self._next('{')
+            values = {}
+            while self._peek() != '}':
+                key = self._next()
+                self._next(':')
+                values[key] = self._value()
+            self._next('}')
+            return values
+        self._position += 1
+        return {'true': True, 'false': False, 'null': None}.get(value, value)
+def resolve_value(value, variables):
+    if type(value) == tuple:
+        return variables.get(value[1])
+    if type(value) == list:
+        return [resolve_value(item, variables) for item in value]
+    if type(value) == dict:
+        return {key: resolve_value(item, variables) for (key, item) in value.items()}
+    return value
+def resolve_selection(selection, variables):
+    return {
+        **selection,
+        'arguments': resolve_value(selection['arguments'], variables),
+        'selections': [resolve_selection(child, variables) for child in selection['selections']],
+    }
+def longest_list(value):
+    if type(value) == dict:
+        return max([longest_list(item) for item in value.values()], default=0)
+    if type(value) == list:
+        return max([len(value), *[longest_list(item) for item in value]])
+    return 0
+class StubGqlGraph:
+    """
+    An in-memory graph that answers GQL requests the way a Neo4j GraphQL server would.
+
+    Declare the node types with `add_type` (which takes the title name, e.g. `User`) and the relationships
+    between them with `relate`, then add nodes and links.  Each type gets the usual root fields: a list query
+    (`users(where, options)`), a connection query (`usersConnection(first, after, where, sort)`), an aggregate
+    query (`usersAggregate(where) { count }`), and the `createUsers`, `updateUsers`, and `deleteUsers` mutations.
+
+    Set `max_list_length` to reject operations with longer lists in their variables (as a complexity error), the way
+    real servers limit the size of queries.
+    """
+    filter_suffixes = [
+        '_NOT_IN', '_NOT', '_LTE', '_LT', '_GTE', '_GT', '_IN', '_CONTAINS', '_STARTS_WITH', '_ENDS_WITH', '_SOME',
+        '_NONE', '_ALL', '_SINGLE'
+    ]
+    max_list_length = None
+    _types = None
+    _root_fields = None
+    _next_id = None
+    _lock = None
+
+    def __init__(self):
+        self._types = {}
+        self._root_fields = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def add_type(self, title_name, plural_object_name=None, plural_title_name=None, id_column_name='id'):
+        plural_title_name = plural_title_name if plural_title_name else string.make_plural(title_name)
+        if not plural_object_name:
+            plural_object_name = plural_title_name[0].lower() + plural_title_name[1:]
+        self._types[title_name] = {
+            'id_column_name': id_column_name,
+            'plural_object_name': plural_object_name,
+            'nodes': {},
+            'relationships': {},
+        }
+        self._root_fields[plural_object_name] = ('records', title_name)
+        self._root_fields[f'{plural_object_name}Connection'] = ('connection', title_name)
+        self._root_fields[f'{plural_object_name}Aggregate'] = ('aggregate', title_name)
+        self._root_fields[f'create{plural_title_name}'] = ('create', title_name)
+        self._root_fields[f'update{plural_title_name}'] = ('update', title_name)
+        self._root_fields[f'delete{plural_title_name}'] = ('delete', title_name)
+
+    def relate(self, title_name, field_name, related_title_name, reverse_field_name=None, many=True):
+        """
+        Declares a relationship field.  With a `reverse_field_name`, links show up from both sides.
+        """
+        self._types[title_name]['relationships'][field_name] = {
+            'type': related_title_name,
+            'links': {},
+            'many': many,
+            'reverse': reverse_field_name,
+        }
+        if reverse_field_name and reverse_field_name not in self._types[related_title_name]['relationships']:
+            self._types[related_title_name]['relationships'][reverse_field_name] = {
+                'type': title_name,
+                'links': {},
+                'many': True,
+                'reverse': field_name,
+            }
+
+    def add_node(self, title_name, data):
+        with self._lock:
+            gql_type = self._types[title_name]
+            node = {**data}
+            if not node.get(gql_type['id_column_name']):
+                self._next_id += 1
+                node[gql_type['id_column_name']] = str(self._next_id)
+            gql_type['nodes'][node[gql_type['id_column_name']]] = node
+            return node
+
+    def link(self, title_name, field_name, id, related_id):
+        with self._lock:
+            relationship = self._types[title_name]['relationships'][field_name]
+            if related_id in relationship['links'].setdefault(id, []):
+                return False
+            relationship['links'][id].append(related_id)
+            if relationship['reverse']:
+                reverse = self._types[relationship['type']]['relationships'][relationship['reverse']]
+                reverse['links'].setdefault(related_id, []).append(id)
+            return True
+
+    def unlink(self, title_name, field_name, id, related_id):
+        with self._lock:
+            relationship = self._types[title_name]['relationships'][field_name]
+            if related_id not in relationship['links'].get(id, []):
+                return False
+            relationship['links'][id].remove(related_id)
+            if relationship['reverse']:
+                reverse = self._types[relationship['type']]['relationships'][relationship['reverse']]
+                reverse['links'].get(related_id, []).remove(id)
+            return True
+
+    def node_count(self, title_name):
+        return len(self._types[title_name]['nodes'])
+
+    def execute(self, operation, variables):
+        list_length = longest_list(variables)
+        if self.max_list_length is not None and list_length > self.max_list_length:
+            return {
+                'data':
+                None,
+                'errors': [{
+                    'message':
+                    f'Query is too complex: a list of {list_length} exceeds the maximum of ' + f'{self.max_list_length}'
+                }],
+            }
+        data = {}
+        errors = []
+        with self._lock:
+            for selection in operation['selections']:
+                if selection['name'] not in self._root_fields:
+                    errors.append({'message': f'Cannot query field "{selection["name"]}" on type "Query".'})
+                    continue
+                (action, title_name) = self._root_fields[selection['name']]
+                selection = resolve_selection(selection, variables)
+                try:
+                    data[selection['alias']
+                         ] = getattr(self, f'_{action}')(title_name, selection['arguments'], selection['selections'])
+                except (KeyError, TypeError, ValueError) as error:
+                    errors.append({'message': f'{type(error).__name__}: {error}'})
+        response = {'data': data}
+        if errors:
+            response['errors'] = errors
+        return response
+
+    def _records(self, title_name, arguments, selections):
+        options = arguments.get('options') or {}
+        nodes = self._sort(self._find(title_name, arguments.get('where')), options.get('sort'))
+        offset = options.get('offset') or 0
+        nodes = nodes[offset:offset + options['limit']] if options.get('limit') else nodes[offset:]
+        return [self._project(title_name, node, selections) for node in nodes]
+
+    def _connection(self, title_name, arguments, selections):
+        nodes = self._sort(self._find(title_name, arguments.get('where')), arguments.get('sort'))
+        start = int(arguments['after'].split(':')[1]) + 1 if arguments.get('after') else 0
+        end = start + arguments['first'] if arguments.get('first') is not None else len(nodes)
+        page = nodes[start:end]
+        result = {}
+        for selection in selections:
+            if selection['name'] == 'totalCount':
+                result[selection['alias']] = len(nodes)
+            elif selection['name'] == 'pageInfo':
+                result[selection['alias']
+                       ] = self._project_dict({
+                           'hasNextPage': end < len(nodes),
+                           'endCursor': f'cursor:{start + len(page) - 1}' if page else None,
+                       }, selection['selections'])
+            elif selection['name'] == 'edges':
+                edges = []
+                for (index, node) in enumerate(page):
+                    edge = {}
+                    for edge_selection in selection['selections']:
+                        if edge_selection['name'] == 'cursor':
+                            edge[edge_selection['alias']] = f'cursor:{start + index}'
+                        elif edge_selection['name'] == 'node':
+                            edge[edge_selection['alias']
+                                 ] = self._project(title_name, node, edge_selection['selections'])
+                    edges.append(edge)
+                result[selection['alias']] = edges
+        return result
+
+    def _aggregate(self, title_name, arguments, selections):
+        return self._project_dict({'count': len(self._find(title_name, arguments.get('where')))}, selections)
+
+    def _create(self, title_name, arguments, selections):
+        gql_type = self._types[title_name]
+        nodes = []
+        relationships_created = 0
+        for data in arguments.get('input') or []:
+            node = self.add_node(
+                title_name, {key: value
+                             for (key, value) in data.items() if key not in gql_type['relationships']}
+            )
+            relationships_created += self._apply_connections(title_name, node, data, 'connect')
+            nodes.append(node)
+        return self._mutation_result(title_name, nodes, selections, relationships_created, 0)
+
+    def _update(self, title_name, arguments, selections):
+        nodes = self._find(title_name, arguments.get('where'))
+        (created, deleted) = (0, 0)
+        for node in nodes:
+            node.update(arguments.get('update') or {})
+            created += self._apply_connections(title_name, node, arguments.get('connect') or {}, 'connect')
+            deleted += self._apply_connections(title_name, node, arguments.get('disconnect') or {}, 'disconnect')
+        return self._mutation_result(title_name, nodes, selections, created, deleted)
+
+    def _delete(self, title_name, arguments, selections):
+        gql_type = self._types[title_name]
+        nodes = self._find(title_name, arguments.get('where'))
+        relationships_deleted = 0
+        for node in nodes:
+            id = node[gql_type['id_column_name']]
+            for (field_name, relationship) in gql_type['relationships'].items():
+                for related_id in list(relationship['links'].get(id, [])):
+                    relationships_deleted += int(self.unlink(title_name, field_name, id, related_id))
+            del gql_type['nodes'][id]
+        return self._project_dict({
+            'nodesDeleted': len(nodes),
+            'relationshipsDeleted': relationships_deleted
+        }, selections)
+
+    def _apply_connections(self, title_name, node, connections, action):
+        gql_type = self._types[title_name]
+        id = node[gql_type['id_column_name']]
+        changed = 0
+        for (field_name, entries) in connections.items():
+            if field_name not in gql_type['relationships']:
+                continue
+            relationship = gql_type['relationships'][field_name]
+            entries = entries if type(entries) == list else [entries]
+            for entry in entries:
+                related_where = (entry.get('where') or {}).get('node') if type(entry) == dict else None
+                for related in self._find(relationship['type'], related_where):
+                    related_id = related[self._types[relationship['type']]['id_column_name']]
+                    changed += int(
+                        getattr(self,
+                                'link' if action == 'connect' else 'unlink')(title_name, field_name, id, related_id)
+                    )
+        return changed
+
+    def _mutation_result(self, title_name, nodes, selections, relationships_created, relationships_deleted):
+        plural_object_name = self._types[title_name]['plural_object_name']
+        result = {}
+        for selection in selections:
+            if selection['name'] == plural_object_name:
+                result[selection['alias']
+                       ] = [self._project(title_name, node, selection['selections']) for node in nodes]
+            elif selection['name'] == 'info':
+                result[selection['alias']] = self._project_dict({
+                    'nodesCreated': len(nodes),
+                    'nodesDeleted': 0,
+                    'relationshipsCreated': relationships_created,
+                    'relationshipsDeleted': relationships_deleted,
+                }, selection['selections'])
+        return result
+
+    def _project_dict(self, values, selections):
+        return {selection['alias']: values.get(selection['name']) for selection in selections}
+
+    def _project(self, title_name, node, selections):
+        gql_type = self._types[title_name]
+        result = {}
+        for selection in selections:
+            name = selection['name']
+            if name == '__typename':
+                result[selection['alias']] = title_name
+            elif name in gql_type['relationships']:
+                relationship = gql_type['relationships'][name]
+                related = self._related(title_name, node, name)
+                where = selection['arguments'].get('where')
+                related = [
+                    related_node for related_node in related
+                    if self._matches(relationship['type'], related_node, where)
+                ]
+                projected = [
+                    self._project(relationship['type'], related_node, selection['selections'])
+                    for related_node in related
+                ]
+                result[selection['alias']
+                       ] = projected if relationship['many'] else (projected[0] if projected else None)
+            else:
+                result[selection['alias']] = node.get(name)
+        return result
+
+    def _related(self, title_name, node, field_name):
+        gql_type = self._types[title_name]
+        relationship = gql_type['relationships'][field_name]
+        related_nodes = self._types[relationship['type']]['nodes']
+        ids = relationship['links'].get(node[gql_type['id_column_name']], [])
+        return [related_nodes[related_id] for related_id in ids if related_id in related_nodes]
+
+    def _find(self, title_name, where):
+        return [node for node in self._types[title_name]['nodes'].values() if self._matches(title_name, node, where)]
+
+    def _sort(self, nodes, sort):
+        for sort_entry in reversed(sort or []):
+            for (field_name, direction) in sort_entry.items():
+                nodes = sorted(
+                    nodes,
+                    key=lambda node: (node.get(field_name) is None, node.get(field_name)),
+                    reverse=direction == 'DESC',
+                )
+        return nodes
+
+    def _matches(self, title_name, node, where):
+        if not where:
+            return True
+        for (key, expected) in where.items():
+            if key == 'AND':
+                if not all([self._matches(title_name, node, sub_where) for sub_where in expected]):
+                    return False
+            elif key == 'OR':
+                if not any([self._matches(title_name, node, sub_where) for sub_where in expected]):
+                    return False
+            elif key == 'NOT':
+                if self._matches(title_name, node, expected):
+                    return False
+            elif not self._matches_field(title_name, node, key, expected):
+                return False
+        return True
+
+    def _matches_field(self, title_name, node, key, expected):
+        gql_type = self._types[title_name]
+        (field_name, suffix) = (key, '')
+        for candidate in self.filter_suffixes:
+            if key.endswith(candidate) and key[:-len(candidate)]:
+                (field_name, suffix) = (key[:-len(candidate)], candidate)
+                break
+
+        if field_name in gql_type['relationships']:
+            related_type = gql_type['relationships'][field_name]['type']
+            matches = [
+                self._matches(related_type, related, expected)
+                for related in self._related(title_name, node, field_name)
+            ]
+            if suffix == '_NONE':
+                return not any(matches)
+            if suffix == '_ALL':
+                return all(matches)
+            if suffix == '_SINGLE':
+                return matches.count(True) == 1
+            return any(matches)
+
+        value = node.get(field_name)
+        if suffix == '':
+            return value == expected
+        if suffix == '_NOT':
+            return value != expected
+        if suffix == '_IN':
+            return value in expected
+        if suffix == '_NOT_IN':
+            return value not in expected
+        if value is None:
+            return False
+        if suffix == '_CONTAINS':
+            return expected in value
+        if suffix == '_STARTS_WITH':
+            return value.startswith(expected)
+        if suffix == '_ENDS_WITH':
+            return value.endswith(expected)
+        return {
+            '_LT': lambda: value < expected,
+            '_LTE': lambda: value <= expected,
+            '_GT': lambda: value > expected,
+            '_GTE': lambda: value >= expected,
+        }[suffix]()
+class StubGqlHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and body go out in separate writes, which Nagle's algorithm would hold up for ~40ms each
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        request_json = json.loads(body)
+        if type(request_json) == list:
+            response_json = [self.server.stub.respond(operation) for operation in request_json]
+        else:
+            response_json = self.server.stub.respond(request_json)
+        response_body = json.dumps(response_json).encode('utf-8')
+        self.server.stub.record_round_trip(len(body), len(response_body))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, format, *args):
+        pass
+class StubGqlServer:
+    """
+    A local, in-process GQL server backed by a StubGqlGraph, for benchmarks and tests.
+
+    It listens on a random port on 127.0.0.1 (see `url`) and keeps track of the round trips and the bytes that
+    went each way, so you can see how many requests an operation takes and how big they were:
+
+    ```
+    with StubGqlServer(graph) as server:
+        backend.configure(url=server.url, auth=Public())
+        ...
+        print(server.stats())
+    ```
+    """
+    graph = None
+    url = None
+    round_trips = None
+    operations = None
+    bytes_sent = None
+    bytes_received = None
+    _server = None
+    _parser = None
+    _documents = None
+    _lock = None
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), StubGqlHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}/graphql'
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def reset_stats(self):
+        with self._lock:
+            self.round_trips = 0
+            self.operations = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def stats(self):
+        return {
+            'round_trips': self.round_trips,
+            'operations': self.operations,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+    def record_round_trip(self, request_size, response_size):
+        # from the point of view of the client: it sent the request and received the response
+        with self._lock:
+            self.round_trips += 1
+            self.bytes_sent += request_size
+            self.bytes_received += response_size
+
+    def respond(self, request_json):
+        with self._lock:
+            self.operations += 1
+        if 'query' not in request_json:
+            return {'errors': [{'message': 'PersistedQueryNotSupported'}]}
+        try:
+            operation = self._parse(request_json['query'])
+        except GqlSyntaxError as error:
+            return {'errors': [{'message': f'Syntax Error: {error}'}]}
+        return self.graph.execute(operation, request_json.get('variables') or {})
+
+    def _parse(self, document):
+        # the backend sends the same handful of documents over and over, so parse each one once
+        if document not in self._documents:
+            self._documents[document] = GqlParser().parse(document)
+        return self._documents[document]
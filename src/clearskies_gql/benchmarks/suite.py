@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+from clearskies.authentication.public import Public
+from clearskies.di import StandardDependencies
+from ..backends import GqlBackend
+from .. import column_types
+from .stub_server import StubGqlGraph, StubGqlServer
+import clearskies
+import logging
+import random
+import requests
+import time
+import tracemalloc
+class User(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'user'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.integer('age'),
+            column_types.connection('tags', related_models_class=Tags, reverse_connection_name='users'),
+        ])
+class Users(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return User
+class Tag(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'tag'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            column_types.connection('users', related_models_class=Users, reverse_connection_name='tags'),
+        ])
+class Tags(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return Tag
+def seed_graph(users=1000, tags=50, tags_per_user=5, seed=0):
+    """
+    Returns a StubGqlGraph with the given number of users and tags, with each user connected to some tags.
+    """
+    randomizer = random.Random(seed)
+    graph = StubGqlGraph()
+    graph.add_type('User')
+    graph.add_type('Tag')
+    graph.relate('User', 'tags', 'Tag', 'users')
+    tag_ids = [graph.add_node('Tag', {'name': f'tag-{index}'})['id'] for index in range(tags)]
+    for index in range(users):
+        user = graph.add_node('User', {'name': f'user-{index}', 'age': randomizer.randint(18, 90)})
+        for tag_id in randomizer.sample(tag_ids, min(tags_per_user, len(tag_ids))):
+            graph.link('User', 'tags', user['id'], tag_id)
+    return graph
+def measure(server, operation, repeat=5):
+    """
+    Runs the operation and returns the average round trips, bytes, and wall time per run, plus the peak memory.
+
+    The peak memory comes from a separate, traced run (tracemalloc slows everything down, so it would throw off
+    the timing).  Since the stub server runs in the same process, it includes the memory the server used too.
+    """
+    server.reset_stats()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    wall_time = time.perf_counter() - start
+    stats = server.stats()
+
+    tracemalloc.start()
+    try:
+        operation()
+        (current_memory, peak_memory) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'round_trips': stats['round_trips'] / repeat,
+        'operations': stats['operations'] / repeat,
+        'bytes_sent': stats['bytes_sent'] / repeat,
+        'bytes_received': stats['bytes_received'] / repeat,
+        'wall_time': wall_time / repeat,
+        'peak_memory': peak_memory,
+    }
+def build_backend(server, session, backend_config=None):
+    environment = SimpleNamespace(get=lambda key, silent=False: None)
+    di = StandardDependencies()
+    di.bind('requests', session)
+    di.bind('environment', environment)
+    di.bind('logging', logging)
+    gql_backend = di.build(GqlBackend)
+    gql_backend.configure(**{'url': server.url, 'auth': Public(), **(backend_config or {})})
+    di.bind('gql_backend', gql_backend)
+    return (di, gql_backend)
+def run(users=1000, tags=50, tags_per_user=5, page_size=100, repeat=5, backend_config=None):
+    """
+    Runs every benchmark against a freshly seeded stub server and returns the results, keyed by benchmark name.
+
+    `backend_config` is passed along to `GqlBackend.configure`, so you can compare configurations.
+    """
+    graph = seed_graph(users=users, tags=tags, tags_per_user=tags_per_user)
+    session = requests.Session()
+    with StubGqlServer(graph) as server:
+        (di, gql_backend) = build_backend(server, session, backend_config=backend_config)
+        user_models = di.build(Users)
+        tag_ids = [tag.id for tag in di.build(Tags).limit(tags_per_user * 2)]
+        created = {'count': 0}
+
+        def create():
+            created['count'] += 1
+            user_models.create({'name': f'new-user-{created["count"]}', 'age': 30})
+
+        def provide():
+            for user in user_models.limit(page_size):
+                user.tags
+
+        def post_save():
+            user = user_models.find(f'name=user-{created["count"] % users}')
+            created['count'] += 1
+            # swap one tag out for another, so that every run has a connect and a disconnect
+            old_tag_ids = [tag.id for tag in user.tags]
+            new_tag_id = [tag_id for tag_id in tag_ids if tag_id not in old_tag_ids][0]
+            user.save({'tags': old_tag_ids[1:] + [new_tag_id]})
+
+        benchmarks = OrderedDict([
+        # a comprehension rather than list(), which would ask the models for their length (and so a count)
+            ('records (one page)', lambda: [user for user in user_models.limit(page_size)]),
+            ('records (all)', lambda: gql_backend.records({'select_all': True}, user_models.empty_model())),
+            ('iter_records', lambda: list(gql_backend.iter_records({'select_all': True}, user_models.empty_model()))),
+            ('count', lambda: gql_backend.count({}, user_models.empty_model())),
+            ('count (filtered)', lambda: len(user_models.where('age>50'))),
+            ('create', create),
+            ('Connection.provide (one page)', provide),
+            ('Connection.post_save', post_save),
+        ])
+        results = OrderedDict()
+        for (name, operation) in benchmarks.items():
+            results[name] = measure(server, operation, repeat=repeat)
+    session.close()
+    return results
+def format_results(results):
+    lines = [
+        f'{"benchmark":<32}{"round trips":>12}{"ops":>6}{"sent (KB)":>12}{"received (KB)":>15}' +
+        f'{"time (ms)":>12}{"peak mem (KB)":>15}'
+    ]
+    for (name, result) in results.items():
+        lines.append(
+            f'{name:<32}{result["round_trips"]:>12.1f}{result["operations"]:>6.1f}' +
+            f'{result["bytes_sent"] / 1024:>12.1f}{result["bytes_received"] / 1024:>15.1f}' +
+            f'{result["wall_time"] * 1000:>12.2f}{result["peak_memory"] / 1024:>15.1f}'
+        )
+    return "\n".join(lines)
@@ -0,0 +1,78 @@
+import unittest
+from .stub_server import GqlParser, StubGqlServer
+from .suite import run, seed_graph
+import requests
+class SuiteTest(unittest.TestCase):
+    def test_round_trips(self):
+        results = run(users=30, tags=10, tags_per_user=3, page_size=10, repeat=2)
+        round_trips = {name: result['round_trips'] for (name, result) in results.items()}
+        self.assertEquals(
+            {
+                'records (one page)': 1,
+                'records (all)': 1,
+                'iter_records': 1,
+                'count': 1,
+                'count (filtered)': 1,
+                'create': 1,
+        # one query for the page and one for the tags of every user in it
+                'Connection.provide (one page)': 2,
+        # finding the user, its current tags, and the mutation with the connects and disconnects
+                'Connection.post_save': 3,
+            },
+            round_trips,
+        )
+        for result in results.values():
+            self.assertGreater(result['bytes_sent'], 0)
+            self.assertGreater(result['bytes_received'], 0)
+            self.assertGreater(result['peak_memory'], 0)
+
+    def test_stub_server(self):
+        graph = seed_graph(users=5, tags=3, tags_per_user=2)
+        session = requests.Session()
+        with StubGqlServer(graph) as server:
+            response = session.post(
+                server.url,
+                json={
+                    'query': 'query q($where: UserWhere) { usersAggregate(where: $where) { count } ' +
+                    'first: users(options: {limit: 2, sort: [{name: DESC}]}) { name } }',
+                    'variables': {
+                        'where': {
+                            'OR': [{
+                                'name': 'user-1'
+                            }, {
+                                'name_STARTS_WITH': 'user-3'
+                            }]
+                        }
+                    },
+                }
+            ).json()
+            self.assertEquals(1, server.stats()['round_trips'])
+            self.assertEquals(2, response['data']['usersAggregate']['count'])
+            self.assertEquals([{'name': 'user-4'}, {'name': 'user-3'}], response['data']['first'])
+
+            response = session.post(server.url, json={'query': '{ nopes { id } }'}).json()
+            self.assertIn('Cannot query field "nopes"', response['errors'][0]['message'])
+        session.close()
+
+    def test_parser(self):
+        parsed = GqlParser(
+        ).parse('mutation M($a: [Int!]!) { thing: createThings(input: $a, x: "y\\"z", n: -1.5) { id } }')
+        self.assertEquals('mutation', parsed['type'])
+        self.assertEquals(
+            [{
+                'alias': 'thing',
+                'name': 'createThings',
+                'arguments': {
+                    'input': ('$', 'a'),
+                    'x': 'y"z',
+                    'n': -1.5
+                },
+                'selections': [{
+                    'alias': 'id',
+                    'name': 'id',
+                    'arguments': {},
+                    'selections': []
+                }],
+            }],
+            parsed['selections'],
+        )
@@ -3,6 +3,7 @@ from clearskies.autodoc.schema import Array as AutoDocArray
 from clearskies.autodoc.schema import Object as AutoDocObject
 from clearskies.autodoc.schema import String as AutoDocString
 from collections import OrderedDict
+from .model_metadata import model_metadata
 class Connection(String):
     """
     Controls a connection between two nodes in a GraphQL system.
@@ -34,6 +35,23 @@ class Connection(String):
 
     def _check_configuration(self, configuration):
         super()._check_configuration(configuration)
+        # the columns are configured again for every new model object, but the configuration for a given model
+        # class doesn't change, so we only need to check the parts that involve the related model once.
+        readable_related_columns = configuration.get('readable_related_columns')
+        validation_key = (
+            self.model_class,
+            self.name,
+            configuration['related_models_class'],
+            configuration.get('reverse_connection_name'),
+            configuration.get('is_readable'),
+            tuple(readable_related_columns) if type(readable_related_columns) in [list, tuple] else None,
+        )
+        if model_metadata.is_validated(validation_key):
+            return
+        self._check_related_configuration(configuration)
+        model_metadata.mark_validated(validation_key)
+
+    def _check_related_configuration(self, configuration):
         self.validate_models_class(configuration['related_models_class'])
         error_prefix = f"Configuration error for '{self.name}' in '{self.model_class.__name__}':"
         if configuration.get('reverse_connection_name'):
@@ -94,37 +112,68 @@ class Connection(String):
     def input_error_for_value(self, value, operator=None):
         if type(value) != list:
             return f'{self.name} should be a list of ids'
-        related_models = self.related_models
-        related_id_column_name = self.config('related_id_column_name')
         for id_to_check in value:
             if type(id_to_check) != str:
                 return f'Invalid selection for {self.name}: all values must be strings'
-            if not len(related_models.where(f"{related_id_column_name}={id_to_check}")):
-                return f"Invalid selection for {self.name}: record {id_to_check} does not exist"
+        if not value:
+            return ''
+
+        # check all the ids with one query that only selects the id.  We go to the backend directly so that
+        # we don't have to stuff the ids into a condition string (which breaks on ids with commas in them)
+        related_models = self.related_models
+        related_id_column_name = self.config('related_id_column_name')
+        found_records = related_models._backend.records({
+            'select_all':
+            False,
+            'selects': [related_id_column_name],
+            'includes': {},
+            'wheres': [{
+                'column': related_id_column_name,
+                'operator': 'IN',
+                'values': list(set(value)),
+            }],
+        }, related_models.empty_model())
+        found_ids = set([record.get(related_id_column_name) for record in found_records])
+        missing_ids = [id_to_check for id_to_check in OrderedDict.fromkeys(value) if id_to_check not in found_ids]
+        if len(missing_ids) == 1:
+            return f"Invalid selection for {self.name}: record {missing_ids[0]} does not exist"
+        if missing_ids:
+            return f"Invalid selection for {self.name}: records " + ', '.join(missing_ids) + " do not exist"
         return ''
 
     def can_provide(self, column_name):
         return column_name == self.name
 
+    @property
+    def metadata(self):
+        """
+        The resolved configuration of this column, shared by every model of the same class.
+        """
+        return model_metadata.for_class(self.model_class, lambda: self.own_models).connections[self.name]
+
     def provide(self, data, column_name):
         # in order to find our related models we need to search on the other class, which means that it needs to
         # have a similarly-configured column
         related_models = self.related_models
-        reverse_connection_name = self.config('reverse_connection_name')
-        if reverse_connection_name not in related_models.columns():
+        id_column_name = self.metadata.reverse_id_column_name
+        if id_column_name is None:
             related_models_class_name = self.config('related_models_class').__name__
             raise ValueError(
                 f"Cannot return '{self.name}' for model '{self.model_class.__name__}' because the reverse connection from the related model, '{related_models_class_name}', cannot be found.  Either specify 'reverse_connection_name' in column '{self.name}' for model '{self.model_class.__name__}' or ensure they use the same column name for the connecting relationship."
             )
 
-        id_column_name = related_models.columns()[reverse_connection_name].config('related_id_column_name')
         if id_column_name not in data:
             related_models_class_name = self.config('related_models_class').__name__
             raise ValueError(
                 f"Cannot return '{self.name}' for model '{self.model_class.__name__}' because the related model, '{related_models_class_name}' is configured to use an id column of '{id_column_name}' but this column does not appear to exist for model '{self.model_class.__name__}'"
             )
-        id = data[id_column_name]
-        return related_models.where(f'{reverse_connection_name}={id}')
+        # rather than querying for our own related records, ask the backend: it will fetch the related records for
+        # every record that was loaded alongside this one in a single query, avoiding an N+1 problem.
+        own_models = self.own_models
+        return [
+            related_models.model(record)
+            for record in own_models._backend.connected_records(own_models, self, data[id_column_name], id_column_name)
+        ]
 
     def to_backend(self, data):
         # we can't persist our mapping data to the database directly, so remove anything here
@@ -134,33 +183,55 @@ class Connection(String):
         return data
 
     def post_save(self, data, model, id):
-        # if our incoming data is not in the data array or is None, then nothing has been set and we do not want
-        # to make any changes
-        if self.name not in data or data[self.name] is None:
+        # the connects and disconnects for every Connection column on the model go out in a single update
+        # mutation, so the first Connection column takes care of all of them and the rest have nothing to do.
+        connection_names = model_metadata.get(model).connection_names
+        if connection_names[0] != self.name:
             return data
+        columns = model.columns()
+        connection_columns = [columns[connection_name] for connection_name in connection_names]
+
+        changes = []
+        for column in connection_columns:
+            # if the incoming data for a column is not in the data array or is None, then nothing has been set and
+            # we do not want to make any changes
+            if column.name not in data or data[column.name] is None:
+                continue
+            # figure out what ids need to be connected or disconnected
+            old_ids = column.old_ids(model)
+            new_ids = set(data[column.name])
+            changes.append({
+                'connection_name': column.name,
+                'to_record_id_column_name': column.config('related_id_column_name'),
+                'connect': new_ids - old_ids,
+                'disconnect': old_ids - new_ids,
+            })
+
+        # since this column is specific to GQL, we're going to cheat and just invoke the backend directly.
+        # it's just easier that way.  This will make testing slightly more tricky :shrug:
+        model._backend.update_connections(self.config('own_id_column_name'), id, changes, model)
+        return data
 
-        # figure out what ids need to be created or deleted from the pivot table.
-        own_id_column_name = self.config('own_id_column_name')
-        related_id_column_name = self.config('related_id_column_name')
+    def old_ids(self, model):
+        """
+        Returns the ids of the records that the given model is currently connected to.
+
+        If the connected records were loaded along with the model (because the column is readable and its readable
+        columns include the id) then we use those rather than asking the server again.
+        """
         if not model.exists:
-            old_ids = set()
-        else:
-            old_ids = set([
-                getattr(related_model, related_id_column_name) for related_model in getattr(model, self.name)
-            ])
-
-        # and the ids that we want to exist now.
-        new_ids = set(data[self.name])
-        to_delete = old_ids - new_ids
-        to_create = new_ids - old_ids
-        if to_delete:
-            # since this column is specific to GQL, we're going to cheat and just invoke the backend directly.
-            # it's just easier that way.  This will make testing slightly more tricky :shrug:
-            model._backend.disconnect(own_id_column_name, id, related_id_column_name, to_delete, self.name, model)
-
-        if to_create:
-            # since this column is specific to GQL, we're going to cheat and just invoke the backend directly.
-            # it's just easier that way.  This will make testing slightly more tricky :shrug:
-            model._backend.connect(own_id_column_name, id, related_id_column_name, to_create, self.name, model)
+            return set()
 
-        return data
+        related_id_column_name = self.config('related_id_column_name')
+        loaded = model.data.get(self.name)
+        if type(loaded) == list and all([
+            type(record) == dict and related_id_column_name in record for record in loaded
+        ]):
+            return set([record[related_id_column_name] for record in loaded])
+
+        id_column_name = self.metadata.reverse_id_column_name
+        own_models = self.own_models
+        return set([
+            record.get(related_id_column_name) for record in
+            own_models._backend.connected_records(own_models, self, model.data[id_column_name], id_column_name)
+        ])
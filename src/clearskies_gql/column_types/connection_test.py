@@ -0,0 +1,457 @@
+import unittest
+from unittest.mock import MagicMock
+from collections import OrderedDict
+from ..backends import GqlBackend
+from .. import column_types
+import clearskies
+import logging
+from clearskies.di import StandardDependencies
+class User(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'user'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            column_types.connection(
+                'tags', related_models_class=Tags, reverse_connection_name='users', is_readable=False
+            ),
+            column_types.connection(
+                'friends', related_models_class=Users, reverse_connection_name='friends', is_readable=False
+            ),
+            clearskies.column_types.has_many('pets', child_models_class=Pets, readable_child_columns=['name']),
+        ])
+class Users(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return User
+
+    def table_name(self):
+        # BelongsTo.provide looks for this when checking for parent data loaded with the child
+        return self.get_table_name()
+class Tag(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'tag'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            column_types.connection(
+                'users', related_models_class=Users, reverse_connection_name='tags', is_readable=False
+            ),
+        ])
+class Tags(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return Tag
+class Pet(clearskies.Model):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    @classmethod
+    def table_name(cls):
+        return 'pet'
+
+    def columns_configuration(self):
+        return OrderedDict([
+            clearskies.column_types.string('name'),
+            clearskies.column_types.belongs_to('user_id', parent_models_class=Users, readable_parent_columns=['name']),
+        ])
+class Pets(clearskies.Models):
+    def __init__(self, gql_backend, columns):
+        super().__init__(gql_backend, columns)
+
+    def model_class(self):
+        return Pet
+class ConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = type('', (), {'request': MagicMock()})()
+        self.auth = type('', (), {'headers': MagicMock(return_value={})})()
+
+        self.di = StandardDependencies()
+        self.di.bind('requests', self.requests)
+        self.di.bind('environment', 'environment')
+        self.di.bind('logging', logging)
+
+        self.gql_backend = self.di.build(GqlBackend)
+        self.gql_backend.configure(url='https://example.gql', auth=self.auth)
+        self.di.bind('gql_backend', self.gql_backend)
+
+        self.users = self.di.build(Users)
+
+    def response(self, json):
+        return type('', (), {'ok': True, 'json': lambda: json})
+
+    def test_provide_batches_page(self):
+        self.requests.request.side_effect = [
+            self.response({"data": {
+                "users": [{
+                    "id": "1",
+                    "name": "bob"
+                }, {
+                    "id": "2",
+                    "name": "jane"
+                }]
+            }}),
+            self.response({
+                "data": {
+                    "tags": [
+                        {
+                            "id": "a",
+                            "name": "red",
+                            "connectedParents": [{
+                                "id": "1"
+                            }, {
+                                "id": "2"
+                            }]
+                        },
+                        {
+                            "id": "b",
+                            "name": "blue",
+                            "connectedParents": [{
+                                "id": "2"
+                            }]
+                        },
+                    ]
+                }
+            }),
+        ]
+
+        tags = {user.id: [tag.name for tag in user.tags] for user in self.users}
+        self.assertEquals({'1': ['red'], '2': ['red', 'blue']}, tags)
+        self.assertEquals(2, self.requests.request.call_count)
+        self.assertEquals(
+            {
+                'where': {
+                    'users_SOME': {
+                        'id_IN': ['1', '2']
+                    }
+                },
+                'parentWhere': {
+                    'id_IN': ['1', '2']
+                },
+            },
+            self.requests.request.call_args.kwargs['json']['variables'],
+        )
+
+    def test_connect_forgets_connected_records(self):
+        def connected(tag_ids):
+            return {'data': {'tags': [{'id': id, 'connectedParents': [{'id': '1'}]} for id in tag_ids]}}
+
+        self.requests.request.side_effect = [
+            self.response({'data': {
+                'users': [{
+                    'id': '1',
+                    'name': 'bob'
+                }]
+            }}),
+            self.response(connected([])),
+            self.response({'data': {
+                'connectUsers': {
+                    'info': {
+                        'relationshipsCreated': 1
+                    }
+                }
+            }}),
+            self.response(connected(['a'])),
+            self.response({'data': {
+                'disconnectUsers': {
+                    'info': {
+                        'relationshipsDeleted': 1
+                    }
+                }
+            }}),
+            self.response(connected([])),
+        ]
+        user = self.users.empty_model()
+        tags = user.columns()['tags']
+        self.gql_backend.records({'select_all': True}, user)
+        self.assertEquals([], self.gql_backend.connected_records(user, tags, '1', 'id'))
+        self.gql_backend.connect('id', '1', 'id', ['a'], 'tags', user)
+        self.assertEquals(['a'], [tag['id'] for tag in self.gql_backend.connected_records(user, tags, '1', 'id')])
+        self.gql_backend.disconnect('id', '1', 'id', ['a'], 'tags', user)
+        self.assertEquals([], self.gql_backend.connected_records(user, tags, '1', 'id'))
+        self.assertEquals(6, self.requests.request.call_count)
+
+    def test_chunked_sort_on_belongs_to(self):
+        self.gql_backend.configure(
+            url='https://example.gql', auth=self.auth, max_ids_per_operation=2, max_parallel_chunks=1
+        )
+        self.requests.request.side_effect = [
+            self.response({
+                'data': {
+                    'pets': [{
+                        'id': '1',
+                        'user_id': {
+                            'id': '7'
+                        }
+                    }, {
+                        'id': '2',
+                        'user_id': {
+                            'id': '5'
+                        }
+                    }]
+                }
+            }),
+            self.response({'data': {
+                'pets': [{
+                    'id': '3',
+                    'user_id': {
+                        'id': '6'
+                    }
+                }]
+            }}),
+        ]
+        configuration = {
+            'select_all': True,
+            'wheres': [{
+                'column': 'id',
+                'operator': 'IN',
+                'values': ['1', '2', '3']
+            }],
+            'sorts': [{
+                'column': 'user_id',
+                'direction': 'asc'
+            }],
+        }
+        records = self.gql_backend.records(configuration, self.di.build(Pets).empty_model())
+        # the chunks are sorted together on the parent ids
+        self.assertEquals(['2', '3', '1'], [record['id'] for record in records])
+        self.assertEquals(2, self.requests.request.call_count)
+
+    def test_input_error_for_value(self):
+        self.requests.request.return_value = self.response({"data": {"tags": [{"id": "a"}]}})
+        tags_column = self.users.empty_model().columns()['tags']
+
+        self.assertEquals(
+            'Invalid selection for tags: records b, c do not exist',
+            tags_column.input_error_for_value(['a', 'b', 'c', 'b']),
+        )
+        self.assertEquals(
+            'Invalid selection for tags: record c does not exist', tags_column.input_error_for_value(['a', 'c'])
+        )
+        self.assertEquals('', tags_column.input_error_for_value(['a']))
+        self.assertEquals(3, self.requests.request.call_count)
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertEquals('query tags($where: TagWhere) {   tags(where: $where) { id   }}', request_json['query'])
+        self.assertEquals({'where': {'id_IN': ['a']}}, request_json['variables'])
+
+        self.assertEquals(
+            'Invalid selection for tags: all values must be strings', tags_column.input_error_for_value(['a', 5])
+        )
+        self.assertEquals('tags should be a list of ids', tags_column.input_error_for_value('a'))
+        self.assertEquals(3, self.requests.request.call_count)
+
+    def test_post_save_single_mutation(self):
+        self.requests.request.side_effect = [
+            self.response({"data": {
+                "tags": [{
+                    "id": "a",
+                    "name": "red",
+                    "connectedParents": [{
+                        "id": "1"
+                    }]
+                }]
+            }}),
+            self.response({"data": {}}),
+        ]
+        user = self.users.model({'id': '1', 'name': 'bob', 'friends': [{'id': '2'}, {'id': '3'}]})
+        data = {'tags': ['b'], 'friends': ['3', '4']}
+        columns = user.columns()
+        columns['tags'].post_save(data, user, '1')
+        columns['friends'].post_save(data, user, '1')
+
+        # one query for the old tags (the old friends were already loaded) and one mutation for everything else
+        self.assertEquals(2, self.requests.request.call_count)
+        request_json = self.requests.request.call_args.kwargs['json']
+        self.assertEquals(
+            'mutation Mutation($connect: UserConnectInput, $disconnect: UserDisconnectInput, $where: UserWhere) {  ' +
+            ' updateUsers(connect: $connect, disconnect: $disconnect, where: $where) {     ' +
+            'info { relationshipsCreated relationshipsDeleted }   } }',
+            request_json['query'],
+        )
+        self.assertEquals(
+            {
+                'where': {
+                    'id': '1'
+                },
+                'connect': {
+                    'tags': [{
+                        'where': {
+                            'node': {
+                                'id': 'b'
+                            }
+                        }
+                    }],
+                    'friends': [{
+                        'where': {
+                            'node': {
+                                'id': '4'
+                            }
+                        }
+                    }],
+                },
+                'disconnect': {
+                    'tags': [{
+                        'where': {
+                            'node': {
+                                'id': 'a'
+                            }
+                        }
+                    }],
+                    'friends': [{
+                        'where': {
+                            'node': {
+                                'id': '2'
+                            }
+                        }
+                    }],
+                },
+            },
+            request_json['variables'],
+        )
+
+    def test_post_save_no_changes(self):
+        user = self.users.model({'id': '1', 'name': 'bob', 'friends': [{'id': '2'}]})
+        user.columns()['tags'].post_save({'friends': ['2'], 'tags': None}, user, '1')
+        self.requests.request.assert_not_called()
+
+    def test_search(self):
+        user = self.users.empty_model()
+        self.assertEquals({'tags_SOME': {
+            'id_IN': ['a', 'b']
+        }}, self.gql_backend._build_gql_search_string([{
+            'column': 'tags',
+            'operator': 'IN',
+            'values': ['a', 'b']
+        }], user))
+        self.assertEquals({'tags': None},
+                          self.gql_backend._build_gql_search_string([{
+                              'column': 'tags',
+                              'operator': 'IS NULL',
+                              'values': []
+                          }], user))
+
+    def test_search_not_equal(self):
+        user = self.users.empty_model()
+        # a user tagged with both a and b is tagged with a, so they shouldn't match tags!=a
+        for operator in ['!=', 'IS NOT']:
+            condition = {'column': 'tags', 'operator': operator, 'values': ['a']}
+            self.assertEquals({'tags_NONE': {'id': 'a'}}, self.gql_backend._build_gql_search_string([condition], user))
+        condition = {'column': 'tags', 'operator': 'IS NOT NULL', 'values': []}
+        self.assertEquals({'tags_NOT': None}, self.gql_backend._build_gql_search_string([condition], user))
+
+    def test_includes(self):
+        self.requests.request.side_effect = [
+            self.response({
+                "data": {
+                    "users": [{
+                        "id":
+                        "1",
+                        "name":
+                        "bob",
+                        "tags": [{
+                            "id": "a",
+                            "name": "red",
+                            "users": [{
+                                "id": "1",
+                                "name": "bob"
+                            }, {
+                                "id": "2",
+                                "name": "jane"
+                            }]
+                        }],
+                        "pets": [{
+                            "id": "p",
+                            "name": "fido"
+                        }],
+                    }]
+                }
+            }),
+        ]
+        users = self.gql_backend.records({
+            'select_all': True,
+            'includes': {
+                'tags': {
+                    'columns': ['name'],
+                    'includes': {
+                        'users': {
+                            'columns': ['name']
+                        }
+                    }
+                },
+                'pets': {
+                    'columns': ['name']
+                },
+            }
+        }, self.users.empty_model())
+        user = self.users.model(users[0])
+        self.assertEquals(['red'], [tag.name for tag in user.tags])
+        self.assertEquals(['bob', 'jane'], [tag_user.name for tag_user in user.tags[0].users])
+        self.assertEquals(['fido'], [pet.name for pet in user.pets])
+        self.assertEquals(1, self.requests.request.call_count)
+        self.assertEquals(
+            'query users {   users { id\n    name\n    tags { id name users { id name } }\n    pets { id name }   }}',
+            self.requests.request.call_args.kwargs['json']['query'],
+        )
+
+    def test_includes_belongs_to(self):
+        self.requests.request.return_value = self.response({
+            "data": {
+                "pets": [{
+                    "id": "p",
+                    "name": "fido",
+                    "user_id": {
+                        "id": "1",
+                        "name": "bob"
+                    }
+                }]
+            }
+        })
+        self.gql_backend.configure(
+            url='https://example.gql', auth=self.auth, includes={'pet': {
+                'user_id': {
+                    'columns': ['name']
+                }
+            }}
+        )
+        pets = self.di.build(Pets)
+        pet = pets.model(self.gql_backend.records({'select_all': True}, pets.empty_model())[0])
+        self.assertEquals('1', pet.user_id)
+        self.assertEquals('bob', pet.user.name)
+        self.assertEquals(1, self.requests.request.call_count)
+        self.assertEquals(
+            'query pets {   pets { id\n    name\n    user_id { id name }   }}',
+            self.requests.request.call_args.kwargs['json']['query'],
+        )
+
+    def test_includes_depth(self):
+        with self.assertRaises(ValueError):
+            self.gql_backend.records({
+                'select_all': True,
+                'includes': {
+                    'tags': {
+                        'includes': {
+                            'users': {
+                                'includes': {
+                                    'tags': {}
+                                }
+                            }
+                        }
+                    }
+                }
+            }, self.users.empty_model())
+        with self.assertRaises(ValueError):
+            self.gql_backend.records({'select_all': True, 'includes': {'name': {}}}, self.users.empty_model())
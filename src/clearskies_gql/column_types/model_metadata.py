@@ -0,0 +1,137 @@
+from clearskies import Models
+from clearskies.column_types import BelongsTo, HasMany
+from collections import namedtuple
+from types import MappingProxyType
+import threading
+
+ModelMetadata = namedtuple(
+    'ModelMetadata',
+    ['model_class', 'id_column_name', 'column_names', 'select_all', 'connection_names', 'connections'],
+)
+ModelMetadata.__doc__ = """
+The parts of a model's column configuration that the GQL backend and the Connection column need over and over.
+
+`select_all` is a tuple of (column name, GQL selection) pairs for the columns that a `select_all` query asks for,
+and `connections` maps the name of each Connection column to its ConnectionMetadata.
+"""
+
+ConnectionMetadata = namedtuple(
+    'ConnectionMetadata',
+    [
+        'name',
+        'related_models_class',
+        'own_id_column_name',
+        'related_id_column_name',
+        'reverse_connection_name',
+        'reverse_id_column_name',
+        'is_readable',
+        'readable_related_columns',
+    ],
+)
+ConnectionMetadata.__doc__ = """
+The resolved configuration of one Connection column.
+
+`reverse_id_column_name` is the `related_id_column_name` of the matching Connection column on the related model
+(i.e. the id column of our model, as the related model sees it), or None if the related model has no such column.
+"""
+class ModelMetadataRegistry:
+    """
+    Resolves the metadata for each model class once, and hands out the same (immutable) copy from then on.
+
+    Configuring the columns of a model is expensive (every column is built and validated, and relationship columns
+    build their related models too), and clearskies does it again for every new model object.  The metadata is
+    keyed by the model class, so it assumes that a model class always has the same columns.  If that's not the
+    case (e.g. columns that change at runtime), call `clear()` after changing them.
+    """
+    _metadata = None
+    _validated = None
+    _lock = None
+
+    def __init__(self):
+        self._metadata = {}
+        self._validated = set()
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        """
+        Returns the metadata for the given model (or models) object.
+        """
+        model_class = model.model_class() if isinstance(model, Models) else model.__class__
+        metadata = self._metadata.get(model_class)
+        if metadata is None:
+            metadata = self._store(model_class, self._build(model_class, model.columns()))
+        return metadata
+
+    def for_class(self, model_class, build_model):
+        """
+        Returns the metadata for the given model class.  `build_model` is only called (to get a model to read the
+        columns from) if we haven't seen the class before.
+        """
+        metadata = self._metadata.get(model_class)
+        if metadata is None:
+            metadata = self._store(model_class, self._build(model_class, build_model().columns()))
+        return metadata
+
+    def is_validated(self, key):
+        return key in self._validated
+
+    def mark_validated(self, key):
+        with self._lock:
+            self._validated.add(key)
+
+    def clear(self):
+        with self._lock:
+            self._metadata = {}
+            self._validated = set()
+
+    def _store(self, model_class, metadata):
+        # if two threads built it at the same time, everyone gets whichever one was stored first
+        with self._lock:
+            return self._metadata.setdefault(model_class, metadata)
+
+    def _build(self, model_class, columns):
+        # imported here because the Connection column reads from this registry
+        from .connection import Connection
+        select_all = []
+        connections = {}
+        for column in columns.values():
+            if isinstance(column, Connection):
+                connections[column.name] = self._connection_metadata(column)
+            if column.is_temporary or isinstance(column, HasMany):
+                continue
+            if isinstance(column, BelongsTo):
+                parent_id_column_name = column.parent_models.get_id_column_name()
+                select_all.append((column.name, column.name + '{' + parent_id_column_name + '}'))
+                continue
+            if isinstance(column, Connection):
+                if column.is_readable:
+                    readable_related_columns = ' '.join(column.config('readable_related_columns'))
+                    select_all.append((column.name, column.name + '{' + readable_related_columns + '}'))
+                continue
+            select_all.append((column.name, column.name))
+
+        return ModelMetadata(
+            model_class=model_class,
+            id_column_name=model_class.id_column_name,
+            column_names=tuple(columns.keys()),
+            select_all=tuple(select_all),
+            connection_names=tuple(connections.keys()),
+            connections=MappingProxyType(connections),
+        )
+
+    def _connection_metadata(self, column):
+        reverse_connection_name = column.config('reverse_connection_name')
+        reverse_column = column.related_models.columns().get(reverse_connection_name)
+        readable_related_columns = column.config('readable_related_columns', silent=True)
+        return ConnectionMetadata(
+            name=column.name,
+            related_models_class=column.config('related_models_class'),
+            own_id_column_name=column.config('own_id_column_name'),
+            related_id_column_name=column.config('related_id_column_name'),
+            reverse_connection_name=reverse_connection_name,
+            reverse_id_column_name=reverse_column.config('related_id_column_name', silent=True)
+            if reverse_column is not None else None,
+            is_readable=column.is_readable,
+            readable_related_columns=tuple(readable_related_columns) if readable_related_columns else (),
+        )
+model_metadata = ModelMetadataRegistry()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+from .connection_test import User, Users, Tags, Pets
+from .model_metadata import ModelMetadataRegistry, model_metadata
+from ..backends import GqlBackend
+import clearskies
+import logging
+from clearskies.di import StandardDependencies
+class ModelMetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.di = StandardDependencies()
+        self.di.bind('requests', 'requests')
+        self.di.bind('environment', 'environment')
+        self.di.bind('logging', logging)
+        self.gql_backend = self.di.build(GqlBackend)
+        self.gql_backend.configure(url='https://example.gql', auth='auth')
+        self.di.bind('gql_backend', self.gql_backend)
+        self.users = self.di.build(Users)
+
+    def test_metadata(self):
+        registry = ModelMetadataRegistry()
+        metadata = registry.get(self.users.empty_model())
+        self.assertEquals(User, metadata.model_class)
+        self.assertEquals('id', metadata.id_column_name)
+        self.assertEquals(('id', 'name', 'tags', 'friends', 'pets'), metadata.column_names)
+        self.assertEquals((('id', 'id'), ('name', 'name')), metadata.select_all)
+        self.assertEquals(('tags', 'friends'), metadata.connection_names)
+        tags = metadata.connections['tags']
+        self.assertEquals(Tags, tags.related_models_class)
+        self.assertEquals('users', tags.reverse_connection_name)
+        self.assertEquals('id', tags.reverse_id_column_name)
+        self.assertFalse(tags.is_readable)
+
+        # it's resolved once, from the models or any model
+        self.assertIs(metadata, registry.get(self.users))
+        self.assertIs(metadata, registry.for_class(User, lambda: self.fail('should not build the model')))
+
+        # and it can't be changed
+        with self.assertRaises(AttributeError):
+            metadata.id_column_name = 'nope'
+        with self.assertRaises(TypeError):
+            metadata.connections['tags'] = None
+
+        registry.clear()
+        self.assertIsNot(metadata, registry.get(self.users))
+
+    def test_belongs_to(self):
+        metadata = ModelMetadataRegistry().get(self.di.build(Pets))
+        self.assertEquals((('id', 'id'), ('name', 'name'), ('user_id', 'user_id{id}')), metadata.select_all)
+
+    def test_validates_once(self):
+        model_metadata.clear()
+        with patch.object(
+            Tags, 'raw_columns_configuration', wraps=self.di.build(Tags).raw_columns_configuration
+        ) as raw:
+            for _ in range(3):
+                self.users.empty_model().columns()
+            # the reverse connection to tags is checked the first time only
+            self.assertEquals(1, raw.call_count)